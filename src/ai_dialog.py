@@ -18,11 +18,13 @@ try:
     from llm_client import LLMClient
     from adapter import AdapterLLMClient
     from client_factory import LLMClientFactory
+    from client_registry import get_registry
     from interfaces import LLMConnectionError
 
     YOUR_CLIENT_AVAILABLE = True
 except ImportError as e:
     LLMClient, AdapterLLMClient, LLMClientFactory, LLMConnectionError = None, None, None, Exception
+    get_registry = None
     YOUR_CLIENT_AVAILABLE = False
     IMPORT_ERROR_MESSAGE = f"Не удалось импортировать модули LLM-клиента:\n{e}"
     logging.error("Ошибка импорта в ai_dialog", exc_info=True)
@@ -117,9 +119,11 @@ class CheckConnectionRunnable(QRunnable):
                 self.signals.show_critical.emit("Ошибка конфигурации", validation_error)
                 return
 
-            # Создаем провайдера
-            provider = LLMClientFactory.create_provider(model_config)
-            llm_client = LLMClient(provider, model_config)
+            # Берём провайдера из общего реестра (соединения переиспользуются)
+            provider = get_registry().get_provider(model_config)
+            # Проверка всегда идёт на сервер: ответ из кэша не говорит о его доступности
+            check_config = {**model_config, "inference": {**model_config.get("inference", {}), "cache": False}}
+            llm_client = LLMClient(provider, check_config)
 
             # Проверяем соединение с таймаутом
             self.signals.update_text.emit("Проверка соединения...")
@@ -249,7 +253,7 @@ class RequestWorker(QRunnable):
             self.parent.tokens_prompt_label.setText(str(prompt_tokens))
 
             # 2. Инициализация клиента
-            provider = LLMClientFactory.create_provider(self.model_config)
+            provider = get_registry().get_provider(self.model_config)
             llm_client = LLMClient(provider, self.model_config)
             messages = [{"role": "user", "content": self.prompt_text}]
             use_stream = self.model_config.get("inference", {}).get("stream", True)
@@ -490,6 +494,9 @@ class AIDialog(QDialog):
         self.stream_checkbox = QCheckBox("Потоковый ответ (stream)");
         self.stream_checkbox.setChecked(True);
         params_layout.addRow(self.stream_checkbox)
+        self.cache_checkbox = QCheckBox("Кэшировать ответы");
+        self.cache_checkbox.setToolTip("Повторный запрос с теми же параметрами вернётся из кэша без генерации");
+        params_layout.addRow(self.cache_checkbox)
         # --- Prompt Group ---
         prompt_group = QGroupBox("Промпт");
         prompt_layout = QVBoxLayout(prompt_group)
@@ -594,7 +601,7 @@ class AIDialog(QDialog):
             "name": self.model_name_field.text().strip() or "default-model",
             "client_type": p_type,
             "api_base": self.api_url.text().strip(),
-            "inference": {"stream": self.stream_checkbox.isChecked()},
+            "inference": {"stream": self.stream_checkbox.isChecked(), "cache": self.cache_checkbox.isChecked()},
             "generation": {
                 "max_tokens": self.max_tokens.value(),
                 "temperature": self.temperature.value()
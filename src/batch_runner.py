@@ -0,0 +1,392 @@
+# src/batch_runner.py
+"""
+Пакетный запуск промптов через LLMClient без GUI.
+
+Каждая комбинация промпт × набор переменных × модель (× повтор) — отдельный
+запрос. Запросы идут асинхронно (LLMClient.achat) в одном цикле событий; на
+каждого провайдера (client_type + api_base) одновременно выполняется не больше
+--concurrency запросов. Результаты дописываются в JSONL по мере готовности,
+с метриками как у AdapterLLMClient: время до первого токена, полная задержка,
+число токенов и скорость генерации.
+
+Файл результатов служит и контрольной точкой: с --resume задания, для которых
+в нём уже есть успешная запись, пропускаются (ошибочные повторяются, если не
+указан --skip-failed), поэтому упавший прогон продолжается с места остановки.
+С --cache ответы берутся из общего кэша ответов (и сохраняются в него), так что
+повторный детерминированный прогон не генерирует заново.
+
+Файл моделей — JSON-список конфигураций в формате AIDialog:
+    [{"name": "qwen3:8b", "client_type": "ollama",
+      "generation": {"temperature": 0}, "inference": {"stream": true}}]
+Файл переменных — JSONL, в каждой строке объект {"имя": "значение"}; значения
+подставляются вместо [имя], как в окне предпросмотра.
+
+Запуск из папки src:
+    python batch_runner.py --models models.json --prompt-id <id> --vars vars.jsonl --output results.jsonl
+    python batch_runner.py --models models.json --texts texts.jsonl --output results.jsonl --resume
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from client_factory import LLMClientFactory
+from interfaces import AsyncProviderClient
+from llm_client import LLMClient
+from response_cache import ResponseCache, get_response_cache
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+# Как часто писать прогресс в лог (число завершённых заданий)
+PROGRESS_EVERY = 50
+
+
+@dataclass
+class BatchJob:
+    """Один запрос пакета: готовый текст промпта и конфигурация модели"""
+    job_id: str
+    prompt_ref: str
+    text: str
+    model_config: Dict[str, Any]
+    variables: Dict[str, str] = field(default_factory=dict)
+    repeat: int = 0
+
+
+def substitute_variables(text: str, variables: Dict[str, str]) -> str:
+    """Подставляет значения вместо [имя] (как PromptPreview.apply_variables)"""
+    for name, value in variables.items():
+        if value:
+            text = text.replace(f"[{name}]", str(value))
+    return text
+
+
+def provider_key(model_config: Dict[str, Any]) -> Tuple[str, str]:
+    """Ключ ограничения параллельности: один сервер — один семафор"""
+    return (str(model_config.get("client_type") or "").strip().lower(),
+            (model_config.get("api_base") or "").rstrip("/"))
+
+
+def make_job_id(prompt_ref: str, text: str, variables: Dict[str, str], model_config: Dict[str, Any],
+                repeat: int) -> str:
+    """
+    Стабильный id задания: по нему --resume находит уже выполненные запросы.
+
+    Учитывается текст запроса после подстановки переменных: ссылка на промпт
+    (номер текста, id строки JSONL, id промпта) не меняется при правке текста
+    или смене --lang, и без него изменённый запрос считался бы выполненным.
+    """
+    identity = {
+        "prompt": prompt_ref,
+        "text": hashlib.sha1(text.encode("utf-8")).hexdigest(),
+        "variables": variables,
+        "model": model_config.get("name"),
+        "provider": provider_key(model_config),
+        "generation": model_config.get("generation", {}),
+        "repeat": repeat,
+    }
+    return hashlib.sha1(json.dumps(identity, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def build_jobs(prompts: List[Tuple[str, str, Dict[str, str]]], bindings: List[Dict[str, str]],
+               models: List[Dict[str, Any]], repeats: int = 1) -> List[BatchJob]:
+    """
+    Разворачивает промпты × переменные × модели × повторы в список заданий.
+
+    prompts — тройки (ссылка на промпт, текст, значения переменных по умолчанию);
+    ссылка попадает в результаты (id промпта или номер текста).
+    """
+    jobs = []
+    for prompt_ref, text, defaults in prompts:
+        for binding in bindings:
+            variables = {**defaults, **binding}
+            prompt_text = substitute_variables(text, variables)
+            for model_config in models:
+                for repeat in range(repeats):
+                    jobs.append(BatchJob(
+                        job_id=make_job_id(prompt_ref, prompt_text, variables, model_config, repeat),
+                        prompt_ref=prompt_ref,
+                        text=prompt_text,
+                        model_config=model_config,
+                        variables=variables,
+                        repeat=repeat,
+                    ))
+    return jobs
+
+
+def load_checkpoint(path: Path, include_failed: bool = False) -> Set[str]:
+    """id заданий, уже записанных в файл результатов (по умолчанию только успешных)"""
+    done = set()
+    if not path.exists():
+        return done
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Последняя строка могла оборваться при аварийном завершении
+                continue
+            if record.get("status") == "ok" or include_failed:
+                done.add(record.get("job_id"))
+    return done
+
+
+def _estimate_tokens(text: str) -> int:
+    # Та же эвристика, что и в AdapterLLMClient
+    if not text:
+        return 0
+    return int(len(text) / 4.0) + 1
+
+
+class BatchRunner:
+    """
+    Выполняет список BatchJob через асинхронных провайдеров и пишет результаты в JSONL.
+
+    Провайдер (и его пул соединений) создаётся один раз на сервер и ключ API,
+    одновременных запросов к одному серверу не больше concurrency.
+    """
+
+    def __init__(self, output_path: Path, concurrency: int = DEFAULT_CONCURRENCY,
+                 cache: Optional[ResponseCache] = None):
+        self.output_path = Path(output_path)
+        self.concurrency = concurrency
+        self.cache = cache
+        self.completed = 0
+        self.failed = 0
+        self._total = 0
+        self._providers: Dict[Tuple[str, str, str], AsyncProviderClient] = {}
+        self._semaphores: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+        self._output = None
+
+    def _provider(self, model_config: Dict[str, Any]) -> AsyncProviderClient:
+        key = provider_key(model_config) + (model_config.get("api_key") or "",)
+        provider = self._providers.get(key)
+        if provider is None:
+            provider = LLMClientFactory.create_provider(model_config, use_async=True)
+            self._providers[key] = provider
+        return provider
+
+    def _semaphore(self, model_config: Dict[str, Any]) -> asyncio.Semaphore:
+        key = provider_key(model_config)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphores[key] = semaphore
+        return semaphore
+
+    async def run(self, jobs: List[BatchJob]) -> Dict[str, int]:
+        """Выполняет задания; возвращает число успешных и ошибочных"""
+        self._total = len(jobs)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._output = self.output_path.open("a", encoding="utf-8")
+        try:
+            # Оборванная последняя строка не должна склеиться с первой новой записью
+            if self._output.tell() > 0:
+                with self.output_path.open("rb") as f:
+                    f.seek(-1, 2)
+                    if f.read(1) != b"\n":
+                        self._output.write("\n")
+            await asyncio.gather(*(self._run_job(job) for job in jobs))
+        finally:
+            self._output.close()
+            self._output = None
+            for provider in self._providers.values():
+                await provider.aclose()
+            self._providers.clear()
+        return {"completed": self.completed, "failed": self.failed}
+
+    async def _run_job(self, job: BatchJob):
+        async with self._semaphore(job.model_config):
+            record = await self.execute(job)
+        self._write(record)
+
+    async def execute(self, job: BatchJob) -> Dict[str, Any]:
+        """Один запрос: собирает ответ и метрики, ошибки превращает в запись со статусом error"""
+        model_config = job.model_config
+        record = {
+            "job_id": job.job_id,
+            "prompt": job.prompt_ref,
+            "model": model_config.get("name"),
+            "client_type": model_config.get("client_type"),
+            "variables": job.variables,
+            "repeat": job.repeat,
+        }
+        use_stream = str(model_config.get("inference", {}).get("stream", True)).lower() == "true"
+        start_time = time.perf_counter()
+        try:
+            provider = self._provider(model_config)
+            client = LLMClient(provider, model_config, cache=self.cache)
+            messages = [{"role": "user", "content": job.text}]
+            response = await client.achat(messages, stream=use_stream)
+            if use_stream:
+                text, metadata, ttft_time = await self._collect_stream(provider, response)
+            else:
+                ttft_time = None
+                choices = provider.extract_choices(response)
+                text = "".join(provider.extract_content_from_choice(c) for c in choices)
+                metadata = provider.extract_metadata_from_response(response)
+            end_time = time.perf_counter()
+        except Exception as e:
+            # Ошибка одного запроса не останавливает пакет; задание повторится при --resume
+            record.update(status="error", error=str(e),
+                          metrics={"total_latency_ms": round((time.perf_counter() - start_time) * 1000, 2)})
+            return record
+
+        record.update(status="ok", response=text,
+                      metrics=self._metrics(job.text, text, metadata, start_time, ttft_time, end_time))
+        return record
+
+    @staticmethod
+    async def _collect_stream(provider: AsyncProviderClient, stream) -> Tuple[str, Dict[str, Any], Optional[float]]:
+        parts = []
+        metadata: Dict[str, Any] = {}
+        ttft_time = None
+        async for chunk in stream:
+            content, _logprobs, finish_reason = provider.extract_delta_from_chunk(chunk)
+            if content:
+                if ttft_time is None:
+                    ttft_time = time.perf_counter()
+                parts.append(content)
+            if finish_reason:
+                metadata["finish_reason"] = finish_reason
+            chunk_metadata = provider.extract_metadata_from_chunk(chunk)
+            if chunk_metadata:
+                metadata.update(chunk_metadata)
+        return "".join(parts), metadata, ttft_time
+
+    @staticmethod
+    def _metrics(prompt_text: str, text: str, metadata: Dict[str, Any], start_time: float,
+                 ttft_time: Optional[float], end_time: float) -> Dict[str, Any]:
+        """Метрики в терминах AdapterLLMClient: серверные значения в приоритете, иначе оценка клиента"""
+        metrics = dict(metadata)
+        metrics.setdefault("eval_count", _estimate_tokens(text))
+        metrics.setdefault("prompt_eval_count", _estimate_tokens(prompt_text))
+        total_latency = end_time - start_time
+        metrics["total_latency_ms"] = round(total_latency * 1000, 2)
+        metrics["time_to_first_token_ms"] = round(((ttft_time or end_time) - start_time) * 1000, 2)
+        # Скорость генерации: после первого токена, а без потока — по всему запросу
+        generation_time = end_time - ttft_time if ttft_time is not None else total_latency
+        if generation_time > 0 and metrics["eval_count"]:
+            metrics["tokens_per_s"] = round(metrics["eval_count"] / generation_time, 2)
+        return {k: v for k, v in metrics.items() if v is not None}
+
+    def _write(self, record: Dict[str, Any]):
+        record["finished_at"] = datetime.utcnow().isoformat()
+        # Одна запись — одна строка, сброшенная на диск до начала следующей
+        self._output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._output.flush()
+        if record["status"] == "ok":
+            self.completed += 1
+        else:
+            self.failed += 1
+            log.warning(f"Задание {record['job_id'][:8]} ({record['model']}): {record['error']}")
+        done = self.completed + self.failed
+        if done % PROGRESS_EVERY == 0 or done == self._total:
+            log.info(f"Выполнено {done}/{self._total} (ошибок {self.failed})")
+
+
+def read_jsonl(path: Path) -> Iterable[Dict[str, Any]]:
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def prompt_text(prompt, lang: str) -> str:
+    if isinstance(prompt.content, dict):
+        return prompt.content.get(lang) or next((text for text in prompt.content.values() if text), "")
+    return str(prompt.content)
+
+
+def collect_prompts(args) -> List[Tuple[str, str, Dict[str, str]]]:
+    """Промпты из библиотеки (по id) и готовые тексты в виде (ссылка, текст, переменные по умолчанию)"""
+    prompts = []
+    prompt_ids = list(args.prompt_id or [])
+    if args.prompt_ids:
+        prompt_ids += [line.strip() for line in args.prompt_ids.read_text(encoding="utf-8").splitlines()
+                       if line.strip()]
+    if prompt_ids:
+        from storage import LocalStorage
+
+        storage = LocalStorage(str(args.library))
+        for prompt_id in prompt_ids:
+            prompt = storage.load_prompt(prompt_id)
+            if prompt is None:
+                raise ValueError(f"Промпт {prompt_id} не найден в {args.library}")
+            defaults = {v.name: v.default_value for v in prompt.variables if v.default_value}
+            prompts.append((prompt_id, prompt_text(prompt, args.lang), defaults))
+    for i, text in enumerate(args.text or []):
+        prompts.append((f"text:{i}", text, {}))
+    if args.texts:
+        for i, item in enumerate(read_jsonl(args.texts)):
+            prompts.append((str(item.get("id", f"texts:{i}")), item["text"], {}))
+    return prompts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", type=Path, required=True, help="JSON-список конфигураций моделей")
+    parser.add_argument("--prompt-id", action="append", help="id промпта из библиотеки (можно несколько раз)")
+    parser.add_argument("--prompt-ids", type=Path, help="файл с id промптов, по одному в строке")
+    parser.add_argument("--text", action="append", help="текст промпта (можно несколько раз)")
+    parser.add_argument("--texts", type=Path, help='JSONL с текстами: {"id": ..., "text": ...}')
+    parser.add_argument("--library", type=Path, default=Path("../prompts"), help="папка библиотеки промптов")
+    parser.add_argument("--lang", default="ru", choices=("ru", "en"), help="язык текста промптов из библиотеки")
+    parser.add_argument("--vars", type=Path, help="JSONL с наборами значений переменных")
+    parser.add_argument("--repeats", type=int, default=1, help="повторов каждого запроса")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="одновременных запросов на один сервер")
+    parser.add_argument("--output", type=Path, required=True, help="файл результатов JSONL")
+    parser.add_argument("--resume", action="store_true", help="продолжить прогон по файлу результатов")
+    parser.add_argument("--skip-failed", action="store_true", help="при --resume не повторять ошибочные задания")
+    parser.add_argument("--cache", action="store_true", help="использовать кэш ответов")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.output.exists() and args.output.stat().st_size > 0 and not args.resume:
+        print(f"Файл {args.output} уже существует: укажите --resume, чтобы продолжить прогон, или другой --output")
+        sys.exit(1)
+
+    try:
+        models = json.loads(args.models.read_text(encoding="utf-8"))
+        prompts = collect_prompts(args)
+        bindings = list(read_jsonl(args.vars)) if args.vars else [{}]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ошибка входных данных: {e}")
+        sys.exit(1)
+    if not prompts:
+        print("Не задано ни одного промпта (--prompt-id, --prompt-ids, --text, --texts)")
+        sys.exit(1)
+
+    jobs = build_jobs(prompts, bindings, models, args.repeats)
+    if args.resume:
+        done = load_checkpoint(args.output, include_failed=args.skip_failed)
+        skipped = sum(1 for job in jobs if job.job_id in done)
+        jobs = [job for job in jobs if job.job_id not in done]
+        log.info(f"Продолжение прогона: пропущено выполненных заданий {skipped}")
+    log.info(f"Заданий к выполнению: {len(jobs)}")
+
+    runner = BatchRunner(args.output, concurrency=args.concurrency,
+                         cache=get_response_cache() if args.cache else None)
+    started = time.perf_counter()
+    try:
+        result = asyncio.run(runner.run(jobs))
+    except KeyboardInterrupt:
+        print(f"\nПрервано: записано {runner.completed + runner.failed}; продолжить можно с --resume")
+        sys.exit(130)
+    print(f"Готово за {time.perf_counter() - started:.1f} с: успешно {result['completed']}, "
+          f"ошибок {result['failed']}. Результаты: {args.output}")
+    if result["failed"]:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# src/bench_history.py
+"""
+Бенчмарк истории версий (PromptHistory).
+
+Записывает по --revisions ревизий для --prompts промптов (копии промптов из
+prompts/ с новыми id; каждая ревизия меняет заголовок, один тег и часть текста),
+затем измеряет размер базы, время получения списка истории, поиска ревизии по
+времени, восстановления ревизии из цепочки дельт и сжатия (compact).
+База пишется во временную папку.
+
+Запуск из папки src:
+    python bench_history.py --source ../prompts --prompts 10000 --revisions 50
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from models import Prompt
+from prompt_history import PromptHistory
+from prompt_loader import decode_prompt_data
+
+
+def load_templates(source: Path):
+    templates = []
+    for path in sorted(source.rglob("*.json")):
+        try:
+            templates.append(Prompt.model_validate(decode_prompt_data(json.loads(path.read_text(encoding="utf-8")))))
+        except Exception:
+            continue
+    return templates
+
+
+def revise(prompt: Prompt, revision: int) -> Prompt:
+    """Следующая ревизия: новый заголовок, один тег заменён, дописан абзац текста"""
+    data = prompt.model_dump()
+    data["title"] = f"{data['title'].split(' #')[0]} #{revision}"
+    data["tags"] = (data["tags"] or [])[:3] + [f"rev{revision % 7}"]
+    if isinstance(data["content"], dict):
+        lang = "ru" if data["content"].get("ru") else "en"
+        data["content"][lang] = data["content"][lang] + f"\nПравка {revision}."
+    else:
+        data["content"] = data["content"] + f"\nПравка {revision}."
+    return Prompt(**data)
+
+
+def percentiles(values):
+    values = sorted(values)
+    return values[len(values) // 2] * 1000, values[int(len(values) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="../prompts", help="Исходная папка с промптами")
+    parser.add_argument("--prompts", type=int, default=10000, help="Число промптов")
+    parser.add_argument("--revisions", type=int, default=50, help="Ревизий на промпт")
+    parser.add_argument("--queries", type=int, default=1000, help="Число замеров чтения")
+    args = parser.parse_args()
+
+    source = Path(args.source)
+    if not source.exists():
+        print(f"Папка {source} не найдена")
+        sys.exit(1)
+    templates = load_templates(source)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = PromptHistory(Path(tmp))
+        started_at = datetime(2024, 1, 1)
+        ids = []
+        raw_bytes = 0
+        started = time.perf_counter()
+        for i in range(args.prompts):
+            data = templates[i % len(templates)].model_dump()
+            data["id"] = str(uuid.UUID(int=i + 1))
+            prompt = Prompt(**data)
+            ids.append(prompt.id)
+            for revision in range(args.revisions):
+                history.record(prompt, started_at + timedelta(minutes=revision))
+                raw_bytes += len(history._canonical(history.revision_data(prompt)))
+                prompt = revise(prompt, revision + 1)
+        record_time = time.perf_counter() - started
+        total = args.prompts * args.revisions
+        stats = history.stats()
+        print(f"Записано ревизий: {total} за {record_time:.1f} с ({total / record_time:.0f}/с)")
+        print(f"Объектов: {stats['objects']} (дельт {stats['deltas']}), сжатые данные "
+              f"{stats['data_bytes'] / 1024 / 1024:.1f} МБ, файл {stats['file_bytes'] / 1024 / 1024:.1f} МБ, "
+              f"исходный JSON {raw_bytes / 1024 / 1024:.1f} МБ")
+
+        sample = random.Random(1)
+        list_times, find_times, read_times = [], [], []
+        for _ in range(args.queries):
+            prompt_id = sample.choice(ids)
+            t0 = time.perf_counter()
+            entries = history.list(prompt_id)
+            t1 = time.perf_counter()
+            moment = started_at + timedelta(minutes=sample.randrange(args.revisions), seconds=30)
+            entry = history.find(prompt_id, moment.isoformat())
+            t2 = time.perf_counter()
+            history.read(entry.sha)
+            t3 = time.perf_counter()
+            assert len(entries) == args.revisions
+            list_times.append(t1 - t0)
+            find_times.append(t2 - t1)
+            read_times.append(t3 - t2)
+        for name, values in (("список истории", list_times), ("поиск по времени", find_times),
+                             ("восстановление", read_times)):
+            p50, p95 = percentiles(values)
+            print(f"{name:<18} p50 {p50:.3f} мс  p95 {p95:.3f} мс  (среднее {statistics.mean(values) * 1000:.3f} мс)")
+
+        started = time.perf_counter()
+        removed = history.compact(keep_last=args.revisions // 2)
+        stats = history.stats()
+        print(f"compact(keep_last={args.revisions // 2}): {time.perf_counter() - started:.1f} с, удалено "
+              f"ревизий {removed['revisions']}, объектов {removed['objects']}; файл "
+              f"{stats['file_bytes'] / 1024 / 1024:.1f} МБ")
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
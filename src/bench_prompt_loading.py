@@ -0,0 +1,83 @@
+# src/bench_prompt_loading.py
+"""
+Бенчмарк холодной загрузки библиотеки промптов: последовательно vs параллельно.
+
+Копирует папку prompts/ во временную директорию N раз (по умолчанию 10x и 100x)
+и замеряет PromptLoader в последовательном режиме, в пуле потоков и в пуле процессов.
+
+Запуск из папки src:
+    python bench_prompt_loading.py --source ../prompts --factors 10 100
+"""
+import argparse
+import logging
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from prompt_loader import PromptLoader
+
+
+def replicate_library(source: Path, target: Path, factor: int) -> List[Path]:
+    """Создаёт factor копий каждого файла (уникальные имена, та же структура категорий)"""
+    paths = []
+    for file_path in sorted(source.rglob("*.json")):
+        rel_dir = file_path.parent.relative_to(source)
+        (target / rel_dir).mkdir(parents=True, exist_ok=True)
+        for i in range(factor):
+            copy_path = target / rel_dir / f"{file_path.stem}_{i}.json"
+            shutil.copyfile(file_path, copy_path)
+            paths.append(copy_path)
+    return paths
+
+
+def measure(loader: PromptLoader, paths: List[Path], repeats: int) -> float:
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        report = loader.load(paths)
+        durations.append(time.perf_counter() - started)
+        if report.failures:
+            print(f"  ! ошибок разбора: {len(report.failures)}")
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="../prompts", help="Исходная папка с промптами")
+    parser.add_argument("--factors", type=int, nargs="+", default=[10, 100], help="Коэффициенты размножения")
+    parser.add_argument("--repeats", type=int, default=3, help="Повторов на каждый режим (берётся медиана)")
+    parser.add_argument("--workers", type=int, default=None, help="Размер пула")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Размер пачки файлов")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    source = Path(args.source)
+    if not source.exists():
+        print(f"Папка {source} не найдена")
+        sys.exit(1)
+
+    modes = {
+        "serial": PromptLoader(max_workers=1),
+        "threads": PromptLoader(max_workers=args.workers, chunk_size=args.chunk_size),
+        "processes": PromptLoader(max_workers=args.workers, chunk_size=args.chunk_size,
+                                  use_processes=True, process_threshold=0),
+    }
+
+    for factor in args.factors:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = replicate_library(source, Path(tmp), factor)
+            print(f"\n=== {factor}x: {len(paths)} файлов ===")
+            baseline = None
+            for name, loader in modes.items():
+                duration = measure(loader, paths, args.repeats)
+                baseline = baseline or duration
+                rate = len(paths) / duration if duration else 0
+                print(f"{name:<10} {duration * 1000:>9.1f} мс  {rate:>9.0f} файлов/с  x{baseline / duration:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# src/bench_stream_decoder.py
+"""
+Бенчмарк разбора потоковых ответов (stream_decoder).
+
+Записывает синтетические потоки на --tokens токенов (по токену на чанк, как
+отдают серверы): SSE в формате OpenAI-совместимых API и NDJSON в формате
+Ollama, с русским и английским текстом. Каждый поток разбирается прежним
+способом (iter_lines / aiter_lines, decode, startswith('data: '), json.loads на
+каждую строку) и через stream_decoder, из одного и того же источника байтов:
+для requests — Response поверх BytesIO с порциями по 512 байт, для httpx —
+поток из порций случайного размера, как при чтении из сети.
+Печатается число чанков в секунду (лучший из --repeat прогонов).
+
+Запуск из папки src:
+    python bench_stream_decoder.py --tokens 100000
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import time
+
+import requests
+
+from stream_decoder import READ_CHUNK_SIZE, aiter_ndjson, aiter_sse_json, iter_ndjson, iter_sse_json
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+WORDS = ["привет", " мир", " prompt", " модель", " token", " ответ", ",", " и", " the", " генерация", ".", "\n"]
+
+
+def record_sse(tokens: int) -> bytes:
+    rng = random.Random(1)
+    parts = []
+    for i in range(tokens):
+        chunk = {
+            "id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 1700000000 + i // 50,
+            "model": "qwen3-8b", "system_fingerprint": "fp_bench",
+            "choices": [{"index": 0, "delta": {"content": rng.choice(WORDS)}, "logprobs": None,
+                         "finish_reason": None}],
+        }
+        parts.append(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+    final = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "model": "qwen3-8b",
+             "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+             "usage": {"prompt_tokens": 12, "completion_tokens": tokens}}
+    parts.append(b"data: " + json.dumps(final).encode("utf-8") + b"\n\n")
+    parts.append(b"data: [DONE]\n\n")
+    return b"".join(parts)
+
+
+def record_ndjson(tokens: int) -> bytes:
+    rng = random.Random(2)
+    parts = []
+    for i in range(tokens):
+        chunk = {"model": "qwen3:8b", "created_at": "2025-01-01T00:00:00.000000Z",
+                 "message": {"role": "assistant", "content": rng.choice(WORDS)}, "done": False}
+        parts.append(json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n")
+    final = {"model": "qwen3:8b", "created_at": "2025-01-01T00:00:00.000000Z",
+             "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "stop",
+             "total_duration": 1, "eval_count": tokens}
+    parts.append(json.dumps(final).encode("utf-8") + b"\n")
+    return b"".join(parts)
+
+
+def network_chunks(data: bytes, seed: int):
+    """Порции случайного размера; границы попадают и внутрь многобайтных символов"""
+    rng = random.Random(seed)
+    chunks, pos = [], 0
+    while pos < len(data):
+        size = rng.randint(64, 1500)
+        chunks.append(data[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def make_response(data: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(data)
+    return response
+
+
+def legacy_sse(data: bytes) -> int:
+    # Прежний OpenAICompatibleClient._handle_stream
+    count = 0
+    for line in make_response(data).iter_lines():
+        if line:
+            decoded_line = line.decode('utf-8')
+            if decoded_line.startswith('data: '):
+                content = decoded_line[6:]
+                if content.strip() == "[DONE]":
+                    break
+                json.loads(content)
+                count += 1
+    return count
+
+
+def decoder_sse(data: bytes) -> int:
+    return sum(1 for _ in iter_sse_json(make_response(data).iter_content(chunk_size=READ_CHUNK_SIZE)))
+
+
+def legacy_ndjson(data: bytes) -> int:
+    # Прежний генератор OllamaClient
+    return sum(1 for line in make_response(data).iter_lines() if line and json.loads(line) is not None)
+
+
+def decoder_ndjson(data: bytes) -> int:
+    return sum(1 for _ in iter_ndjson(make_response(data).iter_content(chunk_size=READ_CHUNK_SIZE)))
+
+
+if httpx is not None:
+    class _ChunkStream(httpx.AsyncByteStream):
+        def __init__(self, chunks):
+            self.chunks = chunks
+
+        async def __aiter__(self):
+            for chunk in self.chunks:
+                yield chunk
+
+
+async def legacy_async_sse(chunks) -> int:
+    count = 0
+    async for line in httpx.Response(200, stream=_ChunkStream(chunks)).aiter_lines():
+        if line.startswith('data: '):
+            if line[6:].strip() == "[DONE]":
+                break
+            json.loads(line[6:])
+            count += 1
+    return count
+
+
+async def decoder_async_sse(chunks) -> int:
+    count = 0
+    async for _ in aiter_sse_json(httpx.Response(200, stream=_ChunkStream(chunks)).aiter_bytes()):
+        count += 1
+    return count
+
+
+async def legacy_async_ndjson(chunks) -> int:
+    count = 0
+    async for line in httpx.Response(200, stream=_ChunkStream(chunks)).aiter_lines():
+        if line:
+            json.loads(line)
+            count += 1
+    return count
+
+
+async def decoder_async_ndjson(chunks) -> int:
+    count = 0
+    async for _ in aiter_ndjson(httpx.Response(200, stream=_ChunkStream(chunks)).aiter_bytes()):
+        count += 1
+    return count
+
+
+def measure(func, repeat: int):
+    best, count = None, 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return count, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=100000, help="Токенов (чанков) в потоке")
+    parser.add_argument("--repeat", type=int, default=5, help="Число прогонов каждого варианта")
+    args = parser.parse_args()
+
+    sse = record_sse(args.tokens)
+    ndjson = record_ndjson(args.tokens)
+    print(f"SSE: {len(sse) / 1024 / 1024:.1f} МБ, NDJSON: {len(ndjson) / 1024 / 1024:.1f} МБ, "
+          f"{args.tokens} токенов")
+
+    cases = [
+        ("SSE, requests", lambda: legacy_sse(sse), lambda: decoder_sse(sse)),
+        ("NDJSON, requests", lambda: legacy_ndjson(ndjson), lambda: decoder_ndjson(ndjson)),
+    ]
+    if httpx is not None:
+        sse_chunks = network_chunks(sse, 3)
+        ndjson_chunks = network_chunks(ndjson, 4)
+        cases += [
+            ("SSE, httpx", lambda: asyncio.run(legacy_async_sse(sse_chunks)),
+             lambda: asyncio.run(decoder_async_sse(sse_chunks))),
+            ("NDJSON, httpx", lambda: asyncio.run(legacy_async_ndjson(ndjson_chunks)),
+             lambda: asyncio.run(decoder_async_ndjson(ndjson_chunks))),
+        ]
+    else:
+        print("httpx не установлен, асинхронные варианты пропущены")
+
+    for name, legacy, decoder in cases:
+        legacy_count, legacy_time = measure(legacy, args.repeat)
+        decoder_count, decoder_time = measure(decoder, args.repeat)
+        if legacy_count != decoder_count:
+            print(f"{name}: разное число чанков ({legacy_count} и {decoder_count})")
+        print(f"{name:<18} построчно {legacy_count / legacy_time:>10,.0f} чанков/с   "
+              f"stream_decoder {decoder_count / decoder_time:>10,.0f} чанков/с   "
+              f"(x{legacy_time / decoder_time:.2f})")
+
+
+if __name__ == "__main__":
+    main()
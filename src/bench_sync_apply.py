@@ -0,0 +1,134 @@
+# src/bench_sync_apply.py
+"""
+Бенчмарк фазы применения изменений синхронизации (SyncManager._apply_changes).
+
+Собирает синтетический архив prompts.zip из N файлов (копии промптов из prompts/ с
+новыми id) и применяет его к пустой библиотеке (все файлы новые) и к библиотеке,
+где все файлы отличаются (все файлы обновляются). Разбор выполняется последовательно,
+в пуле потоков и в пуле процессов; запись всегда идёт одним пакетом хранилища.
+Сеть не используется: индекс строится прямо по локальному архиву.
+
+Настройки и кэши каждого прогона пишутся во временную папку, а не в папку
+настроек пользователя.
+
+Запуск из папки src:
+    python bench_sync_apply.py --source ../prompts --files 20000
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import List
+
+from llm_settings import Settings
+from prompt_loader import PromptLoader
+from storage import LocalStorage
+from sync_manager import SyncManager
+
+
+def build_archive(source: Path, archive_path: Path, total: int) -> List[str]:
+    """Архив с папкой prompts/ из total файлов: копии исходных промптов с новыми id"""
+    templates = sorted(source.rglob("*.json"))
+    rel_paths = []
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(total):
+            template = templates[i % len(templates)]
+            data = json.loads(template.read_text(encoding="utf-8"))
+            data["id"] = str(uuid.UUID(int=i + 1))
+            rel_path = f"{template.parent.name}/{data['id']}.json"
+            zf.writestr(f"prompts/{rel_path}", json.dumps(data, ensure_ascii=False, indent=2))
+            rel_paths.append(rel_path)
+    return rel_paths
+
+
+def prepare_outdated_library(archive_path: Path, target: Path):
+    """Библиотека с теми же файлами, но другим содержимым: при синхронизации обновится всё"""
+    with zipfile.ZipFile(archive_path) as zf:
+        for info in zf.infolist():
+            data = json.loads(zf.read(info))
+            data["title"] = data.get("title", "") + " (старая версия)"
+            file_path = target / Path(info.filename).relative_to("prompts")
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    # Локальные файлы должны быть старше удалённых, иначе обновление будет пропущено
+    past = time.time() - 3600
+    for file_path in target.rglob("*.json"):
+        os.utime(file_path, (past, past))
+
+
+def run(archive_path: Path, library: Path, config_dir: Path, loader) -> dict:
+    # Settings определяет папку по этим переменным (Linux, Windows, macOS);
+    # у каждого прогона свои настройки, чтобы флаги is_local не переходили между ними
+    for name in ("XDG_CONFIG_HOME", "APPDATA", "HOME"):
+        os.environ[name] = str(config_dir)
+
+    storage = LocalStorage(str(library), use_snapshot=False)
+    progress = []
+    manager = SyncManager(storage, Settings(), progress_cb=progress.append, loader=loader)
+
+    started = time.perf_counter()
+    local_index = manager._scan_local()
+    with zipfile.ZipFile(archive_path) as zf:
+        remote_index = manager._build_index_from_zip(zf, local_index)
+    indexed = time.perf_counter()
+    with storage.batch():
+        counts = manager._apply_changes(local_index, remote_index)
+    applied = time.perf_counter()
+    return {"index": indexed - started, "apply": applied - indexed, "counts": counts,
+            "progress_messages": len(progress)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="../prompts", help="Исходная папка с промптами")
+    parser.add_argument("--files", type=int, default=20000, help="Число файлов в синтетическом архиве")
+    parser.add_argument("--workers", type=int, default=None, help="Размер пула")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Размер пачки файлов")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    source = Path(args.source)
+    if not source.exists():
+        print(f"Папка {source} не найдена")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        modes = {
+            "serial": PromptLoader(max_workers=1),
+            "threads": PromptLoader(max_workers=args.workers, chunk_size=args.chunk_size),
+            "processes": PromptLoader(max_workers=args.workers, chunk_size=args.chunk_size,
+                                      use_processes=True, process_threshold=0),
+        }
+
+        archive_path = tmp / "prompts.zip"
+        build_archive(source, archive_path, args.files)
+        outdated = tmp / "outdated"
+        prepare_outdated_library(archive_path, outdated)
+        print(f"Архив: {args.files} файлов, {archive_path.stat().st_size / 1024 / 1024:.1f} МБ")
+
+        for scenario in ("new", "update"):
+            print(f"\n=== {scenario} ===")
+            for name, loader in modes.items():
+                library = tmp / f"lib_{scenario}_{name}"
+                if scenario == "update":
+                    shutil.copytree(outdated, library)
+                result = run(archive_path, library, tmp / f"config_{scenario}_{name}", loader)
+                new, upd, delt = result["counts"]
+                rate = args.files / result["apply"] if result["apply"] else 0
+                print(f"{name:<10} индекс {result['index'] * 1000:>8.0f} мс  применение "
+                      f"{result['apply'] * 1000:>8.0f} мс  {rate:>7.0f} файлов/с  "
+                      f"(+{new} Δ{upd} -{delt}, сообщений прогресса: {result['progress_messages']})")
+                shutil.rmtree(library, ignore_errors=True)
+                shutil.rmtree(tmp / f"config_{scenario}_{name}", ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+import requests
 
 from interfaces import ProviderClient
-from ollama_client import OllamaClient
-from openai_client import OpenAICompatibleClient
+from ollama_client import AsyncOllamaClient, OllamaClient
+from openai_client import AsyncOpenAICompatibleClient, OpenAICompatibleClient
 
 logger = logging.getLogger(__name__)
 
@@ -12,10 +14,13 @@ class LLMClientFactory:
     """
     Простая фабрика: сравнение только со строковым client_type из model_config.
     Классы не храним в мапах, создаём на месте. Дефолты — внутри веток.
+    С use_async=True создаются асинхронные варианты (AsyncProviderClient) для LLMClient.achat.
+    session передаётся синхронным провайдерам (общий пул соединений из ClientRegistry).
     """
 
     @staticmethod
-    def create_provider(model_config: Dict[str, Any]) -> ProviderClient:
+    def create_provider(model_config: Dict[str, Any], *, use_async: bool = False,
+                        session: Optional[requests.Session] = None) -> ProviderClient:
         raw_ct = model_config.get("client_type")
         if not raw_ct:
             raise ValueError(f"Для модели '{model_config.get('name')}' не указан 'client_type'.")
@@ -28,26 +33,29 @@ class LLMClientFactory:
         # Нормализованные параметры
         api_base = model_config.get("api_base")
         api_key = model_config.get("api_key")
+        openai_cls = AsyncOpenAICompatibleClient if use_async else OpenAICompatibleClient
+        transport = {} if use_async else {"session": session}
 
         # === Ветвление строго по строке ===
         if client_type == "ollama":
             # Ollama API (не OpenAI-совместимый). Дефолт: 11434 без /v1.
             api_base = "http://localhost:11434"
-            logger.info("   - Класс: OllamaClient, URL: %s", api_base)
+            ollama_cls = AsyncOllamaClient if use_async else OllamaClient
+            logger.info("   - Класс: %s, URL: %s", ollama_cls.__name__, api_base)
             # Если ваш OllamaClient поддерживает base_url — передаем; иначе уберите аргумент.
-            return OllamaClient()
+            return ollama_cls(**transport)
 
         elif client_type == "lmstudio":
             # OpenAI-совместимый. Дефолт: 1234 с /v1.
             api_base = "http://127.0.0.1:1234/v1"
-            logger.info("   - Класс: OpenAICompatibleClient, URL: %s", api_base)
-            return OpenAICompatibleClient(api_key=api_key, base_url=api_base)
+            logger.info("   - Класс: %s, URL: %s", openai_cls.__name__, api_base)
+            return openai_cls(api_key=api_key, base_url=api_base, **transport)
 
         elif client_type == "jan":
             # OpenAI-совместимый. Дефолт: 1337 с /v1. <-- ВАЖНО: не 11434!
             api_base = "http://127.0.0.1:1337/v1"
-            logger.info("   - Класс: OpenAICompatibleClient, URL: %s", api_base)
-            return OpenAICompatibleClient(api_key=api_key, base_url=api_base)
+            logger.info("   - Класс: %s, URL: %s", openai_cls.__name__, api_base)
+            return openai_cls(api_key=api_key, base_url=api_base, **transport)
 
         elif client_type == "openai_compatible":
             # Универсальный OpenAI-совместимый: обязателен api_base.
@@ -55,8 +63,8 @@ class LLMClientFactory:
                 raise ValueError(
                     f"Для 'openai_compatible' модели '{name}' должен быть указан 'api_base'."
                 )
-            logger.info("   - Класс: OpenAICompatibleClient, URL: %s", api_base)
-            return OpenAICompatibleClient(api_key=api_key, base_url=api_base, )
+            logger.info("   - Класс: %s, URL: %s", openai_cls.__name__, api_base)
+            return openai_cls(api_key=api_key, base_url=api_base, **transport)
 
         else:
             raise ValueError(
@@ -0,0 +1,128 @@
+# src/client_registry.py
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from client_factory import LLMClientFactory
+from interfaces import ProviderClient
+from lmstudio_api import LMStudioInference
+
+log = logging.getLogger(__name__)
+
+# Соединений в пуле на один хост: параллельные генерации + проверка соединения
+POOL_MAXSIZE = 16
+# Повторы только там, где запрос до сервера не дошёл или сервер явно просит повторить
+# (429/502/503 с Retry-After); обрывы чтения не повторяются, чтобы не запускать
+# генерацию дважды
+RETRY = Retry(
+    total=3,
+    connect=3,
+    read=0,
+    status=2,
+    backoff_factor=0.5,
+    status_forcelist=(429, 502, 503),
+    allowed_methods=frozenset({"GET", "POST"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+
+def make_session(pool_maxsize: int = POOL_MAXSIZE, retry: Retry = RETRY) -> requests.Session:
+    """requests.Session с пулом keep-alive соединений и политикой повторов"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class ClientRegistry:
+    """
+    Общий на процесс реестр клиентов провайдеров.
+
+    Провайдер и его сессия создаются один раз на ключ (client_type, api_base,
+    хеш api_key) и дальше переиспользуются всеми RequestWorker и проверками
+    соединения, поэтому повторный запрос к тому же серверу не платит за TCP и TLS.
+    Провайдеры не хранят состояния между запросами и безопасны для
+    одновременного использования из нескольких потоков.
+
+    Асинхронные провайдеры (use_async=True) здесь не кешируются: их пул
+    привязан к циклу событий, и жизнью такого клиента управляет вызывающий код.
+    """
+
+    def __init__(self, pool_maxsize: int = POOL_MAXSIZE):
+        self.pool_maxsize = pool_maxsize
+        self._lock = threading.Lock()
+        self._providers: Dict[Tuple[str, str, str], ProviderClient] = {}
+        self._sessions: Dict[Tuple[str, str, str], requests.Session] = {}
+
+    @staticmethod
+    def _key(client_type: str, api_base: Optional[str], api_key: Optional[str]) -> Tuple[str, str, str]:
+        # Сам ключ API в словаре не хранится
+        key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16] if api_key else ""
+        return client_type, (api_base or "").rstrip("/"), key_hash
+
+    def _session(self, key: Tuple[str, str, str]) -> requests.Session:
+        session = self._sessions.get(key)
+        if session is None:
+            session = make_session(self.pool_maxsize)
+            self._sessions[key] = session
+        return session
+
+    def get_provider(self, model_config: Dict[str, Any]) -> ProviderClient:
+        """Провайдер для модели; при первом обращении создаётся через LLMClientFactory"""
+        client_type = str(model_config.get("client_type") or "").strip().lower()
+        key = self._key(client_type, model_config.get("api_base"), model_config.get("api_key"))
+        with self._lock:
+            provider = self._providers.get(key)
+            if provider is None:
+                provider = LLMClientFactory.create_provider(model_config, session=self._session(key))
+                self._providers[key] = provider
+                log.info("Провайдер %s добавлен в реестр (всего %d)", provider.__class__.__name__,
+                         len(self._providers))
+            return provider
+
+    def lmstudio(self, base_url: str = "http://localhost:1234/v1") -> LMStudioInference:
+        """Клиент LMStudioInference с общей сессией для base_url"""
+        key = self._key("lmstudio_inference", base_url, None)
+        with self._lock:
+            client = self._providers.get(key)
+            if client is None:
+                client = LMStudioInference(base_url, session=self._session(key))
+                self._providers[key] = client
+            return client
+
+    def close_all(self):
+        """Закрывает все сессии (соединения пула) и очищает реестр; вызывается при выходе"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._providers.clear()
+            self._sessions.clear()
+        for session in sessions:
+            try:
+                session.close()
+            except Exception as e:
+                log.warning(f"Ошибка при закрытии сессии: {str(e)}")
+        log.info("Реестр клиентов закрыт, сессий закрыто: %d", len(sessions))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"providers": len(self._providers), "sessions": len(self._sessions)}
+
+
+_registry: Optional[ClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ClientRegistry:
+    """Реестр клиентов процесса"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry()
+        return _registry
@@ -565,17 +565,19 @@ class ExcelPromptImporter:
 
             # После подтверждения сохраняем промпты
             successful_prompts = 0
-            for prompt_data in all_prompts:
-                try:
-                    self.prompt_manager.add_prompt(prompt_data)
-                    successful_prompts += 1
-                    processed_count += 1
-                except Exception as e:
-                    self.logger.error(
-                        f"Ошибка при добавлении промпта {prompt_data.get('title', 'Unknown')}: {str(e)}",
-                        exc_info=True
-                    )
-                    continue
+            # Настройки и индекс путей записываются один раз после всего импорта
+            with self.prompt_manager.storage.batch():
+                for prompt_data in all_prompts:
+                    try:
+                        self.prompt_manager.add_prompt(prompt_data)
+                        successful_prompts += 1
+                        processed_count += 1
+                    except Exception as e:
+                        self.logger.error(
+                            f"Ошибка при добавлении промпта {prompt_data.get('title', 'Unknown')}: {str(e)}",
+                            exc_info=True
+                        )
+                        continue
 
             # После успешного сохранения перемещаем файлы в архив только если все промпты сохранены успешно
             if successful_prompts == len(all_prompts):
@@ -0,0 +1,68 @@
+import argparse
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sync_index import git_blob_sha
+
+MANIFEST_VERSION = 1
+
+
+def setup_logging():
+    """Настройка логирования"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+
+def build_manifest(source: Path, base_url: str) -> dict:
+    """
+    Манифест библиотеки: для каждого .json-файла в source — его git-sha и размер.
+    Ключи — пути относительно source (posix), как в индексах SyncManager.
+    """
+    files = {}
+    for file_path in sorted(source.rglob("*.json")):
+        rel_path = file_path.relative_to(source).as_posix()
+        if any(part.startswith(".") for part in rel_path.split("/")):
+            continue
+        content = file_path.read_bytes()
+        files[rel_path] = {"sha": git_blob_sha(content), "size": len(content)}
+    return {
+        "version": MANIFEST_VERSION,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "base_url": base_url,
+        "files": files,
+    }
+
+
+def main():
+    """Генерирует manifest.json для дельта-синхронизации, публикуется рядом с prompts.zip"""
+    parser = argparse.ArgumentParser(description="Генерация манифеста библиотеки промптов")
+    parser.add_argument("--source", type=Path, default=Path("prompts"), help="папка с промптами")
+    parser.add_argument("--output", type=Path, default=Path("manifest.json"), help="куда записать манифест")
+    parser.add_argument("--base-url", required=True,
+                        help="URL папки, из которой клиент скачивает отдельные файлы "
+                             "(абсолютный или относительно URL манифеста)")
+    args = parser.parse_args()
+
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    try:
+        if not args.source.is_dir():
+            raise FileNotFoundError(f"Папка {args.source} не найдена")
+        manifest = build_manifest(args.source, args.base_url.rstrip("/"))
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+        logger.info(f"Манифест записан в {args.output}: {len(manifest['files'])} файлов")
+    except Exception as e:
+        logger.error(f"Ошибка при генерации манифеста: {str(e)}", exc_info=True)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Iterable, Union, List, Optional, Tuple
+from typing import Dict, Any, AsyncIterator, Iterable, Union, List, Optional, Tuple
 
 
 class ILLMClient(ABC):
@@ -161,6 +161,44 @@ class ProviderClient(ABC):
         ...
 
 
+class AsyncProviderClient(ProviderClient):
+    """
+    Асинхронный вариант ProviderClient.
+
+    prepare_payload и методы extract_* остаются синхронными (это чистая обработка
+    словарей), а send_request становится корутиной: генерация не занимает поток,
+    и десятки запросов могут идти в одном цикле событий asyncio. HTTP-соединения
+    клиент держит открытыми между запросами; по окончании работы нужно вызвать
+    aclose() или использовать клиент как `async with`.
+    """
+
+    @abstractmethod
+    async def send_request(
+            self,
+            payload: Dict[str, Any],
+            api_key: Optional[str] = None
+    ) -> Union[Dict[str, Any], AsyncIterator[Dict[str, Any]]]:
+        """
+        Асинхронно отправляет подготовленный payload на эндпоинт API.
+
+        Returns:
+            - Если stream=False: Полный JSON-ответ в виде словаря.
+            - Если stream=True: Асинхронный итератор по чанкам ответа. Соединение
+              освобождается, когда итератор исчерпан или закрыт (aclose()).
+        """
+        ...
+
+    async def aclose(self) -> None:
+        """Закрывает HTTP-соединения клиента."""
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
 class LLMClientError(Exception):
     """Базовое исключение для ошибок LLM клиентов"""
     pass
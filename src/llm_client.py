@@ -1,8 +1,10 @@
-from collections.abc import Iterable, Generator
-from typing import Any, Dict, List, Union
+import asyncio
+from collections.abc import AsyncIterator, Iterable, Generator
+from typing import Any, Dict, List, Optional, Union
 import logging
 
-from interfaces import ProviderClient
+from interfaces import AsyncProviderClient, LLMConfigurationError, ProviderClient
+from response_cache import ResponseCache, get_response_cache
 
 log = logging.getLogger(__name__)
 
@@ -10,10 +12,17 @@ class LLMClient:
     """
     Универсальный клиент-фасад. Его задача - взять запрос, передать его
     правильному провайдеру и вернуть "сырой" ответ от API.
+
+    Кэш ответов включается явно: параметром cache или флагом
+    model_config["inference"]["cache"] (тогда используется общий кэш из папки
+    настроек). Повторный запрос с тем же payload возвращается из кэша в той же
+    форме: словарь или генератор чанков.
     """
-    def __init__(self, provider: ProviderClient, model_config: Dict[str, Any]):
+    def __init__(self, provider: ProviderClient, model_config: Dict[str, Any],
+                 cache: Optional[ResponseCache] = None):
         self.provider = provider
         self.model_config = model_config
+        self.cache = cache
         self.model = model_config.get('name', 'unknown_model')
         log.info("LLMClient создан для модели '%s' с провайдером %s", self.model, provider.__class__.__name__)
 
@@ -26,16 +35,70 @@ class LLMClient:
             - Если stream=True: Итератор по JSON-чанкам ответа.
         """
         log.info("Вызван метод chat (stream=%s)", stream)
+        payload, api_key = self._build_payload(messages, stream, kwargs)
+        cache = self._response_cache()
+        if cache is None:
+            return self.provider.send_request(payload,api_key=api_key)
+
+        key = cache.make_key(self.provider, payload)
+        cached = cache.get(key)
+        if cached is not None:
+            log.info("Ответ взят из кэша")
+            return cache.replay(cached) if stream else cached
+        response = self.provider.send_request(payload, api_key=api_key)
+        if stream:
+            return cache.wrap_stream(key, response)
+        cache.store(key, response)
+        return response
+
+    async def achat(self, messages: List[Dict[str, str]], *, stream: bool = False, **kwargs: Any) -> Union[Dict[str, Any], AsyncIterator[Dict[str, Any]]]:
+        """
+        Асинхронный вариант chat для провайдеров AsyncProviderClient.
+
+        Returns:
+            - Если stream=False: Полный JSON-ответ от API в виде словаря.
+            - Если stream=True: Асинхронный итератор по JSON-чанкам ответа.
+        """
+        if not isinstance(self.provider, AsyncProviderClient):
+            raise LLMConfigurationError(
+                f"Провайдер {self.provider.__class__.__name__} не поддерживает асинхронные запросы"
+            )
+        log.info("Вызван метод achat (stream=%s)", stream)
+        payload, api_key = self._build_payload(messages, stream, kwargs)
+        cache = self._response_cache()
+        if cache is None:
+            return await self.provider.send_request(payload, api_key=api_key)
+
+        # Запросы к SQLite (чтение, запись с вытеснением) выполняются в потоке,
+        # чтобы не останавливать цикл событий и остальные запросы на нём
+        key = cache.make_key(self.provider, payload)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            log.info("Ответ взят из кэша")
+            return cache.areplay(cached) if stream else cached
+        response = await self.provider.send_request(payload, api_key=api_key)
+        if stream:
+            return cache.awrap_stream(key, response)
+        await asyncio.to_thread(cache.store, key, response)
+        return response
+
+    def _response_cache(self) -> Optional[ResponseCache]:
+        enabled = self.model_config.get('inference', {}).get('cache', self.cache is not None)
+        if not enabled:
+            return None
+        return self.cache if self.cache is not None else get_response_cache()
+
+    def _build_payload(self, messages: List[Dict[str, str]], stream: bool, kwargs: Dict[str, Any]):
         # Извлекаем API-ключ из конфигурации
         api_key = self.model_config.get("api_key")
         all_opts = self.model_config.get('generation', {}).copy()
         all_opts.update(self.model_config.get('inference', {}))
         all_opts.update(kwargs)
         all_opts.pop('stream', None)
+        all_opts.pop('cache', None)
 
         payload = self.provider.prepare_payload(
             messages, self.model, stream=stream, **all_opts
         )
         log.debug("--- Финальный Payload ---\n%s", payload)
-
-        return self.provider.send_request(payload,api_key=api_key)
\ No newline at end of file
+        return payload, api_key
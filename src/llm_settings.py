@@ -3,7 +3,10 @@ import logging
 import os
 import secrets
 import sys
+import tempfile
+import threading
 from base64 import urlsafe_b64encode, urlsafe_b64decode
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Dict, Any, Optional
 
@@ -22,6 +25,12 @@ class Settings:
         self.api_keys_file = self.settings_dir / '.keystore'
         self.key_encryption = KeyEncryption()
 
+        # Отложенная запись: внутри batch() save_settings только помечает настройки
+        # как изменённые, а файл переписывается один раз при выходе из блока
+        self._batch_depth = 0
+        self._dirty = False
+        self._save_lock = threading.RLock()
+
         # Структура настроек по умолчанию
         self.default_settings = {
             "favorites": {},  # id промпта: True/False
@@ -35,7 +44,8 @@ class Settings:
                 "last_category": "Все категории",
                 "last_tag": "Все теги",
                 "last_language": "Все"
-            }
+            },
+            "auto_sync_minutes": 0  # интервал фоновой синхронизации, 0 — выключена (включается в настройках)
         }
 
         # Структура API ключей по умолчанию
@@ -106,14 +116,53 @@ class Settings:
             return self.default_settings.copy()
 
     def save_settings(self):
-        """Сохранение настроек в файл"""
+        """Сохранение настроек в файл (внутри batch() запись откладывается)"""
+        with self._save_lock:
+            if self._batch_depth > 0:
+                self._dirty = True
+                return
+            self._write_settings()
+
+    @contextmanager
+    def batch(self):
+        """
+        Контекстный менеджер для массовых изменений: все вызовы save_settings()
+        внутри блока объединяются в одну запись settings.json при выходе.
+        Блоки могут быть вложенными.
+        """
+        with self._save_lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._save_lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._dirty:
+                    self._write_settings()
+
+    def flush(self):
+        """Немедленно записывает отложенные изменения, если они есть"""
+        with self._save_lock:
+            if self._dirty:
+                self._write_settings()
+
+    def _write_settings(self):
+        """Атомарная запись настроек: временный файл + os.replace"""
+        self._dirty = False
         try:
             # Убеждаемся, что директория существует
             self.settings_dir.mkdir(parents=True, exist_ok=True)
 
-            # Сохраняем настройки
-            with open(self.settings_file, 'w', encoding='utf-8') as f:
-                json.dump(self.settings, f, indent=2, ensure_ascii=False)
+            # Пишем во временный файл рядом с settings.json и подменяем его,
+            # чтобы прерванная запись не оставила повреждённый файл
+            fd, tmp_path = tempfile.mkstemp(dir=self.settings_dir, prefix='.settings.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self.settings, f, indent=2, ensure_ascii=False)
+                os.replace(tmp_path, self.settings_file)
+            except BaseException:
+                Path(tmp_path).unlink(missing_ok=True)
+                raise
         except Exception as e:
             self.logger.error(f"Ошибка сохранения настроек: {str(e)}", exc_info=True)
             # Выводим дополнительную информацию для отладки
@@ -172,6 +221,18 @@ class Settings:
             self.settings["filters"]["last_language"]
         )
 
+    def get_auto_sync_interval(self) -> int:
+        """Интервал фоновой синхронизации в минутах (0 — выключена)"""
+        try:
+            return max(0, int(self.settings.get("auto_sync_minutes", self.default_settings["auto_sync_minutes"])))
+        except (TypeError, ValueError):
+            return self.default_settings["auto_sync_minutes"]
+
+    def set_auto_sync_interval(self, minutes: int):
+        """Установка интервала фоновой синхронизации в минутах (0 — выключена)"""
+        self.settings["auto_sync_minutes"] = max(0, int(minutes))
+        self.save_settings()
+
     def get_local_updated_at(self, prompt_id: str) -> str:
         """Получение локального времени изменения файла"""
         return self.settings["local_updated_at"].get(prompt_id)
@@ -1,9 +1,18 @@
-import json
 import logging
-from typing import List, Dict, Generator, Union
+from typing import AsyncIterator, List, Dict, Generator, Optional, Tuple, Union
 
 import requests
 
+from stream_decoder import READ_CHUNK_SIZE, aiter_sse_json, iter_sse_json
+
+try:
+    import httpx
+
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
 
 class LMStudioInference:
     """Класс для работы с LMStudio API"""
@@ -41,9 +50,10 @@ class LMStudioInference:
         }
     }
 
-    def __init__(self, base_url: str = "http://localhost:1234/v1"):
+    def __init__(self, base_url: str = "http://localhost:1234/v1", session: Optional[requests.Session] = None):
         self.logger = logging.getLogger(__name__)
         self.base_url = base_url
+        self.session = session if session is not None else requests.Session()
         # self.logger.info("Инициализация LMStudioInference...")
 
     def format_messages(self, messages: List[Dict[str, str]], chat_format: str = "chatml") -> str:
@@ -91,36 +101,68 @@ class LMStudioInference:
             self.logger.info("Начало получения потокового ответа")
             chunks_received = 0
             
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        line = line.decode('utf-8')
-                        if line.startswith('data: '):
-                            data = line[6:]  # Убираем префикс 'data: '
-                            if data == '[DONE]':
-                                self.logger.info(f"Получение завершено. Всего получено чанков: {chunks_received}")
-                                break
-                                
-                            try:
-                                json_data = json.loads(data)
-                                if "choices" in json_data and len(json_data["choices"]) > 0:
-                                    delta = json_data["choices"][0].get("delta", {})
-                                    if "content" in delta:
-                                        content = delta["content"]
-                                        chunks_received += 1
-                                        if chunks_received % 50 == 0:  # Логируем каждые 50 чанков
-                                            self.logger.info(f"Получено чанков: {chunks_received}")
-                                        yield content
-                            except json.JSONDecodeError as je:
-                                self.logger.warning(f"Ошибка декодирования JSON: {str(je)}")
-                                continue
-                    except UnicodeDecodeError as ue:
-                        self.logger.warning(f"Ошибка декодирования строки: {str(ue)}")
-                        continue
-            
+            # Ссылка на итератор байтов держится до drain_conn: закрытый раньше времени,
+            # он закрыл бы соединение вместо возврата в пул
+            byte_chunks = response.iter_content(chunk_size=READ_CHUNK_SIZE)
+            for json_data in iter_sse_json(byte_chunks):
+                content = self._content_from_chunk(json_data)
+                if content is not None:
+                    chunks_received += 1
+                    if chunks_received % 50 == 0:  # Логируем каждые 50 чанков
+                        self.logger.info(f"Получено чанков: {chunks_received}")
+                    yield content
+            self.logger.info(f"Получение завершено. Всего получено чанков: {chunks_received}")
+            # Дочитываем конец тела после [DONE], чтобы соединение вернулось в пул
+            response.raw.drain_conn()
+
         except Exception as e:
             self.logger.error(f"Ошибка при обработке потокового ответа: {str(e)}", exc_info=True)
             raise
+        finally:
+            response.close()
+
+    @staticmethod
+    def _content_from_chunk(json_data: Dict) -> Optional[str]:
+        """
+        Извлекает фрагмент текста из чанка SSE-потока
+
+        Returns:
+            Optional[str]: Фрагмент текста или None, если в чанке его нет
+        """
+        choices = json_data.get("choices")
+        if choices:
+            delta = choices[0].get("delta") or {}
+            if "content" in delta:
+                return delta["content"]
+        return None
+
+    def _build_request(self, messages: List[Dict[str, str]], **kwargs) -> Tuple[str, Dict]:
+        """
+        Формирует URL и параметры потокового запроса к модели
+
+        Returns:
+            Tuple[str, Dict]: URL запроса и тело запроса
+        """
+        # Форматируем сообщения в соответствии с выбранным форматом чата
+        chat_format = kwargs.pop("chat_format", "chatml")
+        formatted_prompt = self.format_messages(messages, chat_format)
+
+        # Формируем URL для запроса
+        url = f"{self.base_url}/chat/completions"
+
+        # Подготавливаем параметры
+        params = {
+            "model": kwargs.get("model", "local-model"),
+            "messages": [{"role": "user", "content": formatted_prompt}],
+            "temperature": kwargs.get("temperature", 0.7),
+            "max_tokens": kwargs.get("max_new_tokens", 4096),
+            "top_p": kwargs.get("top_p", 0.95),
+            "repeat_penalty": kwargs.get("repeat_penalty", 1.1),
+            "presence_penalty": kwargs.get("presence_penalty", 0.0),
+            "frequency_penalty": kwargs.get("frequency_penalty", 0.0),
+            "stream": True  # Включаем потоковый режим
+        }
+        return url, params
 
     def query_model(self, messages: List[Dict[str, str]], **kwargs) -> Generator[str, None, None]:
         """
@@ -138,31 +180,13 @@ class LMStudioInference:
             Exception: При других ошибках
         """
         try:
-            # Форматируем сообщения в соответствии с выбранным форматом чата
-            chat_format = kwargs.pop("chat_format", "chatml")
-            formatted_prompt = self.format_messages(messages, chat_format)
-
-            # Формируем URL для запроса
-            url = f"{self.base_url}/chat/completions"
-
-            # Подготавливаем параметры
-            params = {
-                "model": kwargs.get("model", "local-model"),
-                "messages": [{"role": "user", "content": formatted_prompt}],
-                "temperature": kwargs.get("temperature", 0.7),
-                "max_tokens": kwargs.get("max_new_tokens", 4096),
-                "top_p": kwargs.get("top_p", 0.95),
-                "repeat_penalty": kwargs.get("repeat_penalty", 1.1),
-                "presence_penalty": kwargs.get("presence_penalty", 0.0),
-                "frequency_penalty": kwargs.get("frequency_penalty", 0.0),
-                "stream": True  # Включаем потоковый режим
-            }
+            url, params = self._build_request(messages, **kwargs)
 
             self.logger.debug(f"Отправка запроса к LMStudio: {url}")
             self.logger.debug(f"Параметры: {params}")
 
             # Отправляем запрос
-            response = requests.post(url, json=params, stream=True)
+            response = self.session.post(url, json=params, stream=True)
             response.raise_for_status()
 
             # Возвращаем генератор для потокового ответа
@@ -185,7 +209,112 @@ class LMStudioInference:
             bool: True если API доступен, False в противном случае
         """
         try:
-            response = requests.get(f"{self.base_url}/models")
+            response = self.session.get(f"{self.base_url}/models")
             return response.status_code == 200
         except:
             return False
+
+
+class AsyncLMStudioInference(LMStudioInference):
+    """
+    Асинхронный вариант LMStudioInference на httpx.
+
+    query_model — корутина, возвращающая асинхронный итератор по частям ответа,
+    check_connection — корутина. Форматы чата и параметры запроса те же, что у
+    синхронного класса. Соединения переиспользуются между запросами; по окончании
+    работы нужно вызвать aclose().
+    """
+
+    def __init__(self, base_url: str = "http://localhost:1234/v1", max_connections: int = 100):
+        if not HTTPX_AVAILABLE:
+            raise ImportError("Для асинхронного клиента требуется пакет httpx (pip install httpx)")
+        super().__init__(base_url, session=None)
+        # Как и у requests в синхронном классе, время генерации не ограничивается
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(None),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def _astream_response(self, response: "httpx.Response") -> AsyncIterator[str]:
+        """
+        Обрабатывает потоковый ответ от API
+
+        Args:
+            response: Ответ от API
+
+        Yields:
+            str: Части ответа
+        """
+        try:
+            self.logger.info("Начало получения потокового ответа")
+            chunks_received = 0
+
+            async for json_data in aiter_sse_json(response.aiter_bytes()):
+                content = self._content_from_chunk(json_data)
+                if content is not None:
+                    chunks_received += 1
+                    if chunks_received % 50 == 0:  # Логируем каждые 50 чанков
+                        self.logger.info(f"Получено чанков: {chunks_received}")
+                    yield content
+            self.logger.info(f"Получение завершено. Всего получено чанков: {chunks_received}")
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при обработке потокового ответа: {str(e)}", exc_info=True)
+            raise
+        finally:
+            await response.aclose()
+
+    async def query_model(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """
+        Отправляет запрос к модели и возвращает асинхронный итератор потокового ответа
+
+        Args:
+            messages: Список сообщений
+            **kwargs: Дополнительные параметры
+
+        Returns:
+            AsyncIterator[str]: Асинхронный итератор по частям ответа
+
+        Raises:
+            ConnectionError: Если не удалось подключиться к API
+            Exception: При других ошибках
+        """
+        try:
+            url, params = self._build_request(messages, **kwargs)
+
+            self.logger.debug(f"Отправка асинхронного запроса к LMStudio: {url}")
+            self.logger.debug(f"Параметры: {params}")
+
+            request = self.client.build_request("POST", url, json=params)
+            response = await self.client.send(request, stream=True)
+            if response.is_error:
+                await response.aclose()
+                response.raise_for_status()
+
+            return self._astream_response(response)
+
+        except httpx.ConnectError:
+            error_msg = "Не удалось подключиться к LMStudio. Убедитесь, что приложение запущено и API доступен."
+            self.logger.error(error_msg)
+            raise ConnectionError(error_msg)
+        except Exception as e:
+            error_msg = f"Ошибка при запросе к LMStudio: {str(e)}"
+            self.logger.error(error_msg, exc_info=True)
+            raise Exception(error_msg)
+
+    async def check_connection(self) -> bool:
+        """
+        Проверяет доступность LMStudio API
+
+        Returns:
+            bool: True если API доступен, False в противном случае
+        """
+        try:
+            response = await self.client.get(f"{self.base_url}/models", timeout=10)
+            return response.status_code == 200
+        except Exception:
+            return False
+
+    async def aclose(self):
+        """Закрывает HTTP-соединения клиента"""
+        await self.client.aclose()
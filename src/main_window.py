@@ -5,20 +5,26 @@ from pathlib import Path
 
 from PyQt6.QtCore import pyqtSlot, QThread, Qt
 from PyQt6.QtGui import QIcon
-from PyQt6.QtWidgets import QMainWindow, QListWidget, QPushButton, \
-    QLineEdit, QLabel, QMessageBox, QComboBox, QProgressDialog
+from PyQt6.QtWidgets import QMainWindow, QListView, QPushButton, \
+    QLineEdit, QLabel, QMessageBox, QComboBox, QProgressDialog, QAbstractItemView
 from PyQt6.QtWidgets import QVBoxLayout, QWidget, QHBoxLayout
 
 from api_keys_dialog import ApiKeysDialog
+from client_registry import get_registry
 from  feedback_dialog import FeedbackDialog
 from feedback_sender import send_feedback
 from llm_settings import Settings
 from preview import PromptPreview
 from prompt_editor import PromptEditor
+from prompt_index import SORT_FAVORITES_FIRST, SORT_TITLE, SORT_CREATED_AT, SORT_CATEGORY
+from prompt_list_model import PromptListModel
 from prompt_manager import PromptManager
+from prompt_watcher import PromptWatcher
+from search_scheduler import SearchScheduler
 from settings_window import SettingsDialog
 from sync_log_dialog import SyncLogDialog
 from sync_manager import SyncManager
+from sync_scheduler import SyncScheduler
 from sync_worker import SyncWorker
 
 APP_INFO = {
@@ -71,6 +77,9 @@ class MainWindow(QMainWindow):
             "По дате создания",
             "По категории"
         ]
+        self.SORT_KEYS = dict(zip(self.SORT_OPTIONS, [
+            SORT_FAVORITES_FIRST, SORT_TITLE, SORT_CREATED_AT, SORT_CATEGORY
+        ]))
         self.sort_combo = QComboBox()
         self.sort_combo.addItems(self.SORT_OPTIONS)
         self.sort_direction = QPushButton("↓")
@@ -78,9 +87,20 @@ class MainWindow(QMainWindow):
         self.sort_direction.clicked.connect(self.toggle_sort_direction)
         self.sort_ascending = True
 
+        # Фильтрация выполняется в фоне; менеджер берётся при каждом запросе,
+        # так как settings_changed() заменяет self.prompt_manager
+        self.search_scheduler = SearchScheduler(
+            lambda **filters: self.prompt_manager.filter_prompts(**filters), parent=self)
+        self.search_scheduler.results_ready.connect(self._apply_filter_results)
+        self.search_scheduler.failed.connect(self._on_filter_failed)
+
         # UI Components
-        self.prompt_list = QListWidget()
-        self.prompt_list.setSelectionMode(QListWidget.SelectionMode.ExtendedSelection)  # Множественный выбор
+        # Список на модели: строки отрисовываются только для видимой области
+        self.prompt_model = PromptListModel(self)
+        self.prompt_list = QListView()
+        self.prompt_list.setModel(self.prompt_model)
+        self.prompt_list.setUniformItemSizes(True)
+        self.prompt_list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)  # Множественный выбор
         self.search_field = QLineEdit()
         self.add_button = QPushButton("Добавить промпт")
         self.preview_button = QPushButton("Просмотр")
@@ -91,6 +111,15 @@ class MainWindow(QMainWindow):
         self.sync_button = QPushButton("🔄 Синхронизация")
         self.sync_button.clicked.connect(self.run_sync)
 
+        # Фоновая синхронизация по расписанию; менеджер создаётся на каждый запуск,
+        # так как settings_changed() заменяет self.prompt_manager
+        self.sync_scheduler = SyncScheduler(
+            self._create_sync_manager,
+            interval_s=self.settings.get_auto_sync_interval() * 60,
+            parent=self,
+        )
+        self.sync_scheduler.sync_finished.connect(self._on_sync_diff)
+
         # Инициализация компонентов
         self.settings_button = QPushButton("⚙️")
         self.settings_button.setToolTip("Настройки")
@@ -185,19 +214,23 @@ class MainWindow(QMainWindow):
         self.add_button.clicked.connect(self.open_editor)
         self.edit_button.clicked.connect(self.edit_selected)
         self.delete_button.clicked.connect(self.delete_selected)
-        self.search_field.textChanged.connect(self.filter_prompts)
+        self.search_field.textChanged.connect(self._on_search_text_changed)
         self.lang_filter.currentTextChanged.connect(self.filter_prompts)
         self.favorite_filter.clicked.connect(self.filter_prompts)
         self.local_filter.clicked.connect(self.filter_prompts)
         self.category_filter.currentTextChanged.connect(self.filter_prompts)
         self.tag_filter.currentTextChanged.connect(self.filter_prompts)
         self.sort_combo.currentTextChanged.connect(self.filter_prompts)
-        self.prompt_list.itemDoubleClicked.connect(self.show_action_dialog)
+        self.prompt_list.doubleClicked.connect(self.show_action_dialog)
         self.preview_button.clicked.connect(self.preview_selected)
         self.feedback_button.clicked.connect(self.show_feedback_dialog)
 
         # Load initial data
         self.load_prompts()
+        if self.settings.get_auto_sync_interval() > 0:
+            self.sync_scheduler.start()
+        self.prompt_watcher = None
+        self._start_prompt_watcher()
 
     def run_sync(self):
         # 1. Создаем диалог для логов
@@ -207,14 +240,12 @@ class MainWindow(QMainWindow):
         prompts_dir = Path(self.prompt_manager.storage_path)
 
         # Создаем экземпляр SyncManager, передавая ему путь и ОБЪЕКТ НАСТРОЕК
-        sync_manager = SyncManager(
-            storage=self.prompt_manager.storage, # <-- ПЕРЕДАЕМ LocalStorage
-            settings=self.settings
-        )
+        # (ссылка сохраняется: по завершении из него берётся last_diff)
+        self._sync_manager = self._create_sync_manager()
 
         # 3. Создаем воркер и передаем ему только что созданный менеджер
         self._sync_thread = QThread(self)
-        worker = SyncWorker(sync_manager)
+        worker = SyncWorker(self._sync_manager)
         worker.moveToThread(self._sync_thread)
 
         # 4. Соединяем сигналы с колбэками диалога
@@ -244,12 +275,62 @@ class MainWindow(QMainWindow):
 
         # 2. Обновляем данные и показываем финальное сообщение
         if ok:
-            self.load_prompts()
+            self._on_sync_diff(self._sync_manager.last_diff)
+            # Ручная синхронизация заменяет ближайшую фоновую
+            self.sync_scheduler.reset()
             # Финальное сообщение можно не показывать, т.к. лог уже есть
             # QMessageBox.information(self, "Синхронизация", msg)
         else:
             QMessageBox.critical(self, "Синхронизация", msg)
 
+    def _create_sync_manager(self) -> SyncManager:
+        return SyncManager(storage=self.prompt_manager.storage, settings=self.settings)
+
+    def closeEvent(self, event):
+        # Фоновые наблюдатели останавливаются до уничтожения окна
+        self.sync_scheduler.stop()
+        if self.prompt_watcher is not None:
+            self.prompt_watcher.stop()
+        # Keep-alive соединения к LLM-серверам закрываются явно
+        get_registry().close_all()
+        super().closeEvent(event)
+
+    def _start_prompt_watcher(self):
+        """Следит за папкой текущего хранилища (для SQLite файлов промптов нет)"""
+        if self.prompt_watcher is not None:
+            self.prompt_watcher.stop()
+            self.prompt_watcher.deleteLater()
+            self.prompt_watcher = None
+        if not hasattr(self.prompt_manager.storage, "refresh_files"):
+            return
+        self.prompt_watcher = PromptWatcher(self.prompt_manager.storage, parent=self)
+        self.prompt_watcher.files_changed.connect(self._on_files_changed)
+        self.prompt_watcher.start()
+
+    @pyqtSlot(list, list)
+    def _on_files_changed(self, prompts: list, removed_ids: list):
+        """Файлы промптов изменены извне: обновляем только затронутые записи"""
+        self.logger.debug(f"Изменены файлы промптов: перечитано {len(prompts)}, удалено {len(removed_ids)}")
+        self._patch_prompts(lambda: self.prompt_manager.apply_prompt_changes(prompts, removed_ids))
+
+    @pyqtSlot(object)
+    def _on_sync_diff(self, diff):
+        """Точечное обновление списка по результату синхронизации (SyncDiff)"""
+        if diff.empty:
+            return
+        self._patch_prompts(lambda: self.prompt_manager.apply_sync_diff(diff))
+
+    def _patch_prompts(self, apply):
+        index = self.prompt_manager.prompt_index
+        options = (index.categories(), index.tags())
+        apply()
+        if (index.categories(), index.tags()) != options:
+            # Изменился состав категорий или тегов: обновляем и выпадающие списки
+            self.load_prompts()
+        else:
+            # Модель сама вычисляет минимальные изменения строк
+            self.filter_prompts()
+
     @pyqtSlot()
     def show_feedback_dialog(self):
         """
@@ -284,7 +365,7 @@ class MainWindow(QMainWindow):
 
     # Метод для отображения диалога настроек
     def show_settings_dialog(self):
-        dialog = SettingsDialog(self)
+        dialog = SettingsDialog(self, settings=self.settings)
         dialog.settings_changed.connect(self.settings_changed)
         dialog.exec()
 
@@ -293,6 +374,22 @@ class MainWindow(QMainWindow):
         self.logger.debug("Обнаружены изменения в настройках")
         self.prompt_manager = PromptManager()
         self.load_prompts()
+        self._start_prompt_watcher()
+        self._apply_auto_sync_interval()
+
+    def _apply_auto_sync_interval(self):
+        """Перезапускает фоновую синхронизацию с интервалом из настроек (0 — выключает)"""
+        interval_s = self.settings.get_auto_sync_interval() * 60
+        if interval_s <= 0:
+            self.sync_scheduler.stop()
+            return
+        if self.sync_scheduler.active and self.sync_scheduler.interval_s == interval_s:
+            return
+        self.sync_scheduler.interval_s = interval_s
+        if self.sync_scheduler.active:
+            self.sync_scheduler.reset()
+        else:
+            self.sync_scheduler.start()
 
     def toggle_sort_direction(self):
         """Переключение направления сортировки"""
@@ -345,46 +442,28 @@ class MainWindow(QMainWindow):
             self.lang_filter.blockSignals(True)
             self.sort_combo.blockSignals(True)
 
-            self.prompt_list.clear()
-            prompts = self.prompt_manager.list_prompts()
-            self.logger.debug(f"load_prompts: Получено промптов: {len(prompts)}")
-
-            # Сортируем промпты по названию (начальная сортировка)
-            prompts.sort(key=lambda x: x.title.lower(), reverse=not self.sort_ascending)
-
-            # Добавляем отсортированные промпты в список
-            for prompt in prompts:
-                item_text = f"{prompt.title} ({prompt.id})"
-                self.prompt_list.addItem(item_text)
-
-            # Проверяем, что промпты добавились
-            self.logger.debug(f"load_prompts: Количество элементов в списке: {self.prompt_list.count()}")
-
-            # Обновляем список категорий
-            categories = set()
-            tags = set()
-            for prompt in prompts:
-                categories.add(prompt.category)
-                if hasattr(prompt, 'tags'):
-                    tags.update(prompt.tags)
-
+            # Сам список заполняет filter_prompts() в finally; здесь только фильтры
+            index = self.prompt_manager.prompt_index
+            categories = index.categories()
+            tags = index.tags()
+            self.logger.debug(f"load_prompts: Промптов в индексе: {len(index)}")
             self.logger.debug(f"load_prompts: Найдено категорий: {len(categories)}")
             self.logger.debug(f"load_prompts: Найдено тегов: {len(tags)}")
 
             # Обновляем списки фильтров
             self.category_filter.clear()
             self.category_filter.addItem("Все категории")
-            self.category_filter.addItems(sorted(categories))
+            self.category_filter.addItems(categories)
 
             self.tag_filter.clear()
             self.tag_filter.addItem("Все теги")
-            self.tag_filter.addItems(sorted(tags))
+            self.tag_filter.addItems(tags)
 
             # Восстанавливаем состояние фильтров
             self.restore_filter_state(filter_state)
 
             # Обновляем заголовок окна со статистикой
-            total_prompts = len(prompts)
+            total_prompts = len(index)
             self.setWindowTitle(f"Prompt Manager - Загружено промптов: {total_prompts}")
 
         finally:
@@ -397,116 +476,58 @@ class MainWindow(QMainWindow):
             # Применяем фильтры к обновленному списку
             self.filter_prompts()
 
-    def filter_prompts(self):
-        """Фильтрация и сортировка промптов"""
-        try:
-            # Получаем все промпты
-            prompts = self.prompt_manager.list_prompts()
-            # self.logger.debug(f"filter_prompts: Начало фильтрации, всего промптов: {len(prompts)}")
-            filtered_prompts = []
-
-            # Применяем фильтры
-            search_query = self.search_field.text().lower()
-            category_filter = self.category_filter.currentText()
-            lang_filter = self.lang_filter.currentText()
-            tag_filter = self.tag_filter.currentText()
-            show_favorites = self.favorite_filter.isChecked()
-            show_local_only = self.local_filter.isChecked()
-
-            # self.logger.debug(f"filter_prompts: Параметры фильтрации: поиск='{search_query}', категория='{category_filter}', тег='{tag_filter}', язык='{lang_filter}', избранное={show_favorites}")
-
-            for prompt in prompts:
-                # Проверяем все условия фильтрации
-                matches = True
-
-                # Фильтр по избранному
-                if show_favorites and not getattr(prompt, 'is_favorite', False):
-                    matches = False
-
-                # Фильтр по локальным
-                if show_local_only and not getattr(prompt, 'is_local', True):
-                    matches = False
-
-                # Фильтр по поисковому запросу
-                if search_query:
-                    content_text = ""
-                    if isinstance(prompt.content, dict):
-                        content_text = prompt.content.get('ru', '') + " " + prompt.content.get('en', '')
-                    else:
-                        content_text = str(prompt.content)
-
-                    if not (search_query in prompt.title.lower() or
-                            search_query in content_text.lower()):
-                        matches = False
-
-                # Фильтр по категории
-                if category_filter != "Все категории" and prompt.category != category_filter:
-                    matches = False
-
-                # Фильтр по тегам
-                if tag_filter != "Все теги":
-                    if not hasattr(prompt, 'tags') or tag_filter not in prompt.tags:
-                        matches = False
-
-                # Фильтр по языку
-                if lang_filter != "Все":
-                    if isinstance(prompt.content, dict):
-                        if lang_filter == "RU" and not prompt.content.get('ru'):
-                            matches = False
-                        elif lang_filter == "EN" and not prompt.content.get('en'):
-                            matches = False
-                    else:
-                        # Если content - строка, то считаем что подходит для любого языка
-                        pass
-
-                if matches:
-                    filtered_prompts.append(prompt)
-
-            self.logger.debug(f"filter_prompts: После фильтрации осталось промптов: {len(filtered_prompts)}")
-
-            # Применяем сортировку
-            sort_type = self.sort_combo.currentText()
-            reverse = not self.sort_ascending
+    def filter_prompts(self, *_args, debounce: bool = False):
+        """Фильтрация и сортировка промптов в фоне (через PromptIndex в PromptManager)"""
+        category_filter = self.category_filter.currentText()
+        tag_filter = self.tag_filter.currentText()
+        lang_filter = self.lang_filter.currentText()
+        filters = {
+            "search": self.search_field.text(),
+            "category": None if category_filter == "Все категории" else category_filter,
+            "tag": None if tag_filter == "Все теги" else tag_filter,
+            "language": None if lang_filter == "Все" else lang_filter.lower(),
+            "favorites_only": self.favorite_filter.isChecked(),
+            "local_only": self.local_filter.isChecked(),
+            "sort_key": self.SORT_KEYS.get(self.sort_combo.currentText(), SORT_TITLE),
+            "ascending": self.sort_ascending,
+        }
+        self.search_scheduler.schedule(filters, immediate=not debounce)
 
-            sort_strategies = {
-                self.SORT_OPTIONS[0]: lambda x: (not x.is_favorite, x.title.lower()),  # Сначала избранное
-                self.SORT_OPTIONS[1]: lambda x: x.title.lower(),  # По названию
-                self.SORT_OPTIONS[2]: lambda x: x.created_at,  # По дате создания
-                self.SORT_OPTIONS[3]: lambda x: x.category.lower()  # По категории
-            }
-            filtered_prompts.sort(key=sort_strategies[sort_type], reverse=reverse)
+    def _on_search_text_changed(self, _text: str):
+        # Ввод в поле поиска откладывается, пока пользователь печатает
+        self.filter_prompts(debounce=True)
 
-            # Обновляем список
-            self.prompt_list.clear()
-            for prompt in filtered_prompts:
-                item_text = f"{prompt.title} ({prompt.id})"
-                self.prompt_list.addItem(item_text)
+    @pyqtSlot(list)
+    def _apply_filter_results(self, filtered_prompts: list):
+        """Результат актуального запроса фильтрации из SearchScheduler"""
+        self.logger.debug(f"filter_prompts: После фильтрации осталось промптов: {len(filtered_prompts)}")
 
-            # Проверяем, что промпты добавились после фильтрации
-            # self.logger.debug(f"filter_prompts: Количество элементов в списке после фильтрации: {self.prompt_list.count()}")
+        # Модель сама вычисляет минимальные изменения строк
+        self.prompt_model.set_prompts(filtered_prompts)
 
-            # Обновляем статистику
-            total_prompts = len(prompts)
-            filtered_count = len(filtered_prompts)
-            self.setWindowTitle(f"Prompt Manager - Показано {filtered_count} из {total_prompts}")
+        # Обновляем статистику
+        total_prompts = len(self.prompt_manager.prompt_index)
+        filtered_count = len(filtered_prompts)
+        self.setWindowTitle(f"Prompt Manager - Показано {filtered_count} из {total_prompts}")
 
-        except Exception as e:
-            self.logger.error(f"Ошибка фильтрации: {str(e)}", exc_info=True)
-            QMessageBox.critical(self, "Ошибка", f"Не удалось выполнить фильтрацию: {str(e)}")
+    @pyqtSlot(str)
+    def _on_filter_failed(self, message: str):
+        self.logger.error(f"Ошибка фильтрации: {message}")
+        QMessageBox.critical(self, "Ошибка", f"Не удалось выполнить фильтрацию: {message}")
 
     def preview_selected(self):
         """Открытие предпросмотра"""
-        selected_items = self.prompt_list.selectedItems()
-        if not selected_items:
+        selected_ids = self.selected_prompt_ids()
+        if not selected_ids:
             QMessageBox.warning(self, "Ошибка", "Выберите промпт для просмотра")
             return
 
         # Подтверждение при большом количестве выбранных промптов
-        if len(selected_items) > 3:
+        if len(selected_ids) > 3:
             confirm = QMessageBox.question(
                 self,
                 "Подтверждение",
-                f"Вы выбрали {len(selected_items)} промптов для просмотра.\n"
+                f"Вы выбрали {len(selected_ids)} промптов для просмотра.\n"
                 "Будет открыто несколько окон предпросмотра.\n\n"
                 "Продолжить?",
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
@@ -515,8 +536,7 @@ class MainWindow(QMainWindow):
                 return
 
         try:
-            for item in selected_items:
-                prompt_id = item.text().split('(')[-1].rstrip(')')
+            for prompt_id in selected_ids:
                 prompt = self.prompt_manager.get_prompt(prompt_id)
                 if prompt:
                     preview = PromptPreview(prompt, self.settings)
@@ -540,16 +560,15 @@ class MainWindow(QMainWindow):
 
     def edit_selected(self):
         """Редактирование выбранных промптов"""
-        selected_items = self.prompt_list.selectedItems()
-        if not selected_items:
+        selected_ids = self.selected_prompt_ids()
+        if not selected_ids:
             QMessageBox.warning(self, "Ошибка", "Выберите промпты для редактирования")
             return
 
         try:
             # Подготовка списка промптов для редактирования
             prompts_to_edit = []
-            for item in selected_items:
-                prompt_id = item.text().split('(')[-1].rstrip(')')
+            for prompt_id in selected_ids:
                 prompt = self.prompt_manager.get_prompt(prompt_id)
                 if prompt:
                     prompts_to_edit.append((prompt_id, prompt.title))
@@ -605,16 +624,15 @@ class MainWindow(QMainWindow):
 
     def delete_selected(self):
         """Удаление выбранных промптов"""
-        selected_items = self.prompt_list.selectedItems()
-        if not selected_items:
+        selected_ids = self.selected_prompt_ids()
+        if not selected_ids:
             QMessageBox.warning(self, "Ошибка", "Выберите промпты для удаления")
             return
 
         try:
             # Подготовка списка промптов для удаления
             prompts_to_delete = []
-            for item in selected_items:
-                prompt_id = item.text().split('(')[-1].rstrip(')')
+            for prompt_id in selected_ids:
                 prompt = self.prompt_manager.get_prompt(prompt_id)
                 if prompt:
                     prompts_to_delete.append((prompt_id, prompt.title))
@@ -701,12 +719,17 @@ class MainWindow(QMainWindow):
         dialog = ApiKeysDialog(self.settings, self)
         dialog.exec()
 
-    def show_action_dialog(self, item):
+    def selected_prompt_ids(self) -> list[str]:
+        """id выделенных промптов в порядке строк списка"""
+        rows = sorted(index.row() for index in self.prompt_list.selectionModel().selectedIndexes())
+        return [self.prompt_model.prompt_id(row) for row in rows]
+
+    def show_action_dialog(self, index):
         """Показывает диалог выбора действия при двойном клике"""
-        prompt_id = item.text().split('(')[-1].rstrip(')')
+        prompt_id = index.data(PromptListModel.PromptIdRole)
         dialog = QMessageBox(self)
         dialog.setWindowTitle("Выберите действие")
-        dialog.setText(f"Выберите действие для промпта:\n{item.text()}")
+        dialog.setText(f"Выберите действие для промпта:\n{index.data()}")
         edit_button = dialog.addButton("Редактировать", QMessageBox.ButtonRole.AcceptRole)
         preview_button = dialog.addButton("Просмотреть", QMessageBox.ButtonRole.AcceptRole)
         dialog.addButton("Отмена", QMessageBox.ButtonRole.RejectRole)
@@ -1,14 +1,23 @@
 import json
 import logging
-from collections.abc import Iterable
+from collections.abc import AsyncIterator, Iterable
 from typing import Any, Dict, List, Optional, Union, Tuple
 
 import requests
 
+try:
+    import httpx
+
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
 from interfaces import (
-    ProviderClient,
-    LLMConnectionError, LLMRequestError, LLMResponseError, LLMTimeoutError
+    AsyncProviderClient, ProviderClient,
+    LLMConfigurationError, LLMConnectionError, LLMRequestError, LLMResponseError, LLMTimeoutError
 )
+from stream_decoder import READ_CHUNK_SIZE, aiter_ndjson, iter_ndjson
 
 log = logging.getLogger(__name__)
 
@@ -19,9 +28,10 @@ class OllamaClient(ProviderClient):
     использующая эндпоинт /api/chat.
     """
 
-    def __init__(self):
+    def __init__(self, session: Optional[requests.Session] = None):
         self.endpoint = "http://localhost:11434/api/chat"
-        self.session = requests.Session()
+        # Общая сессия из ClientRegistry держит соединения между запросами
+        self.session = session if session is not None else requests.Session()
         self.session.headers.update({"Content-Type": "application/json"})
         log.info("Нативный Ollama HTTP клиент инициализирован. Endpoint: %s", self.endpoint)
 
@@ -57,20 +67,7 @@ class OllamaClient(ProviderClient):
 
             # Проверяем на ошибки HTTP (4xx, 5xx)
             if not resp.ok:
-                # Пытаемся извлечь детальное сообщение из тела ответа
-                try:
-                    error_details = resp.json()
-                    # Ollama обычно возвращает ошибку в ключе 'error'
-                    error_message = error_details.get('error', str(error_details))
-                except json.JSONDecodeError:
-                    error_message = resp.text.strip()  # Если ответ не JSON
-
-                # Создаем наше кастомное, информативное исключение
-                raise LLMRequestError(
-                    message=f"Ошибка API: {error_message}",
-                    status_code=resp.status_code,
-                    response_text=resp.text
-                )
+                raise self._request_error(resp.status_code, resp.text)
 
             log.info("Запрос к Ollama успешно выполнен.")
 
@@ -78,12 +75,10 @@ class OllamaClient(ProviderClient):
             if is_stream:
                 def stream_generator():
                     try:
-                        for line in resp.iter_lines():
-                            if line:
-                                yield json.loads(line)
+                        yield from iter_ndjson(resp.iter_content(chunk_size=READ_CHUNK_SIZE))
                     except requests.exceptions.ChunkedEncodingError as e:
                         raise LLMResponseError(f"Ошибка при чтении потокового ответа: {e}") from e
-                    except json.JSONDecodeError as e:
+                    except ValueError as e:
                         raise LLMResponseError(f"Ошибка декодирования JSON из потока: {e}") from e
 
                 return stream_generator()
@@ -102,6 +97,23 @@ class OllamaClient(ProviderClient):
             # Общая ошибка для всех остальных проблем requests
             raise LLMConnectionError(f"Сетевая ошибка Ollama: {e}") from e
 
+    @staticmethod
+    def _request_error(status_code: int, text: str) -> LLMRequestError:
+        """Собирает информативное исключение из HTTP-ответа с ошибкой (4xx, 5xx)"""
+        # Пытаемся извлечь детальное сообщение из тела ответа
+        try:
+            error_details = json.loads(text)
+            # Ollama обычно возвращает ошибку в ключе 'error'
+            error_message = error_details.get('error', str(error_details))
+        except (json.JSONDecodeError, AttributeError):
+            error_message = text.strip()  # Если ответ не JSON
+
+        return LLMRequestError(
+            message=f"Ошибка API: {error_message}",
+            status_code=status_code,
+            response_text=text
+        )
+
     def extract_choices(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
         return [response] if 'message' in response else []
 
@@ -215,3 +227,70 @@ class OllamaClient(ProviderClient):
         except Exception as e:
             log.warning(f"Ошибка при проверке метаданных в чанке: {e}")
             return None
+
+
+class AsyncOllamaClient(OllamaClient, AsyncProviderClient):
+    """
+    Асинхронный клиент нативного API Ollama (/api/chat) на httpx.
+
+    Payload и разбор чанков наследуются от OllamaClient, поток NDJSON отдаётся
+    как асинхронный итератор. Один экземпляр держит пул соединений и должен
+    использоваться в одном цикле событий.
+    """
+
+    def __init__(self, max_connections: int = 100):
+        if not HTTPX_AVAILABLE:
+            raise LLMConfigurationError("Для асинхронного клиента требуется пакет httpx (pip install httpx)")
+        self.endpoint = "http://localhost:11434/api/chat"
+        self.client = httpx.AsyncClient(
+            headers={"Content-Type": "application/json"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        log.info("Асинхронный Ollama HTTP клиент инициализирован. Endpoint: %s", self.endpoint)
+
+    async def send_request(self, payload: Dict[str, Any], api_key: Optional[str] = None) -> Union[
+        Dict[str, Any], AsyncIterator[Dict[str, Any]]]:
+        is_stream = payload.get("stream", False)
+        timeout = payload.pop('timeout', 180)
+
+        log.info("Отправка асинхронного запроса на %s (stream=%s)...", self.endpoint, is_stream)
+
+        try:
+            request = self.client.build_request("POST", self.endpoint, json=payload, timeout=timeout)
+            resp = await self.client.send(request, stream=is_stream)
+
+            if not resp.is_success:
+                await resp.aread()
+                await resp.aclose()
+                raise self._request_error(resp.status_code, resp.text)
+
+            log.info("Запрос к Ollama успешно выполнен.")
+
+            if is_stream:
+                return self._astream_generator(resp)
+            else:
+                try:
+                    return resp.json()
+                except json.JSONDecodeError as e:
+                    raise LLMResponseError(f"Ошибка декодирования JSON из ответа: {e}") from e
+
+        except httpx.TimeoutException as e:
+            raise LLMTimeoutError(f"Таймаут запроса к {self.endpoint} (>{timeout}s)") from e
+        except httpx.ConnectError as e:
+            raise LLMConnectionError(f"Ошибка соединения с {self.endpoint}. Сервер недоступен.") from e
+        except httpx.HTTPError as e:
+            raise LLMConnectionError(f"Сетевая ошибка Ollama: {e}") from e
+
+    async def _astream_generator(self, resp: "httpx.Response") -> AsyncIterator[Dict[str, Any]]:
+        try:
+            async for chunk in aiter_ndjson(resp.aiter_bytes()):
+                yield chunk
+        except httpx.HTTPError as e:
+            raise LLMResponseError(f"Ошибка при чтении потокового ответа: {e}") from e
+        except ValueError as e:
+            raise LLMResponseError(f"Ошибка декодирования JSON из потока: {e}") from e
+        finally:
+            await resp.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -1,12 +1,23 @@
-import json
 import time
-from collections.abc import Iterable, Generator
+from collections.abc import AsyncIterator, Iterable, Generator
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Union, Tuple
 import requests
 import logging
 
-from interfaces import ProviderClient, LLMResponseError, LLMConnectionError
+try:
+    import httpx
+
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+from interfaces import (
+    AsyncProviderClient, ProviderClient,
+    LLMConfigurationError, LLMResponseError, LLMConnectionError
+)
+from stream_decoder import READ_CHUNK_SIZE, aiter_sse_json, iter_sse_json
 
 log = logging.getLogger(__name__)
 
@@ -14,12 +25,14 @@ class OpenAICompatibleClient(ProviderClient):
     """
     Клиент для взаимодействия с любым API, совместимым с OpenAI.
     """
-    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://api.openai.com/v1"):
+    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://api.openai.com/v1",
+                 session: Optional[requests.Session] = None):
         self.base_url = base_url.rstrip('/').strip()
         # Сохраняем базовый URL, endpoint будем формировать динамически
         log.info("OpenAICompatibleClient инициализирован. Base URL: %s", self.base_url)
 
-        self.session = requests.Session()
+        # Общая сессия из ClientRegistry держит соединения между запросами
+        self.session = session if session is not None else requests.Session()
         headers = {"Content-Type": "application/json"}
         if api_key:
             headers["Authorization"] = f"Bearer {api_key}"
@@ -66,20 +79,20 @@ class OpenAICompatibleClient(ProviderClient):
             raise LLMConnectionError(f"Сетевая ошибка: {e}") from e
 
     def _handle_stream(self, response: requests.Response) -> Generator[Dict[str, Any], None, None]:
-        for line in response.iter_lines():
-            if line:
-                decoded_line = line.decode('utf-8')
-                if decoded_line.startswith('data: '):
-                    content = decoded_line[6:]
-                    if content.strip() == "[DONE]":
-                        break
-                    try:
-                        chunk = json.loads(content)
-                        yield chunk
-                        if chunk.get("choices", [{}])[0].get("finish_reason") is not None:
-                            break
-                    except json.JSONDecodeError:
-                        log.warning("Не удалось декодировать JSON-чанк: %s", content)
+        try:
+            for chunk in iter_sse_json(response.iter_content(chunk_size=READ_CHUNK_SIZE)):
+                yield chunk
+                if self._is_final_chunk(chunk):
+                    # Дочитываем хвост ([DONE], конец тела), чтобы соединение вернулось в пул
+                    response.raw.drain_conn()
+                    break
+        finally:
+            response.close()
+
+    @staticmethod
+    def _is_final_chunk(chunk: Dict[str, Any]) -> bool:
+        # Чанк только с usage приходит с пустым choices
+        return (chunk.get("choices") or [{}])[0].get("finish_reason") is not None
 
     def extract_choices(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
         return response.get("choices", [])
@@ -185,4 +198,71 @@ class OpenAICompatibleClient(ProviderClient):
             return self.extract_metadata_from_response(chunk)
 
         # --- ШАГ 3: Если это обычный чанк с контентом, возвращаем None ---
-        return None
\ No newline at end of file
+        return None
+
+
+class AsyncOpenAICompatibleClient(OpenAICompatibleClient, AsyncProviderClient):
+    """
+    Асинхронный клиент для OpenAI-совместимых API на httpx.
+
+    Формирование payload и разбор ответов наследуются от OpenAICompatibleClient;
+    отличается только транспорт: send_request — корутина, поток отдаётся как
+    асинхронный итератор. Один экземпляр держит пул соединений (до max_connections
+    одновременных запросов) и должен использоваться в одном цикле событий.
+    """
+    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://api.openai.com/v1",
+                 max_connections: int = 100):
+        if not HTTPX_AVAILABLE:
+            raise LLMConfigurationError("Для асинхронного клиента требуется пакет httpx (pip install httpx)")
+        self.base_url = base_url.rstrip('/').strip()
+        log.info("AsyncOpenAICompatibleClient инициализирован. Base URL: %s", self.base_url)
+
+        headers = {"Content-Type": "application/json"}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def send_request(self, payload: Dict[str, Any], api_key: Optional[str] = None) -> Union[Dict[str, Any], AsyncIterator[Dict[str, Any]]]:
+        is_stream = payload.get("stream", False)
+        timeout = payload.pop('timeout', 180)
+
+        headers = {}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+
+        url = f"{self.base_url}/chat/completions"
+
+        log.info("Отправка асинхронного запроса на %s (stream=%s)...", url, is_stream)
+        try:
+            request = self.client.build_request("POST", url, json=payload, headers=headers, timeout=timeout)
+            resp = await self.client.send(request, stream=is_stream)
+            try:
+                resp.raise_for_status()
+            except httpx.HTTPStatusError:
+                await resp.aclose()
+                raise
+            log.info("Запрос успешно выполнен.")
+            if is_stream:
+                return self._ahandle_stream(resp)
+            else:
+                return resp.json()
+        except httpx.HTTPError as e:
+            log.error("Сетевая ошибка при запросе к %s: %s", url, e)
+            raise LLMConnectionError(f"Сетевая ошибка: {e}") from e
+
+    async def _ahandle_stream(self, response: "httpx.Response") -> AsyncIterator[Dict[str, Any]]:
+        try:
+            async for chunk in aiter_sse_json(response.aiter_bytes()):
+                yield chunk
+                if self._is_final_chunk(chunk):
+                    break
+        except httpx.HTTPError as e:
+            raise LLMResponseError(f"Ошибка при чтении потокового ответа: {e}") from e
+        finally:
+            await response.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
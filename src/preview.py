@@ -6,7 +6,7 @@ from PyQt6.QtWidgets import (QDialog, QTextEdit, QVBoxLayout, QLabel,
                              QLineEdit, QFormLayout, QGroupBox)
 
 from MarkdownPreviewDialog import MarkdownPreviewDialog
-from lmstudio_api import LMStudioInference
+from client_registry import get_registry
 from models import Prompt, Variable
 from prompt_editor import ExampleSelectionDialog
 from ai_dialog import AIDialog
@@ -36,7 +36,7 @@ class PromptPreview(QDialog):
         except Exception as e:
             self.hf_api = None
         try:
-            self.lm_api = LMStudioInference()
+            self.lm_api = get_registry().lmstudio()
         except Exception as e:
             self.lm_api = None
 
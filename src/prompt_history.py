@@ -0,0 +1,388 @@
+# src/prompt_history.py
+import json
+import logging
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from models import Prompt
+from sync_index import git_blob_sha
+
+log = logging.getLogger(__name__)
+
+# Поля, которые не входят в ревизию: время обновления выставляется при каждом
+# создании Prompt, локальные флаги хранятся в настройках
+VOLATILE_FIELDS = ("updated_at", "is_local", "is_favorite")
+# Строки короче этого заменяются в дельте целиком
+SPLICE_MIN_LENGTH = 64
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_micros(moment: datetime) -> int:
+    """Время ревизии в микросекундах UTC (наивное время считается UTC)"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return (moment - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value: int) -> str:
+    return (_EPOCH + timedelta(microseconds=value)).isoformat(timespec="microseconds")
+
+
+def _escape_pointer(key: str) -> str:
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def _unescape_pointer(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _common_prefix(a: str, b: str, limit: int) -> int:
+    """Длина общего начала строк: двоичный поиск по сравнению срезов (сравнение идёт в C)"""
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def make_patch(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """
+    JSON Patch (RFC 6902), превращающий old в new. Словари сравниваются по ключам
+    рекурсивно, списки и короткие значения заменяются целиком. Для длинных строк
+    (текст промпта) вместо replace пишется расширение "x-splice": замена одного
+    отличающегося участка между общим началом и общим концом строки.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape_pointer(key)}"})
+        for key, value in new.items():
+            pointer = f"{path}/{_escape_pointer(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": pointer, "value": value})
+            elif old[key] != value:
+                ops.extend(make_patch(old[key], value, pointer))
+        return ops
+    if old == new:
+        return []
+    if isinstance(old, str) and isinstance(new, str) and min(len(old), len(new)) >= SPLICE_MIN_LENGTH:
+        prefix = _common_prefix(old, new, min(len(old), len(new)))
+        suffix = _common_prefix(old[prefix:][::-1], new[prefix:][::-1], min(len(old), len(new)) - prefix)
+        return [{"op": "x-splice", "path": path, "offset": prefix, "delete": len(old) - prefix - suffix,
+                 "insert": new[prefix:len(new) - suffix]}]
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def apply_patch(doc: Any, patch: Iterable[Dict[str, Any]]) -> Any:
+    """Применяет JSON Patch из make_patch (add/remove/replace по ключам словарей и x-splice)"""
+    for op in patch:
+        if op["op"] == "x-splice":
+            value = _resolve(doc, op["path"])
+            value = value[:op["offset"]] + op["insert"] + value[op["offset"] + op["delete"]:]
+            op = {"op": "replace", "path": op["path"], "value": value}
+        if op["path"] == "":
+            doc = op["value"]
+            continue
+        *parents, last = [_unescape_pointer(token) for token in op["path"].split("/")[1:]]
+        target = doc
+        for token in parents:
+            target = target[token]
+        if op["op"] == "remove":
+            del target[last]
+        elif op["op"] in ("add", "replace"):
+            target[last] = op["value"]
+        else:
+            raise ValueError(f"Неподдерживаемая операция JSON Patch: {op['op']}")
+    return doc
+
+
+def _resolve(doc: Any, path: str) -> Any:
+    for token in path.split("/")[1:]:
+        doc = doc[_unescape_pointer(token)]
+    return doc
+
+
+class HistoryEntry(NamedTuple):
+    """Ревизия промпта в истории"""
+    timestamp: str  # время ревизии (ISO, UTC)
+    sha: str        # git-sha содержимого ревизии
+
+
+class PromptHistory:
+    """
+    История версий промптов: контентно-адресуемое хранилище ревизий в SQLite.
+
+    Ревизия — содержимое файла промпта без изменчивых полей (VOLATILE_FIELDS),
+    её адрес — git-sha канонического JSON. Одинаковое содержимое (в том числе у
+    разных промптов или после отката) хранится один раз. Новый объект пишется
+    как JSON Patch к предыдущей ревизии того же промпта; длина цепочки дельт
+    ограничена MAX_DELTA_DEPTH, после чего пишется полный снимок, поэтому
+    восстановление любой ревизии стоит не больше MAX_DELTA_DEPTH патчей. Объекты
+    сжимаются zlib.
+
+    Таблица revisions с первичным ключом (prompt_id, ts) — B-дерево: список
+    истории промпта и поиск ревизии по времени выполняются за O(log n) без
+    чтения истории остальных промптов. sha хранятся как 20 байт, время — как
+    целое число микросекунд UTC. compact() удаляет старые ревизии и объекты,
+    на которые больше никто не ссылается, и сжимает файл базы.
+    """
+
+    DB_FILE_NAME = "history.db"
+    MAX_DELTA_DEPTH = 16
+    # Сколько последних записанных ревизий держать в памяти как базы для дельт
+    RECENT_CACHE_SIZE = 256
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS objects (
+            sha BLOB PRIMARY KEY,
+            base BLOB,
+            depth INTEGER NOT NULL,
+            data BLOB NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS revisions (
+            prompt_id TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            sha BLOB NOT NULL,
+            PRIMARY KEY (prompt_id, ts)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.db_path = Path(cache_dir) / self.DB_FILE_NAME
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # sha -> содержимое: база следующей правки обычно только что записана
+        self._recent: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # База открывается при первом обращении: без правок файл истории не создаётся
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    @property
+    def exists(self) -> bool:
+        return self._conn is not None or self.db_path.exists()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def revision_data(prompt: Prompt) -> Dict[str, Any]:
+        """Содержимое ревизии: данные файла промпта без изменчивых полей"""
+        # Как prompt_to_file_dict, но даты сразу строками ISO (сериализация pydantic)
+        data = prompt.model_dump(mode="json", exclude=set(VOLATILE_FIELDS))
+        if not data.get("category"):
+            data["category"] = "general"
+        return data
+
+    @staticmethod
+    def _canonical(data: Dict[str, Any]) -> bytes:
+        return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+    def record(self, prompt: Prompt, timestamp: Optional[datetime] = None) -> Optional[str]:
+        """
+        Добавляет ревизию промпта. Если содержимое совпадает с последней ревизией,
+        ничего не пишется и возвращается None, иначе — sha ревизии. Время ревизий
+        одного промпта строго возрастает: timestamp не позже последней ревизии
+        заменяется текущим временем.
+        """
+        data = self.revision_data(prompt)
+        raw = self._canonical(data)
+        sha = git_blob_sha(raw)
+        key = bytes.fromhex(sha)
+        ts = _to_micros(timestamp or datetime.utcnow())
+        with self._lock:
+            conn = self.conn
+            latest = conn.execute(
+                "SELECT ts, sha FROM revisions WHERE prompt_id = ? ORDER BY ts DESC LIMIT 1", (prompt.id,)
+            ).fetchone()
+            if latest is not None:
+                if latest[1] == key:
+                    return None
+                if ts <= latest[0]:
+                    ts = max(_to_micros(datetime.utcnow()), latest[0] + 1)
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                exists = conn.execute("SELECT 1 FROM objects WHERE sha = ?", (key,)).fetchone()
+                if exists is None:
+                    self._put_object(key, data, raw, latest[1] if latest is not None else None)
+                conn.execute("INSERT OR REPLACE INTO revisions (prompt_id, ts, sha) VALUES (?, ?, ?)",
+                             (prompt.id, ts, key))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._recent[key] = data
+            self._recent.move_to_end(key)
+            if len(self._recent) > self.RECENT_CACHE_SIZE:
+                self._recent.popitem(last=False)
+        return sha
+
+    def _put_object(self, sha: bytes, data: Dict[str, Any], raw: bytes, base_sha: Optional[bytes]):
+        # Дельта выгоднее полного снимка, только если патч заметно меньше содержимого
+        if base_sha is not None:
+            base_depth = self.conn.execute("SELECT depth FROM objects WHERE sha = ?", (base_sha,)).fetchone()
+            if base_depth is not None and base_depth[0] < self.MAX_DELTA_DEPTH:
+                base = self._recent.get(base_sha)
+                if base is None:
+                    base = self._read(base_sha)
+                patch = json.dumps(make_patch(base, data), ensure_ascii=False,
+                                   separators=(",", ":")).encode("utf-8")
+                if len(patch) < len(raw) // 2:
+                    self.conn.execute("INSERT INTO objects (sha, base, depth, data) VALUES (?, ?, ?, ?)",
+                                      (sha, base_sha, base_depth[0] + 1, zlib.compress(patch)))
+                    return
+        self.conn.execute("INSERT INTO objects (sha, base, depth, data) VALUES (?, NULL, 0, ?)",
+                          (sha, zlib.compress(raw)))
+
+    def _read(self, sha: bytes) -> Dict[str, Any]:
+        """Восстанавливает содержимое ревизии по цепочке дельт"""
+        chain = []
+        current = sha
+        while current is not None:
+            row = self.conn.execute("SELECT base, data FROM objects WHERE sha = ?", (current,)).fetchone()
+            if row is None:
+                raise KeyError(f"Объект истории {current.hex()} не найден")
+            chain.append(json.loads(zlib.decompress(row[1])))
+            current = row[0]
+        doc = chain.pop()
+        while chain:
+            doc = apply_patch(doc, chain.pop())
+        return doc
+
+    def read(self, sha: str) -> Dict[str, Any]:
+        """Содержимое ревизии по её sha (HistoryEntry.sha)"""
+        with self._lock:
+            return self._read(bytes.fromhex(sha))
+
+    def list(self, prompt_id: str) -> List[HistoryEntry]:
+        """Ревизии промпта, новые первыми"""
+        if not self.exists:
+            return []
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT ts, sha FROM revisions WHERE prompt_id = ? ORDER BY ts DESC", (prompt_id,)
+            ).fetchall()
+        return [HistoryEntry(_from_micros(ts), sha.hex()) for ts, sha in rows]
+
+    def find(self, prompt_id: str, timestamp: str) -> Optional[HistoryEntry]:
+        """
+        Ревизия, действовавшая на момент timestamp: последняя с ts <= timestamp.
+        Для момента раньше всех ревизий возвращается самая старая: в историях,
+        записанных до учёта created_at, исходная версия помечена временем первой правки.
+        """
+        ts = _to_micros(datetime.fromisoformat(timestamp))
+        if not self.exists:
+            return None
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT ts, sha FROM revisions WHERE prompt_id = ? AND ts <= ? ORDER BY ts DESC LIMIT 1",
+                (prompt_id, ts),
+            ).fetchone()
+            if row is None:
+                row = self.conn.execute(
+                    "SELECT ts, sha FROM revisions WHERE prompt_id = ? ORDER BY ts LIMIT 1", (prompt_id,)
+                ).fetchone()
+        return HistoryEntry(_from_micros(row[0]), row[1].hex()) if row is not None else None
+
+    def compact(self, keep_last: Optional[int] = None, live_ids: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        Сжимает историю: оставляет не больше keep_last последних ревизий каждого
+        промпта, удаляет историю промптов не из live_ids (если передан), затем
+        удаляет объекты, недостижимые из оставшихся ревизий (с учётом баз дельт),
+        и выполняет VACUUM. Возвращает число удалённых ревизий и объектов.
+        """
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                revisions_before = conn.execute("SELECT COUNT(*) FROM revisions").fetchone()[0]
+                if live_ids is not None:
+                    conn.execute("CREATE TEMP TABLE live_ids (prompt_id TEXT PRIMARY KEY)")
+                    conn.executemany("INSERT OR IGNORE INTO live_ids VALUES (?)", ((pid,) for pid in live_ids))
+                    conn.execute("DELETE FROM revisions WHERE prompt_id NOT IN (SELECT prompt_id FROM live_ids)")
+                    conn.execute("DROP TABLE live_ids")
+                if keep_last is not None:
+                    conn.execute(
+                        """
+                        DELETE FROM revisions WHERE (prompt_id, ts) IN (
+                            SELECT prompt_id, ts FROM (
+                                SELECT prompt_id, ts, ROW_NUMBER() OVER (
+                                    PARTITION BY prompt_id ORDER BY ts DESC) AS rn
+                                FROM revisions
+                            ) WHERE rn > ?
+                        )
+                        """,
+                        (keep_last,),
+                    )
+                revisions_removed = revisions_before - conn.execute("SELECT COUNT(*) FROM revisions").fetchone()[0]
+                # Индекса по sha в revisions нет (он удвоил бы размер таблицы), поэтому
+                # множество используемых объектов собирается во временную таблицу
+                conn.execute("CREATE TEMP TABLE referenced (sha BLOB PRIMARY KEY) WITHOUT ROWID")
+                conn.execute("INSERT OR IGNORE INTO referenced SELECT sha FROM revisions")
+                # Дельта, база которой больше не является ничьей ревизией, становится
+                # полным снимком: иначе удалённые ревизии остались бы на диске как базы
+                orphaned = [row[0] for row in conn.execute(
+                    """
+                    SELECT o.sha FROM objects o JOIN referenced r ON r.sha = o.sha
+                    WHERE o.base IS NOT NULL AND o.base NOT IN (SELECT sha FROM referenced)
+                    """
+                ).fetchall()]
+                contents = {sha: self._read(sha) for sha in orphaned}
+                for sha, data in contents.items():
+                    conn.execute("UPDATE objects SET base = NULL, depth = 0, data = ? WHERE sha = ?",
+                                 (zlib.compress(self._canonical(data)), sha))
+                objects_before = conn.execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+                conn.execute(
+                    """
+                    WITH RECURSIVE reachable(sha) AS (
+                        SELECT sha FROM referenced
+                        UNION
+                        SELECT objects.base FROM objects JOIN reachable ON objects.sha = reachable.sha
+                        WHERE objects.base IS NOT NULL
+                    )
+                    DELETE FROM objects WHERE sha NOT IN (SELECT sha FROM reachable)
+                    """
+                )
+                objects_removed = objects_before - conn.execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+                conn.execute("DROP TABLE referenced")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if revisions_removed or objects_removed:
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        log.info(f"История сжата: удалено ревизий {revisions_removed}, объектов {objects_removed}")
+        return {"revisions": revisions_removed, "objects": objects_removed}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self.conn
+            revisions = conn.execute("SELECT COUNT(*) FROM revisions").fetchone()[0]
+            objects, deltas, data_bytes = conn.execute(
+                "SELECT COUNT(*), COUNT(base), COALESCE(SUM(LENGTH(data)), 0) FROM objects").fetchone()
+        size = sum(path.stat().st_size for path in self.db_path.parent.glob(self.DB_FILE_NAME + "*"))
+        return {"revisions": revisions, "objects": objects, "deltas": deltas,
+                "data_bytes": data_bytes, "file_bytes": size}
@@ -0,0 +1,403 @@
+# src/prompt_index.py
+import logging
+import threading
+import time
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional
+
+from models import Prompt
+
+log = logging.getLogger(__name__)
+
+# Ключи сортировки (соответствуют вариантам сортировки в MainWindow)
+SORT_FAVORITES_FIRST = "favorites_first"
+SORT_TITLE = "title"
+SORT_CREATED_AT = "created_at"
+SORT_CATEGORY = "category"
+
+# Позиции установленных битов для каждого значения байта
+_BYTE_BITS = [tuple(i for i in range(8) if value >> i & 1) for value in range(256)]
+
+
+def _iter_bits(mask: int) -> Iterable[int]:
+    """Номера установленных битов по возрастанию"""
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    for byte_index, value in enumerate(data):
+        if value:
+            base = byte_index << 3
+            for bit in _BYTE_BITS[value]:
+                yield base + bit
+
+
+def _mask_from_slots(slots: List[int], size: int) -> int:
+    """Битовая маска из списка номеров слотов"""
+    if len(slots) < 16:
+        mask = 0
+        for slot in slots:
+            mask |= 1 << slot
+        return mask
+    data = bytearray((size + 7) // 8)
+    for slot in slots:
+        data[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(data, "little")
+
+
+class PromptIndex:
+    """
+    Индекс промптов в памяти для фильтрации списка в MainWindow.
+
+    Каждому промпту выделяется слот (номер бита). Для фильтров хранятся битовые
+    маски (int): категория, тег, избранное, локальные, наличие ru/en, так что
+    фильтрация сводится к пересечению масок. Для поиска хранится заранее
+    приведённый к нижнему регистру текст (title + content) и постинги
+    «слово -> маска», где слово — фрагмент текста между пробелами.
+
+    Семантика поиска прежняя — подстрока без учёта регистра: по словарю находятся
+    все слова, содержащие фрагмент запроса, их маски объединяются, а запрос из
+    нескольких слов дополнительно проверяется по тексту кандидатов. Постинги
+    строятся в фоновом потоке после rebuild(); пока они не готовы, фрагмент ищется
+    прямым проходом по текстам. Результаты по фрагментам кэшируются, и при наборе
+    следующей буквы проверяются только совпадения предыдущего фрагмента.
+
+    Порядки сортировки предвычисляются для каждого ключа и пересчитываются только
+    после изменений. Все методы потокобезопасны.
+    """
+
+    # Сколько фрагментов запроса помнить между изменениями индекса
+    FRAGMENT_CACHE_SIZE = 256
+    # Сколько постингов объединять, прежде чем перейти к проверке по тексту;
+    # столько же кандидатов проверяется по тексту вместо постингов при уточнении запроса
+    MAX_MERGED_POSTINGS = 256
+
+    def __init__(self, prompts: Iterable[Prompt] = (), background: bool = True):
+        self._lock = threading.RLock()
+        self._background = background
+        self._generation = 0
+        self.rebuild(prompts)
+
+    # --- построение и изменения ---
+
+    def rebuild(self, prompts: Iterable[Prompt]):
+        """Полностью перестраивает индекс; постинги строятся в фоне"""
+        with self._lock:
+            self._generation += 1
+            self._slots: Dict[str, int] = {}
+            self._prompts: List[Optional[Prompt]] = []
+            self._texts: List[str] = []
+            self._slot_tokens: List[frozenset] = []
+            self._free_slots: List[int] = []
+            self._alive = 0
+            self._postings: Dict[str, int] = {}
+            self._postings_ready = False
+            self._categories: Dict[str, int] = {}
+            self._tags: Dict[str, int] = {}
+            self._favorite = 0
+            self._local = 0
+            self._ru = 0
+            self._en = 0
+            self._invalidate()
+            for prompt in prompts:
+                self._add(prompt)
+            generation = self._generation
+            texts = list(enumerate(self._texts))
+
+        if self._background:
+            threading.Thread(target=self._build_postings, args=(generation, texts),
+                             name="PromptIndexBuilder", daemon=True).start()
+        else:
+            self._build_postings(generation, texts)
+
+    def _build_postings(self, generation: int, texts: List[tuple]):
+        """Строит постинги по снимку текстов и подключает их, если индекс не перестроили"""
+        started = time.perf_counter()
+        slot_tokens = []
+        postings_lists: Dict[str, List[int]] = {}
+        for slot, text in texts:
+            tokens = frozenset(text.split())
+            slot_tokens.append((slot, text, tokens))
+            for token in tokens:
+                slots = postings_lists.get(token)
+                if slots is None:
+                    postings_lists[token] = [slot]
+                else:
+                    slots.append(slot)
+            if self._generation != generation:
+                return
+        size = len(texts)
+        postings = {token: _mask_from_slots(slots, size) for token, slots in postings_lists.items()}
+
+        with self._lock:
+            if self._generation != generation:
+                return
+            self._postings = postings
+            for slot, text, tokens in slot_tokens:
+                self._slot_tokens[slot] = tokens
+            # Слоты, изменённые во время сборки, переиндексируем под блокировкой
+            built = {slot: text for slot, text, _ in slot_tokens}
+            for slot in _iter_bits(self._alive):
+                if built.get(slot) is not self._texts[slot]:
+                    self._unindex_tokens(slot)
+                    self._index_tokens(slot)
+            for slot, text in built.items():
+                if not self._alive >> slot & 1:
+                    self._unindex_tokens(slot)
+            self._postings_ready = True
+            self._invalidate()
+        log.debug(f"Постинги индекса построены: {len(postings)} слов, "
+                          f"{time.perf_counter() - started:.2f} с")
+
+    def upsert(self, prompt: Prompt):
+        with self._lock:
+            self._remove(prompt.id)
+            self._add(prompt)
+            self._invalidate()
+
+    def remove(self, prompt_id: str):
+        with self._lock:
+            self._remove(prompt_id)
+            self._invalidate()
+
+    def _invalidate(self):
+        # Словарь для подстрочного поиска, кэш фрагментов и порядки сортировки строятся лениво
+        self._vocab_blob: Optional[str] = None
+        self._vocab_starts: List[int] = []
+        self._vocab_tokens: List[str] = []
+        self._fragment_cache: Dict[str, tuple] = {}
+        self._orders: Dict[tuple, tuple] = {}
+
+    @staticmethod
+    def _search_text(prompt: Prompt) -> str:
+        if isinstance(prompt.content, dict):
+            content_text = prompt.content.get('ru', '') + " " + prompt.content.get('en', '')
+        else:
+            content_text = str(prompt.content)
+        return (prompt.title + "\n" + content_text).lower()
+
+    def _index_tokens(self, slot: int):
+        bit = 1 << slot
+        tokens = frozenset(self._texts[slot].split())
+        self._slot_tokens[slot] = tokens
+        for token in tokens:
+            self._postings[token] = self._postings.get(token, 0) | bit
+
+    def _unindex_tokens(self, slot: int):
+        bit = 1 << slot
+        for token in self._slot_tokens[slot]:
+            self._clear_bit(self._postings, token, bit)
+        self._slot_tokens[slot] = frozenset()
+
+    def _add(self, prompt: Prompt):
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = len(self._prompts)
+            self._prompts.append(None)
+            self._texts.append("")
+            self._slot_tokens.append(frozenset())
+        bit = 1 << slot
+
+        self._slots[prompt.id] = slot
+        self._prompts[slot] = prompt
+        self._texts[slot] = self._search_text(prompt)
+        self._alive |= bit
+        if self._postings_ready:
+            self._index_tokens(slot)
+
+        self._categories[prompt.category] = self._categories.get(prompt.category, 0) | bit
+        for tag in prompt.tags or []:
+            self._tags[tag] = self._tags.get(tag, 0) | bit
+        if prompt.is_favorite:
+            self._favorite |= bit
+        if prompt.is_local:
+            self._local |= bit
+        # Если content — строка, промпт подходит для любого языка
+        if not isinstance(prompt.content, dict) or prompt.content.get('ru'):
+            self._ru |= bit
+        if not isinstance(prompt.content, dict) or prompt.content.get('en'):
+            self._en |= bit
+
+    @staticmethod
+    def _clear_bit(masks: Dict[str, int], key: str, bit: int):
+        mask = masks.get(key, 0) & ~bit
+        if mask:
+            masks[key] = mask
+        else:
+            masks.pop(key, None)
+
+    def _remove(self, prompt_id: str):
+        slot = self._slots.pop(prompt_id, None)
+        if slot is None:
+            return
+        bit = 1 << slot
+        prompt = self._prompts[slot]
+        if self._postings_ready:
+            self._unindex_tokens(slot)
+        self._clear_bit(self._categories, prompt.category, bit)
+        for tag in prompt.tags or []:
+            self._clear_bit(self._tags, tag, bit)
+        keep = ~bit
+        self._alive &= keep
+        self._favorite &= keep
+        self._local &= keep
+        self._ru &= keep
+        self._en &= keep
+        self._prompts[slot] = None
+        self._texts[slot] = ""
+        self._free_slots.append(slot)
+
+    # --- чтение ---
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def postings_ready(self) -> bool:
+        return self._postings_ready
+
+    def categories(self) -> List[str]:
+        with self._lock:
+            return sorted(self._categories)
+
+    def tags(self) -> List[str]:
+        with self._lock:
+            return sorted(self._tags)
+
+    def _fragment_mask(self, fragment: str, within: int) -> int:
+        """Промпты из within, в тексте которых встречается fragment (без пробелов)"""
+        # Кэш: фрагмент -> (совпадения, множество, внутри которого они точны)
+        cached = self._fragment_cache.get(fragment)
+        if cached is not None and not within & ~cached[1]:
+            return cached[0] & within
+
+        # Совпадения более короткого фрагмента — надмножество совпадений длинного
+        narrowest = None
+        for known, (known_mask, known_scope) in self._fragment_cache.items():
+            if known in fragment and not within & ~known_scope:
+                candidates = known_mask & within
+                if narrowest is None or candidates.bit_count() < narrowest.bit_count():
+                    narrowest = candidates
+
+        if self._postings_ready and (narrowest is None or narrowest.bit_count() > self.MAX_MERGED_POSTINGS):
+            mask = self._postings_mask(fragment, within)
+        else:
+            mask = self._scan_texts(fragment, within if narrowest is None else narrowest)
+        if len(self._fragment_cache) >= self.FRAGMENT_CACHE_SIZE:
+            self._fragment_cache.clear()
+        self._fragment_cache[fragment] = (mask, within)
+        return mask
+
+    def _scan_texts(self, fragment: str, candidates: int) -> int:
+        texts = self._texts
+        return _mask_from_slots([slot for slot in _iter_bits(candidates) if fragment in texts[slot]], len(texts))
+
+    def _postings_mask(self, fragment: str, within: int) -> int:
+        """Объединение постингов всех слов словаря, содержащих fragment (в пределах within)"""
+        if self._vocab_blob is None:
+            self._vocab_tokens = sorted(self._postings)
+            self._vocab_starts = []
+            position = 0
+            for token in self._vocab_tokens:
+                self._vocab_starts.append(position)
+                position += len(token) + 1
+            self._vocab_blob = "\n".join(self._vocab_tokens)
+
+        mask = 0
+        blob, starts, tokens = self._vocab_blob, self._vocab_starts, self._vocab_tokens
+        position = blob.find(fragment)
+        merged = 0
+        while position != -1:
+            token_index = bisect_right(starts, position) - 1
+            mask |= self._postings[tokens[token_index]]
+            merged += 1
+            if not within & ~mask or token_index + 1 >= len(starts):
+                break
+            if merged >= self.MAX_MERGED_POSTINGS:
+                # Частый фрагмент: оставшихся кандидатов быстрее проверить по тексту
+                mask |= self._scan_texts(fragment, within & ~mask)
+                break
+            position = blob.find(fragment, starts[token_index + 1])
+        return mask & within
+
+    def _order(self, sort_key: str, ascending: bool = True) -> tuple:
+        """
+        Слоты в порядке сортировки и позиция каждого слота в этом порядке.
+        Обратный порядок строится отдельно (sorted(..., reverse=True)): промпты с
+        равным ключом и в нём идут в исходном порядке, как при list.sort(reverse=True).
+        """
+        cached = self._orders.get((sort_key, ascending))
+        if cached is not None:
+            return cached
+
+        prompts = self._prompts
+        slots = sorted(self._slots.values())
+        reverse = not ascending
+        if sort_key == SORT_FAVORITES_FIRST:
+            # Стабильное разбиение порядка по названию: сначала избранное
+            # (в обратном порядке — сначала остальные)
+            by_title, _ = self._order(SORT_TITLE, ascending)
+            favorite = self._favorite
+            order = [slot for slot in by_title if bool(favorite >> slot & 1) != reverse]
+            order += [slot for slot in by_title if bool(favorite >> slot & 1) == reverse]
+        elif sort_key == SORT_TITLE:
+            titles = {slot: prompts[slot].title.lower() for slot in slots}
+            order = sorted(slots, key=titles.__getitem__, reverse=reverse)
+        elif sort_key == SORT_CREATED_AT:
+            order = sorted(slots, key=lambda slot: prompts[slot].created_at, reverse=reverse)
+        elif sort_key == SORT_CATEGORY:
+            order = sorted(slots, key=lambda slot: prompts[slot].category.lower(), reverse=reverse)
+        else:
+            raise ValueError(f"Неизвестный ключ сортировки: {sort_key}")
+
+        rank = [0] * len(prompts)
+        for position, slot in enumerate(order):
+            rank[slot] = position
+        cached = self._orders[(sort_key, ascending)] = (order, rank)
+        return cached
+
+    def query(self, search: str = "", category: Optional[str] = None, tag: Optional[str] = None,
+              language: Optional[str] = None, favorites_only: bool = False, local_only: bool = False,
+              sort_key: str = SORT_TITLE, ascending: bool = True) -> List[Prompt]:
+        """
+        Фильтрует и сортирует промпты.
+
+        search — подстрока title/content без учёта регистра, language — "ru" или "en".
+        """
+        with self._lock:
+            mask = self._alive
+            if favorites_only:
+                mask &= self._favorite
+            if local_only:
+                mask &= self._local
+            if category is not None:
+                mask &= self._categories.get(category, 0)
+            if tag is not None:
+                mask &= self._tags.get(tag, 0)
+            if language == "ru":
+                mask &= self._ru
+            elif language == "en":
+                mask &= self._en
+
+            search = search.lower()
+            if search and mask:
+                fragments = search.split()
+                for fragment in fragments:
+                    mask = self._fragment_mask(fragment, mask)
+                    if not mask:
+                        break
+                # Запрос из одного слова найден точно; иначе проверяем кандидатов по тексту
+                if mask and fragments != [search]:
+                    texts = self._texts
+                    mask = _mask_from_slots([slot for slot in _iter_bits(mask) if search in texts[slot]],
+                                            len(texts))
+
+            if not mask:
+                return []
+            order, rank = self._order(sort_key, ascending)
+            prompts = self._prompts
+            if mask.bit_count() * 8 < len(order):
+                # Мало результатов: сортируем только их по позиции в готовом порядке
+                slots = sorted(_iter_bits(mask), key=rank.__getitem__)
+            else:
+                data = mask.to_bytes((len(prompts) + 7) // 8, "little")
+                slots = [slot for slot in order if data[slot >> 3] >> (slot & 7) & 1]
+            return [prompts[slot] for slot in slots]
@@ -0,0 +1,134 @@
+# src/prompt_list_model.py
+from typing import List, Optional
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt
+
+from models import Prompt
+
+
+class PromptListModel(QAbstractListModel):
+    """
+    Модель списка промптов для QListView (результат PromptIndex.query).
+
+    Текст строки формируется лениво в data(), поэтому обновление списка не создаёт
+    по объекту на каждый промпт, а представление запрашивает только видимые строки.
+    id промпта доступен через PromptIdRole, сам объект — через PromptRole.
+
+    set_prompts() сообщает представлению минимальные изменения: исчезнувшие и
+    новые строки — removeRows/insertRows по непрерывным диапазонам, перестановку
+    оставшихся — layoutChanged с переносом выделения по id. Если диапазонов
+    слишком много, модель сбрасывается целиком.
+    """
+
+    PromptIdRole = Qt.ItemDataRole.UserRole + 1
+    PromptRole = Qt.ItemDataRole.UserRole + 2
+
+    # При большем числе диапазонов дешевле сбросить модель целиком
+    MAX_RANGE_SIGNALS = 64
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._prompts: List[Prompt] = []
+        self._ids: List[str] = []
+
+    # --- интерфейс QAbstractListModel ---
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._prompts)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._prompts):
+            return None
+        prompt = self._prompts[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{prompt.title} ({prompt.id})"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return prompt.description or None
+        if role == self.PromptIdRole:
+            return prompt.id
+        if role == self.PromptRole:
+            return prompt
+        return None
+
+    # --- доступ по строкам ---
+
+    def prompt_id(self, row: int) -> Optional[str]:
+        return self._ids[row] if 0 <= row < len(self._ids) else None
+
+    def prompt_at(self, row: int) -> Optional[Prompt]:
+        return self._prompts[row] if 0 <= row < len(self._prompts) else None
+
+    # --- обновление ---
+
+    def set_prompts(self, prompts: List[Prompt]):
+        """Заменяет содержимое модели, передавая представлению минимальный набор сигналов"""
+        new_prompts = list(prompts)
+        new_ids = [prompt.id for prompt in new_prompts]
+        old_ids = self._ids
+
+        # Разбиваем изменение на удаление, перестановку оставшихся и вставку
+        new_set = set(new_ids)
+        kept = [prompt_id for prompt_id in old_ids if prompt_id in new_set]
+        kept_set = set(kept)
+        target = [prompt_id for prompt_id in new_ids if prompt_id in kept_set]
+        removed_runs = self._runs(old_ids, kept)
+        inserted_runs = self._runs(new_ids, target)
+        if len(removed_runs) + len(inserted_runs) > self.MAX_RANGE_SIGNALS:
+            self.beginResetModel()
+            self._prompts, self._ids = new_prompts, new_ids
+            self.endResetModel()
+            return
+
+        # С конца, чтобы номера ещё не обработанных строк не сдвигались
+        for first, last in reversed(removed_runs):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._prompts[first:last + 1]
+            del self._ids[first:last + 1]
+            self.endRemoveRows()
+
+        if kept != target:
+            by_id = dict(zip(new_ids, new_prompts))
+            self._relayout([by_id[prompt_id] for prompt_id in target], target)
+
+        # С начала: номера в runs — это уже итоговые позиции строк
+        for first, last in inserted_runs:
+            self.beginInsertRows(QModelIndex(), first, last)
+            self._prompts[first:first] = new_prompts[first:last + 1]
+            self._ids[first:first] = new_ids[first:last + 1]
+            self.endInsertRows()
+
+        # Строки с тем же id, но изменённым объектом (после редактирования)
+        changed_rows = [row for row, prompt in enumerate(self._prompts) if prompt is not new_prompts[row]]
+        self._prompts = new_prompts
+        if changed_rows:
+            self.dataChanged.emit(self.index(changed_rows[0]), self.index(changed_rows[-1]))
+
+    @staticmethod
+    def _runs(longer: List[str], shorter: List[str]) -> List[tuple]:
+        """Диапазоны [first, last] элементов longer, отсутствующих в подпоследовательности shorter"""
+        runs = []
+        position = 0
+        run_start = None
+        for row, prompt_id in enumerate(longer):
+            if position < len(shorter) and shorter[position] == prompt_id:
+                position += 1
+                if run_start is not None:
+                    runs.append((run_start, row - 1))
+                    run_start = None
+            elif run_start is None:
+                run_start = row
+        if run_start is not None:
+            runs.append((run_start, len(longer) - 1))
+        return runs
+
+    def _relayout(self, prompts: List[Prompt], ids: List[str]):
+        """Перестановка строк: один layoutChanged, выделение переносится по id"""
+        self.layoutAboutToBeChanged.emit()
+        new_rows = {prompt_id: row for row, prompt_id in enumerate(ids)}
+        old_indexes = self.persistentIndexList()
+        rows = [new_rows.get(self._ids[index.row()]) for index in old_indexes]
+        self._prompts = prompts
+        self._ids = ids
+        self.changePersistentIndexList(
+            old_indexes, [self.index(row) if row is not None else QModelIndex() for row in rows])
+        self.layoutChanged.emit()
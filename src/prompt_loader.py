@@ -0,0 +1,161 @@
+# src/prompt_loader.py
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Executor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from models import Prompt
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class LoadFailure:
+    """Файл, который не удалось прочитать или провалидировать"""
+    path: Path
+    error: str
+
+
+@dataclass
+class LoadReport:
+    """Результат загрузки: промпты в порядке входных путей, ошибки и тайминги"""
+    prompts: List[Prompt] = field(default_factory=list)
+    paths: List[Path] = field(default_factory=list)
+    failures: List[LoadFailure] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+
+def decode_prompt_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Нормализует сырые данные файла промпта перед валидацией"""
+    # Проверяем и устанавливаем категорию
+    if not data.get("category"):
+        data["category"] = "general"
+
+    # Конвертируем строки ISO в datetime
+    if "created_at" in data and isinstance(data["created_at"], str):
+        data["created_at"] = datetime.fromisoformat(data["created_at"])
+    if "updated_at" in data and isinstance(data["updated_at"], str):
+        data["updated_at"] = datetime.fromisoformat(data["updated_at"])
+    return data
+
+
+def parse_prompt_bytes(raw: bytes) -> Prompt:
+    """Разбирает содержимое JSON-файла промпта и валидирует его"""
+    return Prompt.model_validate(decode_prompt_data(json.loads(raw)))
+
+
+def _load_chunk(paths: Sequence[str]) -> List[Tuple[Optional[Prompt], Optional[str]]]:
+    """
+    Читает и разбирает пачку файлов. Выполняется в потоке или в отдельном процессе,
+    поэтому принимает строки и возвращает только сериализуемые значения.
+    """
+    results = []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            results.append((parse_prompt_bytes(raw), None))
+        except Exception as e:
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _parse_chunk(raws: Sequence[bytes]) -> List[Tuple[Optional[Prompt], Optional[str]]]:
+    """Разбирает пачку уже прочитанных файлов (например, скачанных при синхронизации)"""
+    results = []
+    for raw in raws:
+        try:
+            results.append((parse_prompt_bytes(raw), None))
+        except Exception as e:
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+class PromptLoader:
+    """
+    Параллельный загрузчик библиотеки промптов.
+
+    Файлы делятся на пачки по chunk_size и обрабатываются в пуле потоков
+    (чтение + json + валидация Pydantic). Для больших библиотек можно включить
+    пул процессов: он используется, если файлов не меньше process_threshold.
+    Порядок результатов всегда совпадает с порядком входных путей.
+    """
+
+    def __init__(
+            self,
+            max_workers: Optional[int] = None,
+            chunk_size: int = 64,
+            use_processes: bool = False,
+            process_threshold: int = 5000,
+    ):
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.chunk_size = max(1, chunk_size)
+        self.use_processes = use_processes
+        self.process_threshold = process_threshold
+
+    def _make_executor(self, total: int) -> Optional[Executor]:
+        if self.max_workers <= 1 or total <= self.chunk_size:
+            return None
+        if self.use_processes and total >= self.process_threshold:
+            return ProcessPoolExecutor(max_workers=min(self.max_workers, os.cpu_count() or 1))
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prompt-loader")
+
+    def _run_chunks(self, func: Callable[[Sequence], list], items: Sequence) -> Tuple[list, str]:
+        """Применяет func к пачкам items; результаты в порядке входных элементов"""
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+
+        executor = self._make_executor(len(items))
+        if executor is None:
+            chunk_results = [func(chunk) for chunk in chunks]
+            mode = "serial"
+        else:
+            mode = "processes" if isinstance(executor, ProcessPoolExecutor) else "threads"
+            with executor:
+                # map сохраняет порядок пачек, что делает результат детерминированным
+                chunk_results = list(executor.map(func, chunks))
+        return [r for chunk in chunk_results for r in chunk], mode
+
+    def load(self, paths: Sequence[Path]) -> LoadReport:
+        report = LoadReport()
+        started = time.perf_counter()
+
+        str_paths = [str(p) for p in paths]
+        results, mode = self._run_chunks(_load_chunk, str_paths)
+
+        for path, (prompt, error) in zip(paths, results):
+            if prompt is not None:
+                report.prompts.append(prompt)
+                report.paths.append(path)
+            else:
+                report.failures.append(LoadFailure(path=path, error=error))
+
+        report.timings = {"load": time.perf_counter() - started}
+        log.debug(
+            "PromptLoader (%s): файлов %d, загружено %d, ошибок %d за %.1f мс",
+            mode, len(str_paths), len(report.prompts), len(report.failures),
+            report.timings["load"] * 1000,
+        )
+        return report
+
+    def parse(self, raws: Sequence[bytes]) -> List[Tuple[Optional[Prompt], Optional[str]]]:
+        """
+        Разбирает и валидирует содержимое файлов, уже находящееся в памяти.
+        Возвращает пары (промпт, None) или (None, текст ошибки) в порядке входа.
+        """
+        started = time.perf_counter()
+        results, mode = self._run_chunks(_parse_chunk, list(raws))
+        log.debug(
+            "PromptLoader.parse (%s): файлов %d, ошибок %d за %.1f мс",
+            mode, len(results), sum(1 for prompt, _ in results if prompt is None),
+            (time.perf_counter() - started) * 1000,
+        )
+        return results
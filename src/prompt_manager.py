@@ -1,4 +1,3 @@
-import json
 import logging
 import string
 from datetime import datetime
@@ -9,13 +8,22 @@ from uuid import uuid4
 from PyQt6.QtCore import QSettings
 
 from category_manager import CategoryManager
+from llm_settings import Settings
 from models import Prompt
-from storage import LocalStorage
+from prompt_history import PromptHistory
+from prompt_index import PromptIndex
+from prompt_loader import decode_prompt_data
+from search_index import PromptSearchIndex
+from sqlite_storage import SqliteStorage
+from storage import LocalStorage, library_cache_dir
 
 
 class PromptManager:
     prompts: dict[string, Prompt]
 
+    # При большем числе изменённых синхронизацией промптов библиотека перечитывается целиком
+    SYNC_DIFF_RELOAD_THRESHOLD = 500
+
     def __init__(self, storage_path=None):
         self.logger = logging.getLogger(__name__)
         # Загрузка настроек
@@ -26,15 +34,46 @@ class PromptManager:
         self.logger.debug(f"Инициализация PromptManager с путем: {storage_path}")
         
         self.cat_manager = CategoryManager()
-        self.storage = LocalStorage(storage_path)
+        self.storage = self._create_storage(storage_path, settings.value("storage_backend", "json"))
         self.prompts = {}  # Инициализируем пустым словарем
+        # Полнотекстовый индекс строится лениво, при первом поиске
+        self.search_index = PromptSearchIndex()
+        self._search_index_stale = True
+        # Индекс для фильтрации списка в MainWindow (битовые маски и постинги)
+        self.prompt_index = PromptIndex()
+        self.load_report = self.storage.last_load_report
         self.storage_path = Path(storage_path)
-        
+        # История версий лежит рядом с кэшами библиотеки, не в папке промптов
+        cache_dir = getattr(self.storage, "cache_dir", None) or library_cache_dir(
+            Settings().settings_dir, self.storage_path)
+        self.history = PromptHistory(cache_dir)
+
+        # Синхронизация, прерванная сбоем, доводится до конца до первого чтения библиотеки
+        recover = getattr(self.storage, "recover_pending_changes", None)
+        if recover is not None:
+            try:
+                recovered = recover()
+                if recovered:
+                    self.logger.info(f"Восстановлено операций прерванной синхронизации: {recovered}")
+            except Exception as e:
+                self.logger.error(f"Ошибка восстановления прерванной синхронизации: {str(e)}", exc_info=True)
+
         try:
             self.load_all_prompts()
         except Exception as e:
             self.logger.error(f"Ошибка при начальной загрузке промптов: {str(e)}", exc_info=True)
 
+    def _create_storage(self, storage_path, backend: str):
+        """Создаёт хранилище: JSON-файлы (по умолчанию) или SQLite рядом с папкой промптов"""
+        if backend == "sqlite":
+            tree_path = Path(storage_path)
+            storage = SqliteStorage(db_path=str(tree_path.with_suffix(".db")), tree_path=str(tree_path))
+            if storage.is_empty() and tree_path.exists():
+                self.logger.info(f"База SQLite пуста, импортируем промпты из {tree_path}")
+                storage.import_from_tree()
+            return storage
+        return LocalStorage(storage_path)
+
     def load_all_prompts(self):
         """Загрузка всех промптов в кэш при старте"""
         self.logger.debug("Начало загрузки всех промптов")
@@ -44,7 +83,17 @@ class PromptManager:
             
             for prompt in prompts:
                 self.prompts[prompt.id] = prompt
-                
+            self._search_index_stale = True
+            self.prompt_index.rebuild(self.prompts.values())
+
+            # Отчёт о файлах, которые не удалось разобрать
+            self.load_report = self.storage.last_load_report
+            if self.load_report.failures:
+                self.logger.warning(
+                    f"Не удалось загрузить файлов: {len(self.load_report.failures)} "
+                    f"(см. PromptManager.load_report)"
+                )
+
             self.logger.info(f"Загружено {len(self.prompts)} промптов")
         except Exception as e:
             self.logger.error(f"Ошибка при загрузке промптов: {str(e)}", exc_info=True)
@@ -55,7 +104,7 @@ class PromptManager:
         return list(self.prompts.values())
 
     def get_prompt(self, prompt_id: str) -> Optional[Prompt]:
-        """Интерфейсный метод для получения промпта"""
+        """Интерфейсный метод для получения промпта (путь берётся из индекса LocalStorage)"""
         return self.storage.load_prompt(prompt_id)
 
     def is_in_category_tree(self, child_code: str, parent_code: str) -> bool:
@@ -66,7 +115,28 @@ class PromptManager:
             current = self.cat_manager.get_category(current.parent)
         return False
 
-    def search_prompts(self, query: str, category: str = None) -> list[Prompt]:
+    def search_prompts(self, query: str, category: str = None, limit: Optional[int] = None) -> list[Prompt]:
+        """
+        Поиск по title/description/content/tags. При наличии FTS5 — по префиксам
+        слов с ранжированием BM25, иначе линейный поиск подстроки.
+        """
+        if self.search_index.available:
+            if self._search_index_stale:
+                self.search_index.rebuild(self.prompts.values())
+                self._search_index_stale = False
+            if query.strip():
+                prompt_ids = self.search_index.search(query, limit=None if category else limit)
+                candidates = (self.prompts[pid] for pid in prompt_ids if pid in self.prompts)
+            else:
+                candidates = iter(self.prompts.values())
+            results = []
+            for prompt in candidates:
+                if not category or self.is_in_category_tree(prompt.category, category):
+                    results.append(prompt)
+                    if limit is not None and len(results) >= limit:
+                        break
+            return results
+
         results = []
         for prompt in self.prompts.values():
             # Извлекаем текст из контента с учетом возможных типов
@@ -83,6 +153,10 @@ class PromptManager:
                     results.append(prompt)
         return results
 
+    def filter_prompts(self, **filters) -> list[Prompt]:
+        """Фильтрация и сортировка для списка в MainWindow (см. PromptIndex.query)"""
+        return self.prompt_index.query(**filters)
+
     def validate_unique(self, prompt_id):
         if prompt_id in self.prompts:
             raise ValueError(f"Prompt с ID {prompt_id} уже существует")
@@ -105,6 +179,9 @@ class PromptManager:
         # Сохраняем промпт
         self.prompts[prompt.id] = prompt
         self.storage.save_prompt(prompt)
+        self.prompt_index.upsert(prompt)
+        if not self._search_index_stale:
+            self.search_index.upsert(prompt)
 
     def edit_prompt(self, prompt_id: str, new_data: dict):
         self.logger.debug(f"Редактирование промпта {prompt_id} с данными: {new_data}")
@@ -139,6 +216,10 @@ class PromptManager:
         # Обновляем кэш и сохраняем
         self.prompts[prompt_id] = updated_prompt
         self.storage.save_prompt(updated_prompt)  # Теперь сохраняет в новую категорию
+        self._record_history(current_prompt, updated_prompt)
+        self.prompt_index.upsert(updated_prompt)
+        if not self._search_index_stale:
+            self.search_index.upsert(updated_prompt)
 
     def delete_prompt(self, prompt_id: str):
         self.logger.warning(f"Удаление промпта {prompt_id}")
@@ -146,27 +227,79 @@ class PromptManager:
         self.storage.delete_prompt(prompt_id, prompt.category)  # Делегируем удаление файлу Storage
         if prompt_id in self.prompts:
             del self.prompts[prompt_id]
+        self.prompt_index.remove(prompt_id)
+        if not self._search_index_stale:
+            self.search_index.remove(prompt_id)
 
-    def get_prompt_history(self, prompt_id: str):
-        """Получение истории версий промпта"""
-        versions_dir = self.storage_path / "versions" / prompt_id
-        if not versions_dir.exists():
-            return []
+    def apply_sync_diff(self, diff) -> int:
+        """
+        Точечно применяет результат синхронизации (SyncDiff) к кэшу и индексам
+        вместо полной перезагрузки библиотеки. Сначала обрабатываются удаления:
+        промпт, перенесённый в другую категорию, есть и в removed, и в added.
+        Если изменена большая часть библиотеки, дешевле перечитать её целиком.
+        Возвращает число изменённых записей.
+        """
+        upserts = list(diff.added) + list(diff.updated)
+        if len(upserts) > max(self.SYNC_DIFF_RELOAD_THRESHOLD, len(self.prompts) // 2):
+            self.logger.info(f"Синхронизация изменила {len(upserts)} промптов, перечитываем библиотеку")
+            self.prompts = {}
+            self.load_all_prompts()
+            return len(upserts) + len(diff.removed)
 
-        return sorted(
-            versions_dir.glob("*.json"),
-            key=lambda p: p.stem,
-            reverse=True
-        )
+        prompts = []
+        for prompt_id in upserts:
+            prompt = self.storage.load_prompt(prompt_id)
+            if prompt is None:
+                self.logger.warning(f"Промпт {prompt_id} из результата синхронизации не найден в хранилище")
+                continue
+            prompts.append(prompt)
+        changed = self.apply_prompt_changes(prompts, diff.removed)
+        self.logger.info(f"Применены изменения синхронизации: +{len(diff.added)} Δ{len(diff.updated)} "
+                         f"-{len(diff.removed)}")
+        return changed
 
-    def rollback_prompt(self, prompt_id: str, version_timestamp: str):
-        """Откат к определенной версии"""
-        versions_dir = self.storage_path / "versions" / prompt_id
-        version_file = versions_dir / f"{version_timestamp}.json"
+    def apply_prompt_changes(self, prompts: list[Prompt], removed_ids: list[str]) -> int:
+        """
+        Обновляет кэш и индексы уже загруженными промптами (без обращения к диску):
+        сначала удаления, затем добавленные и изменённые. Возвращает число изменённых записей.
+        """
+        changed = 0
+        for prompt_id in removed_ids:
+            if self.prompts.pop(prompt_id, None) is not None:
+                self.prompt_index.remove(prompt_id)
+                if not self._search_index_stale:
+                    self.search_index.remove(prompt_id)
+                changed += 1
+        for prompt in prompts:
+            self.prompts[prompt.id] = prompt
+            self.prompt_index.upsert(prompt)
+            if not self._search_index_stale:
+                self.search_index.upsert(prompt)
+            changed += 1
+        return changed
 
-        if not version_file.exists():
+    def _record_history(self, previous: Prompt, updated: Prompt):
+        # Исходная версия попадает в историю при первой правке (повтор не записывается)
+        # со временем создания промпта: updated_at сбрасывается при загрузке
+        try:
+            self.history.record(previous, timestamp=previous.created_at)
+            self.history.record(updated)
+        except Exception as e:
+            self.logger.error(f"Не удалось записать историю промпта {updated.id}: {str(e)}", exc_info=True)
+
+    def get_prompt_history(self, prompt_id: str):
+        """Получение истории версий промпта (HistoryEntry, новые первыми)"""
+        return self.history.list(prompt_id)
+
+    def rollback_prompt(self, prompt_id: str, version_timestamp: str):
+        """Откат к версии, действовавшей на момент version_timestamp"""
+        entry = self.history.find(prompt_id, version_timestamp)
+        if entry is None:
             raise FileNotFoundError("Версия не найдена")
 
-        with open(version_file, 'r') as f:
-            data = json.load(f)
-            self.edit_prompt(prompt_id, data)
+        data = decode_prompt_data(self.history.read(entry.sha))
+        self.edit_prompt(prompt_id, data)
+
+    def compact_history(self, keep_last: int = None, drop_deleted: bool = False):
+        """Сжатие истории версий (см. PromptHistory.compact)"""
+        return self.history.compact(keep_last=keep_last, live_ids=self.prompts.keys() if drop_deleted else None)
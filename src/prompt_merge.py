@@ -0,0 +1,99 @@
+# src/prompt_merge.py
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from models import Prompt
+from prompt_loader import decode_prompt_data, parse_prompt_bytes
+from storage import dump_prompt_json, prompt_to_file_dict
+
+# Поля, изменения которых сливаются и по которым сообщается о конфликтах
+MERGE_FIELDS = ("title", "description", "content", "tags", "prompt_variants")
+# Поля, которые не сливаются: время обновления выставляется при сохранении,
+# локальные флаги хранятся в настройках
+IGNORED_FIELDS = {"updated_at", "is_local", "is_favorite"}
+
+_MISSING = object()
+
+
+@dataclass
+class MergeResult:
+    """Результат слияния: итоговый промпт и поля с конфликтами (оставлены локальные значения)"""
+    prompt: Prompt
+    conflicts: List[str] = field(default_factory=list)
+    changed: bool = False  # отличается ли результат от локальной версии
+
+
+def normalize_prompt_bytes(raw: bytes) -> Dict[str, Any]:
+    """Приводит файл промпта к виду, в котором его сохраняет LocalStorage, для сравнения полей"""
+    return json.loads(dump_prompt_json(prompt_to_file_dict(parse_prompt_bytes(raw))))
+
+
+def _merge_value(base: Any, local: Any, remote: Any):
+    """Трёхстороннее слияние одного значения: (значение, есть ли конфликт)"""
+    if local == remote or remote == base:
+        return local, False
+    if local == base:
+        return remote, False
+    return local, True
+
+
+def _merge_tags(base: list, local: list, remote: list) -> list:
+    """Теги сливаются как множества: добавления и удаления с обеих сторон применяются"""
+    base_set, local_set, remote_set = set(base), set(local), set(remote)
+    removed = (base_set - local_set) | (base_set - remote_set)
+    result = [tag for tag in local if tag not in removed]
+    result += [tag for tag in remote if tag not in base_set and tag not in local_set]
+    return result
+
+
+def merge_prompt_data(base: Dict[str, Any], local: Dict[str, Any], remote: Dict[str, Any]):
+    """
+    Трёхстороннее слияние нормализованных данных промпта по полям.
+
+    Поле, изменённое только с одной стороны, берётся с этой стороны. content
+    сливается по языкам, tags — как множество. Если поле из MERGE_FIELDS изменено
+    по-разному с обеих сторон, остаётся локальное значение и поле попадает в
+    список конфликтов. Прочие поля при расхождении тоже сохраняют локальное значение.
+    Возвращает (данные, список конфликтующих полей).
+    """
+    merged: Dict[str, Any] = {}
+    conflicts: List[str] = []
+    for key in list(local) + [key for key in remote if key not in local]:
+        local_value = local.get(key, _MISSING)
+        if key in IGNORED_FIELDS:
+            if local_value is not _MISSING:
+                merged[key] = local_value
+            continue
+        base_value = base.get(key, _MISSING)
+        remote_value = remote.get(key, _MISSING)
+
+        if key == "tags" and all(isinstance(v, list) for v in (base_value, local_value, remote_value)):
+            merged[key] = _merge_tags(base_value, local_value, remote_value)
+            continue
+        if key == "content" and all(isinstance(v, dict) for v in (base_value, local_value, remote_value)):
+            content = {}
+            for lang in list(local_value) + [lang for lang in remote_value if lang not in local_value]:
+                value, conflict = _merge_value(base_value.get(lang, _MISSING), local_value.get(lang, _MISSING),
+                                               remote_value.get(lang, _MISSING))
+                if conflict:
+                    conflicts.append(f"content.{lang}")
+                if value is not _MISSING:
+                    content[lang] = value
+            merged[key] = content
+            continue
+
+        value, conflict = _merge_value(base_value, local_value, remote_value)
+        if conflict and key in MERGE_FIELDS:
+            conflicts.append(key)
+        if value is not _MISSING:
+            merged[key] = value
+    return merged, conflicts
+
+
+def merge_prompt_files(base: bytes, local: bytes, remote: bytes) -> MergeResult:
+    """Сливает три версии файла промпта (база, локальная, удалённая)"""
+    local_data = normalize_prompt_bytes(local)
+    merged, conflicts = merge_prompt_data(normalize_prompt_bytes(base), local_data, normalize_prompt_bytes(remote))
+    changed = any(merged.get(key) != local_data.get(key) for key in set(merged) | set(local_data))
+    return MergeResult(Prompt.model_validate(decode_prompt_data(merged)), conflicts, changed)
@@ -0,0 +1,70 @@
+# src/prompt_snapshot.py
+import logging
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Dict, NamedTuple
+
+from models import Prompt
+
+log = logging.getLogger(__name__)
+
+
+class SnapshotEntry(NamedTuple):
+    """Разобранный промпт и stat файла, из которого он был получен"""
+    mtime_ns: int
+    size: int
+    prompt: Prompt
+
+
+class PromptSnapshot:
+    """
+    Бинарный снимок всей библиотеки промптов в одном pickle-файле.
+
+    Ключ записи — относительный путь файла (posix), манифест — пара
+    (mtime_ns, size). Запись считается актуальной, пока stat файла не изменился,
+    поэтому при неизменной библиотеке старт сводится к одному чтению снимка.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, snapshot_file: Path):
+        self.snapshot_file = Path(snapshot_file)
+
+    def load(self) -> Dict[str, SnapshotEntry]:
+        """Читает снимок. При отсутствии, повреждении или смене формата возвращает {}"""
+        try:
+            with open(self.snapshot_file, "rb") as f:
+                data = pickle.load(f)
+            if data.get("version") != self.FORMAT_VERSION:
+                log.info("Снимок библиотеки устарел (версия формата), будет пересоздан")
+                return {}
+            return {rel: SnapshotEntry(*entry) for rel, entry in data["entries"].items()}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            log.warning(f"Не удалось прочитать снимок библиотеки {self.snapshot_file}: {str(e)}")
+            return {}
+
+    def save(self, entries: Dict[str, SnapshotEntry]):
+        """Атомарно записывает снимок (временный файл + os.replace)"""
+        try:
+            self.snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+            data = {
+                "version": self.FORMAT_VERSION,
+                "entries": {rel: tuple(entry) for rel, entry in entries.items()},
+            }
+            fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_file.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.snapshot_file)
+            except BaseException:
+                Path(tmp_path).unlink(missing_ok=True)
+                raise
+        except Exception as e:
+            log.warning(f"Не удалось сохранить снимок библиотеки {self.snapshot_file}: {str(e)}")
+
+    def clear(self):
+        self.snapshot_file.unlink(missing_ok=True)
@@ -0,0 +1,258 @@
+# src/prompt_watcher.py
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+    WATCHDOG_AVAILABLE = False
+
+log = logging.getLogger(__name__)
+
+
+def _is_relevant(path: str) -> bool:
+    # Служебные папки и временные файлы (.sync-staging, .git, ~ редакторов) не отслеживаются
+    name = os.path.basename(path)
+    return not name.startswith(".") and not name.endswith(("~", ".tmp", ".swp"))
+
+
+class _WatchdogHandler(FileSystemEventHandler):
+    """Передаёт пути событий watchdog (inotify/FSEvents/ReadDirectoryChangesW) в PromptWatcher"""
+
+    def __init__(self, on_paths: Callable[[Iterable[str]], None]):
+        super().__init__()
+        self.on_paths = on_paths
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        self.on_paths([path for path in paths if path])
+
+
+class _PollingBackend:
+    """
+    Запасной вариант без watchdog: раз в interval_s секунд сравнивает (mtime_ns, size)
+    файлов библиотеки (корень и папки категорий) с предыдущим обходом.
+    """
+
+    def __init__(self, root: Path, on_paths: Callable[[Iterable[str]], None], interval_s: float):
+        self.root = root
+        self.on_paths = on_paths
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        state = {}
+        try:
+            with os.scandir(self.root) as root_entries:
+                for entry in root_entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir():
+                        with os.scandir(entry.path) as category_entries:
+                            for child in category_entries:
+                                if child.name.endswith(".json") and child.is_file():
+                                    st = child.stat()
+                                    state[child.path] = (st.st_mtime_ns, st.st_size)
+                    elif entry.name.endswith(".json") and entry.is_file():
+                        st = entry.stat()
+                        state[entry.path] = (st.st_mtime_ns, st.st_size)
+        except OSError as e:
+            log.warning(f"Не удалось просканировать {self.root}: {str(e)}")
+        return state
+
+    def _run(self):
+        previous = self._scan()
+        while not self._stop.wait(self.interval_s):
+            current = self._scan()
+            changed = [path for path, stat in current.items() if previous.get(path) != stat]
+            changed += [path for path in previous if path not in current]
+            previous = current
+            if changed:
+                self.on_paths(changed)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="prompt-watcher-poll", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_s + 1)
+            self._thread = None
+
+
+class WatcherSignals(QObject):
+    """Сигналы фонового перечитывания файлов (доставляются в поток GUI)"""
+    finished = pyqtSignal(list, list)  # перечитанные промпты, id удалённых
+    failed = pyqtSignal(str)
+
+
+class RefreshRunnable(QRunnable):
+    """Перечитывает пачку изменённых файлов в пуле потоков"""
+
+    def __init__(self, storage, paths: Set[str]):
+        super().__init__()
+        self.storage = storage
+        self.paths = paths
+        self.signals = WatcherSignals()
+
+    def run(self):
+        try:
+            prompts, removed, _report = self.storage.refresh_files(Path(path) for path in self.paths)
+        except Exception as e:
+            log.error(f"Ошибка перечитывания изменённых файлов: {str(e)}", exc_info=True)
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(prompts, removed)
+
+
+class PromptWatcher(QObject):
+    """
+    Следит за папкой промптов и перечитывает только затронутые файлы.
+
+    События файловой системы приходят от watchdog (если установлен) или от опроса
+    дерева раз в poll_interval_s секунд. Пути копятся в множестве и отдаются пачкой,
+    когда события стихнут на debounce_ms (но не позже max_delay_ms после первого
+    события), поэтому git checkout на сотни файлов превращается в одну пачку.
+    Пачка разбирается в отдельном пуле из одного потока через
+    storage.refresh_files(); события, пришедшие во время разбора, попадают в
+    следующую пачку. Результат — сигнал files_changed(промпты, id удалённых) для
+    PromptManager.apply_prompt_changes и окна.
+    """
+
+    files_changed = pyqtSignal(list, list)
+    # Внутренний сигнал: пути пришли из потока наблюдателя, таймер перезапускается в потоке GUI
+    _touched = pyqtSignal()
+
+    def __init__(self, storage, debounce_ms: int = 300, max_delay_ms: int = 2000,
+                 poll_interval_s: float = 2.0, use_watchdog: bool = True, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
+        self.storage = storage
+        self.root = Path(storage.storage_path).resolve()
+        self.max_delay_ms = max_delay_ms
+        self.poll_interval_s = poll_interval_s
+        self.use_watchdog = use_watchdog and WATCHDOG_AVAILABLE
+        self._lock = threading.Lock()
+        self._pending: Set[str] = set()
+        self._first_event_at: Optional[float] = None
+        self._running: Optional[RefreshRunnable] = None
+        self._observer = None
+        self._poller: Optional[_PollingBackend] = None
+
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(debounce_ms)
+        self._timer.timeout.connect(self._dispatch)
+        self._touched.connect(self._on_touched)
+
+    @property
+    def backend(self) -> Optional[str]:
+        if self._observer is not None:
+            return "watchdog"
+        if self._poller is not None:
+            return "polling"
+        return None
+
+    def start(self):
+        if self.backend is not None:
+            return
+        if self.use_watchdog:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_WatchdogHandler(self._add_paths), str(self.root), recursive=True)
+                self._observer.start()
+            except Exception as e:
+                self.logger.warning(f"watchdog недоступен ({str(e)}), переходим на опрос папки")
+                self._observer = None
+        if self._observer is None:
+            self._poller = _PollingBackend(self.root, self._add_paths, self.poll_interval_s)
+            self._poller.start()
+        self.logger.info(f"Отслеживание изменений в {self.root} ({self.backend})")
+
+    def stop(self):
+        """Останавливает наблюдение; начатое перечитывание доводится до конца"""
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+        if self._poller is not None:
+            self._poller.stop()
+            self._poller = None
+        self._timer.stop()
+        with self._lock:
+            self._pending.clear()
+            self._first_event_at = None
+
+    def _add_paths(self, paths: Iterable[str]):
+        # Вызывается из потока наблюдателя
+        paths = [path for path in paths if _is_relevant(path)]
+        if not paths:
+            return
+        with self._lock:
+            if not self._pending:
+                self._first_event_at = time.monotonic()
+            self._pending.update(paths)
+        self._touched.emit()
+
+    def _on_touched(self):
+        if self._running is not None:
+            return  # пачка будет отправлена после завершения текущей
+        with self._lock:
+            first_event_at = self._first_event_at
+        waited_ms = (time.monotonic() - first_event_at) * 1000 if first_event_at is not None else 0
+        if waited_ms >= self.max_delay_ms:
+            self._timer.stop()
+            self._dispatch()
+        else:
+            self._timer.start()
+
+    def _dispatch(self):
+        if self._running is not None:
+            return
+        with self._lock:
+            paths, self._pending = self._pending, set()
+            self._first_event_at = None
+        if not paths:
+            return
+        self.logger.debug(f"Изменённых путей в пачке: {len(paths)}")
+        runnable = RefreshRunnable(self.storage, paths)
+        runnable.signals.finished.connect(self._on_finished)
+        runnable.signals.failed.connect(self._on_failed)
+        # Ссылка держится, пока сигналы задачи могут быть в очереди событий
+        self._running = runnable
+        self._pool.start(runnable)
+
+    def _on_finished(self, prompts: list, removed: list):
+        self._running = None
+        if prompts or removed:
+            self.files_changed.emit(prompts, removed)
+        self._resume()
+
+    def _on_failed(self, _message: str):
+        self._running = None
+        self._resume()
+
+    def _resume(self):
+        with self._lock:
+            has_pending = bool(self._pending)
+        if has_pending:
+            self._timer.start()
@@ -0,0 +1,231 @@
+# src/response_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from llm_settings import Settings
+
+log = logging.getLogger(__name__)
+
+
+def _canonical(value: Any) -> Any:
+    # 0 и 0.0 из разных полей ввода должны давать один ключ
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+class ResponseCache:
+    """
+    Дисковый кэш ответов LLM (SQLite).
+
+    Ключ — SHA-256 канонического JSON из payload, собранного prepare_payload
+    (модель, сообщения, параметры генерации, признак stream), и адреса сервера
+    провайдера; таймаут в ключ не входит. Для stream=True хранится список чанков,
+    и повторный запрос получает генератор с теми же чанками, для stream=False —
+    полный ответ.
+
+    Записи старше ttl_s считаются отсутствующими и удаляются при вытеснении.
+    Если суммарный размер данных превышает max_bytes или число записей —
+    max_entries, удаляются давно не читанные записи (LRU), пока не останется 90%
+    лимита. Поток кэшируется, только если он прочитан до конца.
+    """
+
+    DB_FILE_NAME = "response_cache.db"
+    DEFAULT_TTL_S = 7 * 24 * 60 * 60
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+    DEFAULT_MAX_ENTRIES = 100_000
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key BLOB PRIMARY KEY,
+            created REAL NOT NULL,
+            accessed REAL NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed);
+    """
+
+    def __init__(self, db_path: Path, ttl_s: float = DEFAULT_TTL_S, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = Path(db_path)
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._total_bytes = 0
+        self._total_entries = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # База открывается при первом обращении: без включённого кэша файл не создаётся
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+            self._total_entries, self._total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def make_key(provider: Any, payload: Dict[str, Any]) -> bytes:
+        """Ключ запроса: сервер провайдера + payload без транспортных параметров"""
+        request = {k: v for k, v in payload.items() if k != "timeout"}
+        identity = {
+            "provider": provider.__class__.__name__.removeprefix("Async"),
+            "server": getattr(provider, "base_url", None) or getattr(provider, "endpoint", None),
+            "payload": _canonical(request),
+        }
+        canonical = json.dumps(identity, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).digest()
+
+    def get(self, key: bytes) -> Optional[Any]:
+        """Сохранённый ответ (словарь или список чанков) или None"""
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            row = conn.execute("SELECT created, data FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[0] > self.ttl_s:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(zlib.decompress(row[1]))
+
+    def put(self, key: bytes, value: Any):
+        data = zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                conn.execute("INSERT OR REPLACE INTO responses (key, created, accessed, size, data) "
+                             "VALUES (?, ?, ?, ?, ?)", (key, now, now, len(data), data))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if previous is None:
+                self._total_entries += 1
+            else:
+                self._total_bytes -= previous[0]
+            self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes or self._total_entries > self.max_entries:
+                self.evict()
+
+    def evict(self) -> int:
+        """Удаляет просроченные записи и, при превышении лимитов, давно не читанные"""
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_s,))
+                entries, total = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+                removed = self._total_entries - entries
+                target_bytes = int(self.max_bytes * 0.9)
+                target_entries = int(self.max_entries * 0.9)
+                if total > self.max_bytes or entries > self.max_entries:
+                    # Самые давно читанные записи, пока не уложимся в 90% лимитов
+                    victims = []
+                    for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                        if total <= target_bytes and entries <= target_entries:
+                            break
+                        victims.append((key,))
+                        total -= size
+                        entries -= 1
+                    conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+                    removed += len(victims)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._total_entries, self._total_bytes = entries, total
+        if removed:
+            log.info(f"Кэш ответов: вытеснено записей {removed}")
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM responses")
+            self._total_entries = self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self.conn  # открывает базу и подсчитывает записи
+            return {"entries": self._total_entries, "bytes": self._total_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+    @staticmethod
+    def replay(chunks: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Генератор по сохранённым чанкам (та же форма, что у send_request с stream=True)"""
+        yield from chunks
+
+    @staticmethod
+    async def areplay(chunks: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        for chunk in chunks:
+            yield chunk
+
+    def wrap_stream(self, key: bytes, stream: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Пропускает чанки потока дальше и сохраняет их, когда поток дочитан до конца"""
+        chunks = []
+        for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            self.store(key, chunks)
+
+    async def awrap_stream(self, key: bytes, stream: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """Асинхронный wrap_stream; запись в базу выполняется в потоке, не в цикле событий"""
+        chunks = []
+        async for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            await asyncio.to_thread(self.store, key, chunks)
+
+    def store(self, key: bytes, value: Any):
+        """put, при котором ошибка кэша не мешает вернуть ответ"""
+        try:
+            self.put(key, value)
+        except sqlite3.Error as e:
+            log.warning(f"Не удалось сохранить ответ в кэш: {str(e)}")
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Общий кэш ответов в папке настроек приложения"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(Settings().settings_dir / ResponseCache.DB_FILE_NAME)
+        return _cache
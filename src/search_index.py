@@ -0,0 +1,125 @@
+# src/search_index.py
+import logging
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from models import Prompt
+
+log = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class PromptSearchIndex:
+    """
+    Полнотекстовый индекс промптов на SQLite FTS5 (в памяти).
+
+    Индексируются title, description, content.ru, content.en и tags.
+    Поиск — по префиксам слов запроса (все слова обязательны),
+    результаты ранжируются по BM25. Индекс обновляется инкрементально
+    через upsert()/remove(). Если сборка SQLite без FTS5, available == False
+    и вызывающий код должен использовать линейный поиск.
+    """
+
+    # Веса BM25 для колонок: id, title, description, content_ru, content_en, tags
+    BM25_WEIGHTS = (0.0, 10.0, 4.0, 1.0, 1.0, 6.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        # id промпта -> rowid в FTS-таблице: удаление по rowid не требует полного прохода
+        self._rowids: Dict[str, int] = {}
+        self._next_rowid = 1
+        try:
+            self._conn.execute(
+                """
+                CREATE VIRTUAL TABLE prompts_fts USING fts5(
+                    id UNINDEXED, title, description, content_ru, content_en, tags,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '1 2 3'
+                )
+                """
+            )
+            # Ранжирование через скрытую колонку rank: BM25 с весами колонок
+            weights = ", ".join(map(str, self.BM25_WEIGHTS))
+            self._conn.execute(f"INSERT INTO prompts_fts(prompts_fts, rank) VALUES ('rank', 'bm25({weights})')")
+            self.available = True
+        except sqlite3.OperationalError as e:
+            log.warning(f"FTS5 недоступен, будет использован линейный поиск: {str(e)}")
+            self.available = False
+
+    @staticmethod
+    def _row(prompt: Prompt) -> tuple:
+        if isinstance(prompt.content, dict):
+            content_ru = prompt.content.get("ru", "") or ""
+            content_en = prompt.content.get("en", "") or ""
+        else:
+            content_ru, content_en = str(prompt.content), ""
+        return (
+            prompt.id,
+            prompt.title or "",
+            prompt.description or "",
+            content_ru,
+            content_en,
+            " ".join(prompt.tags or []),
+        )
+
+    def _insert_rows(self, prompts: Iterable[Prompt]):
+        rows = []
+        for prompt in prompts:
+            rowid = self._next_rowid
+            self._next_rowid += 1
+            self._rowids[prompt.id] = rowid
+            rows.append((rowid,) + self._row(prompt))
+        self._conn.executemany("INSERT INTO prompts_fts(rowid, id, title, description, content_ru, content_en, tags) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _delete_row(self, prompt_id: str):
+        rowid = self._rowids.pop(prompt_id, None)
+        if rowid is not None:
+            self._conn.execute("DELETE FROM prompts_fts WHERE rowid = ?", (rowid,))
+
+    def rebuild(self, prompts: Iterable[Prompt]):
+        """Полностью перестраивает индекс"""
+        if not self.available:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM prompts_fts")
+            self._rowids.clear()
+            self._insert_rows(prompts)
+
+    def upsert(self, prompt: Prompt):
+        if not self.available:
+            return
+        with self._lock, self._conn:
+            self._delete_row(prompt.id)
+            self._insert_rows([prompt])
+
+    def remove(self, prompt_id: str):
+        if not self.available:
+            return
+        with self._lock, self._conn:
+            self._delete_row(prompt_id)
+
+    @staticmethod
+    def build_match_query(query: str) -> Optional[str]:
+        """Превращает пользовательский запрос в выражение MATCH: все слова как префиксы"""
+        tokens = _TOKEN_RE.findall(query.lower())
+        if not tokens:
+            return None
+        return " AND ".join(f'"{token}"*' for token in tokens)
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """Возвращает id промптов, отсортированные по релевантности (BM25)"""
+        match = self.build_match_query(query)
+        if match is None:
+            return []
+        sql = "SELECT id FROM prompts_fts WHERE prompts_fts MATCH ? ORDER BY rank"
+        params: tuple = (match,)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql, params)]
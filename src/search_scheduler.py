@@ -0,0 +1,145 @@
+# src/search_scheduler.py
+import logging
+import statistics
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+
+class SearchSignals(QObject):
+    """Сигналы фоновой задачи поиска (доставляются в поток GUI)"""
+    results_ready = pyqtSignal(int, list, float)  # поколение, промпты, время запроса (с)
+    failed = pyqtSignal(int, str)
+
+
+class SearchRunnable(QRunnable):
+    """Выполняет один запрос фильтрации в пуле потоков"""
+
+    def __init__(self, generation: int, query: Callable[..., list], filters: dict,
+                 is_current: Callable[[int], bool]):
+        super().__init__()
+        self.generation = generation
+        self.query = query
+        self.filters = filters
+        self.is_current = is_current
+        self.signals = SearchSignals()
+
+    def run(self):
+        # Запрос устарел, пока ждал в очереди
+        if not self.is_current(self.generation):
+            return
+        started = time.perf_counter()
+        try:
+            results = self.query(**self.filters)
+        except Exception as e:
+            self.signals.failed.emit(self.generation, str(e))
+            return
+        self.signals.results_ready.emit(self.generation, results, time.perf_counter() - started)
+
+
+class SearchScheduler(QObject):
+    """
+    Планировщик фильтрации списка промптов для MainWindow.
+
+    Ввод в поле поиска откладывается на debounce_ms (каждое нажатие перезапускает
+    таймер), смена фильтров и сортировки запускает запрос сразу. Запрос выполняется
+    в отдельном пуле из одного потока. Каждому запросу присваивается номер
+    поколения: ещё не начатые устаревшие задачи снимаются с очереди, а результаты
+    устаревших поколений отбрасываются, поэтому старый ответ никогда не затирает
+    новый. Время выполнения запросов копится в скользящем окне; p50/p95
+    доступны через latency_stats() и периодически пишутся в лог.
+    """
+
+    results_ready = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    # Сколько последних запросов учитывать в статистике и как часто писать её в лог
+    LATENCY_WINDOW = 200
+    LATENCY_LOG_EVERY = 50
+
+    def __init__(self, query: Callable[..., list], debounce_ms: int = 150, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
+        self.query = query
+        self._generation = 0
+        self._pending_filters: dict = {}
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self._completed = 0
+        # Держим ссылки на задачи, пока их сигналы могут быть в очереди событий
+        self._runnables = {}
+
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(debounce_ms)
+        self._timer.timeout.connect(self._dispatch)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def is_current(self, generation: int) -> bool:
+        return generation == self._generation
+
+    def schedule(self, filters: dict, immediate: bool = False):
+        """Ставит запрос; предыдущий незавершённый запрос становится устаревшим"""
+        self._generation += 1
+        self._pending_filters = dict(filters)
+        if immediate:
+            self._timer.stop()
+            self._dispatch()
+        else:
+            self._timer.start()
+
+    def _dispatch(self):
+        self._pool.clear()
+        generation = self._generation
+        runnable = SearchRunnable(generation, self.query, self._pending_filters, self.is_current)
+        runnable.signals.results_ready.connect(self._on_results)
+        runnable.signals.failed.connect(self._on_failed)
+        self._runnables[generation] = runnable
+        self._pool.start(runnable)
+
+    def _on_results(self, generation: int, results: List, elapsed: float):
+        self._runnables.pop(generation, None)
+        self._record_latency(elapsed)
+        if not self.is_current(generation):
+            self.logger.debug(f"Результаты поиска поколения {generation} устарели, отброшены")
+            return
+        self._drop_stale_runnables()
+        self.results_ready.emit(results)
+
+    def _on_failed(self, generation: int, message: str):
+        self._runnables.pop(generation, None)
+        if self.is_current(generation):
+            self.failed.emit(message)
+        else:
+            self.logger.debug(f"Ошибка устаревшего поиска (поколение {generation}): {message}")
+
+    def _drop_stale_runnables(self):
+        for generation in [g for g in self._runnables if g < self._generation]:
+            del self._runnables[generation]
+
+    def _record_latency(self, elapsed: float):
+        self._latencies.append(elapsed)
+        self._completed += 1
+        if self._completed % self.LATENCY_LOG_EVERY == 0:
+            stats = self.latency_stats()
+            self.logger.info(
+                f"Поиск: p50={stats['p50'] * 1000:.1f} мс, p95={stats['p95'] * 1000:.1f} мс "
+                f"(последние {stats['count']} запросов)"
+            )
+
+    def latency_stats(self) -> dict:
+        """p50/p95 времени выполнения запросов (в секундах) по скользящему окну"""
+        if not self._latencies:
+            return {"count": 0, "p50": 0.0, "p95": 0.0}
+        values = list(self._latencies)
+        if len(values) == 1:
+            return {"count": 1, "p50": values[0], "p95": values[0]}
+        cuts = statistics.quantiles(values, n=20, method="inclusive")
+        return {"count": len(values), "p50": statistics.median(values), "p95": cuts[18]}
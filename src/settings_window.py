@@ -1,10 +1,16 @@
 from PyQt6.QtCore import QSettings, pyqtSignal
-from PyQt6.QtWidgets import QDialog, QVBoxLayout, QLabel, QLineEdit, QHBoxLayout, QPushButton, QMessageBox, QFileDialog
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QLabel, QLineEdit, QHBoxLayout, QPushButton, QMessageBox, QFileDialog, \
+    QSpinBox
+
+from llm_settings import Settings
 
 class SettingsDialog(QDialog):
     settings_changed = pyqtSignal()
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, settings: Settings = None):
         super().__init__(parent)
+        # Настройки приложения (settings.json); окно передаёт свой экземпляр,
+        # чтобы его следующая запись не вернула старые значения
+        self.app_settings = settings or Settings()
         # Инициализация компонентов
         layout = QVBoxLayout()
 
@@ -21,6 +27,18 @@ class SettingsDialog(QDialog):
         prompts_path_layout.addWidget(self.browse_button)
         layout.addLayout(prompts_path_layout)
 
+        # Интервал фоновой синхронизации библиотеки
+        self.auto_sync_label = QLabel(self.tr("Фоновая синхронизация, мин"))
+        self.auto_sync_spin = QSpinBox()
+        self.auto_sync_spin.setRange(0, 24 * 60)
+        self.auto_sync_spin.setSpecialValueText(self.tr("Выключена"))
+        self.auto_sync_spin.setValue(self.app_settings.get_auto_sync_interval())
+
+        auto_sync_layout = QHBoxLayout()
+        auto_sync_layout.addWidget(self.auto_sync_label)
+        auto_sync_layout.addWidget(self.auto_sync_spin)
+        layout.addLayout(auto_sync_layout)
+
         # Кнопка сохранения настроек
         save_button = QPushButton(self.tr("Сохранить"))
         save_button.clicked.connect(self.save_settings)
@@ -40,6 +58,7 @@ class SettingsDialog(QDialog):
     def save_settings(self):
         settings = QSettings("YourCompany", "YourApp")
         settings.setValue("prompts_path", self.prompts_path_edit.text())
+        self.app_settings.set_auto_sync_interval(self.auto_sync_spin.value())
         QMessageBox.information(self, self.tr("Успех"), self.tr("Настройки сохранены"))
         self.accept()
 
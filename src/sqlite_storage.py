@@ -0,0 +1,295 @@
+# src/sqlite_storage.py
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from models import Prompt
+from prompt_loader import LoadReport, LoadFailure, decode_prompt_data
+from storage import LocalStorage, prompt_to_file_dict, dump_prompt_json, DateTimeEncoder
+
+
+class SqliteStorage:
+    """
+    Альтернативное хранилище промптов на SQLite (аналог Room PromptDao в KMP-версии).
+
+    Повторяет интерфейс LocalStorage: save_prompt, load_prompt, list_prompts,
+    move_prompt_file, delete_prompt, batch. Локальные флаги (is_local, is_favorite,
+    local_updated_at) хранятся в колонках таблицы, а не в settings.json.
+
+    SyncManager и релизный prompts.zip работают с деревом JSON-файлов: перед
+    каждым сканированием SyncManager выгружает базу в дерево (export_to_tree),
+    флаги берёт из базы (local_flags), а изменения записывает в базу через
+    commit_changes, который флаги существующих промптов не меняет.
+    import_from_tree() — одноразовый импорт дерева в пустую базу.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS prompts (
+            id TEXT PRIMARY KEY,
+            category TEXT NOT NULL DEFAULT 'general',
+            title TEXT NOT NULL,
+            data TEXT NOT NULL,
+            is_local INTEGER NOT NULL DEFAULT 0,
+            is_favorite INTEGER NOT NULL DEFAULT 0,
+            local_updated_at TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_prompts_category ON prompts(category);
+    """
+
+    def __init__(self, db_path: str = "prompts.db", tree_path: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = Path(db_path)
+        # Дерево JSON-файлов, с которым работают синхронизация и экспорт
+        self.storage_path = Path(tree_path) if tree_path else self.db_path.with_suffix("")
+        self.last_load_report = LoadReport()
+        self.last_scan_timings = {}
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        # Соединение используется и из потока синхронизации, доступ сериализуется _lock
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self.logger.debug(f"Инициализация SqliteStorage: {self.db_path.absolute()}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def batch(self):
+        """Одна транзакция на весь блок; вложенные блоки присоединяются к внешнему"""
+        with self._lock:
+            if self._batch_depth == 0:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._conn.execute("COMMIT")
+
+    def _upsert(self, prompt: Prompt, local_updated_at: Optional[str] = None,
+                prompt_dict: Optional[dict] = None):
+        if prompt_dict is None:
+            prompt_dict = prompt_to_file_dict(prompt)
+        self._conn.execute(
+            """
+            INSERT INTO prompts (id, category, title, data, is_local, is_favorite,
+                                 local_updated_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                category = excluded.category,
+                title = excluded.title,
+                data = excluded.data,
+                is_local = excluded.is_local,
+                is_favorite = excluded.is_favorite,
+                local_updated_at = excluded.local_updated_at,
+                created_at = excluded.created_at,
+                updated_at = excluded.updated_at
+            """,
+            (
+                prompt.id,
+                prompt_dict["category"],
+                prompt.title,
+                json.dumps(prompt_dict, ensure_ascii=False, cls=DateTimeEncoder),
+                int(bool(prompt.is_local)),
+                int(bool(prompt.is_favorite)),
+                local_updated_at or datetime.now().isoformat(),
+                prompt.created_at.isoformat(),
+                prompt.updated_at.isoformat(),
+            ),
+        )
+
+    def save_prompt(self, prompt: Prompt):
+        try:
+            with self.batch():
+                self._upsert(prompt)
+        except Exception as e:
+            self.logger.error(f"Ошибка сохранения промпта {prompt.id}: {str(e)}", exc_info=True)
+            raise
+
+    def save_prompts(self, prompts: Iterable[Prompt]) -> int:
+        """Транзакционная пакетная запись (upsert) списка промптов"""
+        count = 0
+        with self.batch():
+            for prompt in prompts:
+                self._upsert(prompt)
+                count += 1
+        return count
+
+    def commit_changes(self, saves: Sequence[Prompt], deletes: Sequence[str],
+                       progress_cb: Optional[Callable[[int], None]] = None) -> Tuple[int, int]:
+        """
+        Пакет изменений синхронизации одной транзакцией; возвращает (сохранено, удалено).
+        is_local/is_favorite промптов, уже лежащих в базе, берутся из базы.
+        """
+        done = 0
+        deleted = 0
+        with self.batch():
+            flags = self.local_flags()
+            for prompt in saves:
+                if prompt.id in flags:
+                    prompt.is_local, prompt.is_favorite = flags[prompt.id]
+                self._upsert(prompt)
+                done += 1
+                if progress_cb is not None:
+                    progress_cb(done)
+            for prompt_id in deletes:
+                cursor = self._conn.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
+                deleted += cursor.rowcount
+                done += 1
+                if progress_cb is not None:
+                    progress_cb(done)
+        return len(saves), deleted
+
+    def local_flags(self) -> Dict[str, Tuple[bool, bool]]:
+        """id -> (is_local, is_favorite) для всех промптов базы"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, is_local, is_favorite FROM prompts").fetchall()
+        return {prompt_id: (bool(is_local), bool(is_favorite)) for prompt_id, is_local, is_favorite in rows}
+
+    def _row_to_prompt(self, row) -> Prompt:
+        data, category, is_local, is_favorite = row
+        prompt = Prompt.model_validate(decode_prompt_data(json.loads(data)))
+        prompt.category = category
+        prompt.is_local = bool(is_local)
+        prompt.is_favorite = bool(is_favorite)
+        return prompt
+
+    def load_prompt(self, prompt_id: str) -> Optional[Prompt]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, category, is_local, is_favorite FROM prompts WHERE id = ?",
+                (prompt_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return self._row_to_prompt(row)
+        except Exception as e:
+            self.logger.error(f"Ошибка загрузки промпта {prompt_id}: {str(e)}")
+            return None
+
+    def list_prompts(self) -> List[Prompt]:
+        started = time.perf_counter()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, data, category, is_local, is_favorite FROM prompts ORDER BY category, id"
+            ).fetchall()
+        fetched = time.perf_counter()
+
+        report = LoadReport()
+        for prompt_id, *row in rows:
+            try:
+                report.prompts.append(self._row_to_prompt(row))
+            except Exception as e:
+                report.failures.append(LoadFailure(path=Path(f"{prompt_id}.json"), error=str(e)))
+                self.logger.error(f"Ошибка загрузки промпта {prompt_id}: {str(e)}")
+        finished = time.perf_counter()
+
+        self.last_load_report = report
+        self.last_scan_timings = {
+            "query": fetched - started,
+            "parse": finished - fetched,
+            "total": finished - started,
+        }
+        self.logger.info(f"Загружено промптов из SQLite: {len(report.prompts)}")
+        return report.prompts
+
+    def move_prompt_file(self, prompt_id: str, old_category: str, new_category: str):
+        """Меняет категорию промпта (аналог перемещения файла между папками)"""
+        with self.batch():
+            row = self._conn.execute("SELECT data FROM prompts WHERE id = ?", (prompt_id,)).fetchone()
+            if row is None:
+                raise ValueError(
+                    f"Промпт {prompt_id} не найден в категории {old_category} или в корне")
+            data = json.loads(row[0])
+            data["category"] = new_category
+            self._conn.execute(
+                "UPDATE prompts SET category = ?, data = ? WHERE id = ?",
+                (new_category, json.dumps(data, ensure_ascii=False), prompt_id),
+            )
+
+    def delete_prompt(self, prompt_id: str, category: str = None):
+        with self.batch():
+            cursor = self._conn.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
+        if cursor.rowcount == 0:
+            raise ValueError("Промпт не найден")
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM prompts LIMIT 1").fetchone() is None
+
+    def import_from_tree(self, tree_path: Optional[str] = None) -> int:
+        """
+        Одноразовый импорт из дерева prompts/ вместе с флагами из settings.json.
+        """
+        tree = LocalStorage(str(tree_path or self.storage_path))
+        prompts = tree.list_prompts()
+        local_updated = tree.settings.settings.get("local_updated_at", {})
+        with self.batch():
+            for prompt in prompts:
+                # В колонку data кладём исходный JSON файла, чтобы импорт не менял
+                # updated_at и прочие поля, которые Prompt дополняет при валидации
+                file_path = tree.find_prompt_path(prompt.id)
+                prompt_dict = json.loads(file_path.read_bytes()) if file_path else prompt_to_file_dict(prompt)
+                prompt_dict["category"] = prompt.category
+                self._upsert(prompt, local_updated_at=local_updated.get(prompt.id), prompt_dict=prompt_dict)
+        self.logger.info(f"Импортировано промптов в SQLite: {len(prompts)}")
+        return len(prompts)
+
+    def export_to_tree(self, tree_path: Optional[str] = None, prune: bool = False) -> int:
+        """
+        Экспорт в дерево prompts/<категория>/<id>.json (формат LocalStorage),
+        флаги переносятся в settings.json. Неизменённые файлы не перезаписываются,
+        чтобы их mtime не влиял на решения синхронизации.
+        """
+        tree = LocalStorage(str(tree_path or self.storage_path))
+        target = tree.storage_path
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, category, data, is_local, is_favorite FROM prompts ORDER BY category, id"
+            ).fetchall()
+        written = 0
+        expected = set()
+        with tree.batch():
+            for prompt_id, category, data, is_local, is_favorite in rows:
+                # Пишем сохранённые данные как есть (без повторной валидации через Prompt,
+                # которая перезаписала бы updated_at)
+                prompt_dict = json.loads(data)
+                prompt_dict["category"] = category
+                file_path = target / category / f"{prompt_id}.json"
+                expected.add(file_path)
+                content = dump_prompt_json(prompt_dict)
+                if not file_path.exists() or file_path.read_text(encoding="utf-8") != content:
+                    file_path.parent.mkdir(parents=True, exist_ok=True)
+                    file_path.write_text(content, encoding="utf-8")
+                    written += 1
+                tree.settings.set_local(prompt_id, bool(is_local))
+                tree.settings.set_favorite(prompt_id, bool(is_favorite))
+
+            if prune:
+                for file_path in target.glob("*/*.json"):
+                    # Служебные папки (.sync-staging) не трогаем
+                    if file_path not in expected and not file_path.parent.name.startswith("."):
+                        file_path.unlink()
+                        tree.settings.remove_local_updated_at(file_path.stem)
+        self.logger.info(f"Экспортировано промптов: {len(rows)}, записано файлов: {written}")
+        return written
@@ -1,12 +1,20 @@
 # data/storage.py
+import hashlib
 import json
 import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 from datetime import datetime
 
 from models import Prompt
 from llm_settings import Settings
+from prompt_loader import PromptLoader, LoadReport, decode_prompt_data
+from prompt_snapshot import PromptSnapshot, SnapshotEntry
+from sync_journal import SyncJournal
 
 
 class DateTimeEncoder(json.JSONEncoder):
@@ -17,8 +25,36 @@ class DateTimeEncoder(json.JSONEncoder):
         return super().default(obj)
 
 
+def prompt_to_file_dict(prompt: Prompt) -> dict:
+    """Готовит словарь для файла промпта: без локальных флагов, с категорией по умолчанию"""
+    # Устанавливаем флаги в False перед сохранением
+    prompt_dict = prompt.model_dump()
+    prompt_dict["is_local"] = bool(False)
+    prompt_dict["is_favorite"] = bool(False)
+
+    # Проверяем и устанавливаем категорию
+    if not prompt_dict.get("category"):
+        prompt_dict["category"] = "general"
+    return prompt_dict
+
+
+def library_cache_dir(settings_dir: Path, storage_path: Path) -> Path:
+    """Каталог служебных кэшей библиотеки (в папке настроек, не в prompts/)"""
+    key = hashlib.sha1(str(Path(storage_path).resolve()).encode("utf-8")).hexdigest()[:12]
+    return Path(settings_dir) / "cache" / key
+
+
+def dump_prompt_json(prompt_dict: dict) -> str:
+    """Сериализует промпт в том же виде, в каком он хранится в файлах библиотеки"""
+    return json.dumps(prompt_dict, indent=2, ensure_ascii=False, cls=DateTimeEncoder)
+
+
 class LocalStorage:
-    def __init__(self, base_path: str = "prompts"):
+    INDEX_FILE_NAME = "prompt_index.json"
+    SNAPSHOT_FILE_NAME = "library.snapshot"
+
+    def __init__(self, base_path: str = "prompts", persist_index: bool = True,
+                 loader: Optional[PromptLoader] = None, use_snapshot: bool = True):
         self.logger = logging.getLogger(__name__)
         self.storage_path = Path(base_path)
         self.logger.debug(f"Инициализация LocalStorage с путем: {self.storage_path.absolute()}")
@@ -32,133 +68,508 @@ class LocalStorage:
         self.base_path = Path(base_path)
         self.base_path.mkdir(parents=True, exist_ok=True)
         self.settings = Settings()
+        # Хранилище меняют поток GUI, наблюдатель за папкой и синхронизация: индекс путей,
+        # снимок, счётчики batch() и флаги в Settings меняются только под этой блокировкой
+        self._lock = threading.RLock()
+        self.loader = loader or PromptLoader()
+        self.last_load_report = LoadReport()
 
-    def save_prompt(self, prompt: Prompt):
+        # Индекс prompt_id -> путь к файлу. Строится при первом сканировании,
+        # поддерживается save/move/delete и (опционально) сохраняется на диск.
+        self.persist_index = persist_index
+        self.cache_dir = self._get_cache_dir()
+        self._path_index: Dict[str, Path] = {}
+        self._batch_depth = 0
+        self._index_dirty = False
+        if self.persist_index:
+            self._load_index()
+
+        # Снимок разобранной библиотеки: rel_path -> (mtime_ns, size, Prompt)
+        self.snapshot = PromptSnapshot(self.cache_dir / self.SNAPSHOT_FILE_NAME) if use_snapshot else None
+        self._snapshot_entries: Optional[Dict[str, SnapshotEntry]] = None
+        self._snapshot_dirty = False
+
+    def _get_cache_dir(self) -> Path:
+        """Каталог служебных кэшей этой библиотеки (в папке настроек, не в prompts/)"""
+        return library_cache_dir(self.settings.settings_dir, self.storage_path)
+
+    def _load_index(self):
+        """Загружает сохранённый индекс id -> относительный путь"""
+        index_file = self.cache_dir / self.INDEX_FILE_NAME
         try:
-            # Сохраняем локальные настройки
-            self.settings.set_local(prompt.id, bool(prompt.is_local))
-            self.settings.set_favorite(prompt.id, bool(prompt.is_favorite))
+            if index_file.exists():
+                with open(index_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._path_index = {
+                    prompt_id: self.storage_path / rel_path for prompt_id, rel_path in data.items()
+                }
+                self.logger.debug(f"Загружен индекс путей: {len(self._path_index)} записей")
+        except Exception as e:
+            self.logger.warning(f"Не удалось загрузить индекс путей {index_file}: {str(e)}")
+            self._path_index = {}
 
-            # Сохраняем локальное время изменения
-            current_time = datetime.now().isoformat()
-            self.settings.set_local_updated_at(prompt.id, current_time)
+    @contextmanager
+    def batch(self):
+        """
+        Группирует массовые операции (синхронизация, импорт): settings.json,
+        индекс путей и снимок библиотеки записываются один раз при выходе из блока.
+        Блокировка хранилища держится весь блок.
+        """
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                with self.settings.batch():
+                    yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    if self._index_dirty:
+                        self._save_index()
+                    if self._snapshot_dirty:
+                        self._save_snapshot()
 
-            # Устанавливаем флаги в False перед сохранением
-            prompt_dict = prompt.model_dump()
-            prompt_dict["is_local"] = bool(False)
-            prompt_dict["is_favorite"] = bool(False)
+    def _rel_key(self, file_path: Path) -> str:
+        return file_path.relative_to(self.storage_path).as_posix()
 
-            # Проверяем и устанавливаем категорию
-            if not prompt_dict.get("category"):
-                prompt_dict["category"] = "general"
+    def _save_snapshot(self):
+        """Сохраняет снимок библиотеки (внутри batch() — отложенно)"""
+        if self.snapshot is None or self._snapshot_entries is None:
+            return
+        if self._batch_depth > 0:
+            self._snapshot_dirty = True
+            return
+        self._snapshot_dirty = False
+        self.snapshot.save(self._snapshot_entries)
 
-            # Формируем путь с учётом категории
-            category_dir = self._get_category_dir(prompt_dict["category"])
-            file_path = category_dir / f"{prompt.id}.json"
+    def _snapshot_put(self, file_path: Path, prompt: Prompt):
+        """Обновляет запись снимка после записи файла промпта"""
+        if self.snapshot is None or self._snapshot_entries is None:
+            return
+        try:
+            st = file_path.stat()
+        except OSError:
+            return
+        self._snapshot_entries[self._rel_key(file_path)] = SnapshotEntry(st.st_mtime_ns, st.st_size, prompt)
+        self._save_snapshot()
 
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(prompt_dict, f, indent=2, ensure_ascii=False, cls=DateTimeEncoder)
+    def _snapshot_drop(self, file_path: Path) -> Optional[SnapshotEntry]:
+        if self.snapshot is None or self._snapshot_entries is None:
+            return None
+        entry = self._snapshot_entries.pop(self._rel_key(file_path), None)
+        if entry is not None:
+            self._save_snapshot()
+        return entry
 
+    def _save_index(self):
+        """Сохраняет индекс id -> относительный путь (атомарно)"""
+        if not self.persist_index:
+            return
+        if self._batch_depth > 0:
+            self._index_dirty = True
+            return
+        self._index_dirty = False
+        index_file = self.cache_dir / self.INDEX_FILE_NAME
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            data = {
+                prompt_id: path.relative_to(self.storage_path).as_posix()
+                for prompt_id, path in self._path_index.items()
+            }
+            tmp_file = index_file.with_suffix(".tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, index_file)
         except Exception as e:
-            self.logger.error(f"Ошибка сохранения промпта {prompt.id}: {str(e)}", exc_info=True)
-            raise
+            self.logger.warning(f"Не удалось сохранить индекс путей {index_file}: {str(e)}")
+
+    def _set_index_path(self, prompt_id: str, file_path: Path):
+        if self._path_index.get(prompt_id) != file_path:
+            self._path_index[prompt_id] = file_path
+            self._save_index()
+
+    def _drop_index_path(self, prompt_id: str):
+        if self._path_index.pop(prompt_id, None) is not None:
+            self._save_index()
+
+    def find_prompt_path(self, prompt_id: str) -> Optional[Path]:
+        """
+        Возвращает путь к файлу промпта: сначала по индексу, при промахе
+        (или устаревшей записи) — поиском в корне и папках категорий.
+        """
+        with self._lock:
+            file_path = self._path_index.get(prompt_id)
+            if file_path is not None and file_path.exists():
+                return file_path
+
+            # Сначала проверяем корневую папку (для случаев без категорий)
+            root_file = self.storage_path / f"{prompt_id}.json"
+            if root_file.exists():
+                self._set_index_path(prompt_id, root_file)
+                return root_file
+
+            # Затем проверяем все подпапки (категории)
+            for category_dir in self.storage_path.iterdir():
+                # Служебные папки (.sync-staging и т.п.) категориями не являются
+                if category_dir.is_dir() and not category_dir.name.startswith("."):
+                    candidate = category_dir / f"{prompt_id}.json"
+                    if candidate.exists():
+                        self._set_index_path(prompt_id, candidate)
+                        return candidate
+
+            self._drop_index_path(prompt_id)
+            return None
+
+    def save_prompt(self, prompt: Prompt):
+        with self._lock:
+            try:
+                # Сохраняем локальные настройки (одной записью settings.json)
+                with self.settings.batch():
+                    self.settings.set_local(prompt.id, bool(prompt.is_local))
+                    self.settings.set_favorite(prompt.id, bool(prompt.is_favorite))
+
+                    # Сохраняем локальное время изменения
+                    current_time = datetime.now().isoformat()
+                    self.settings.set_local_updated_at(prompt.id, current_time)
+
+                prompt_dict = prompt_to_file_dict(prompt)
+
+                # Формируем путь с учётом категории
+                category_dir = self._get_category_dir(prompt_dict["category"])
+                file_path = category_dir / f"{prompt.id}.json"
+
+                with open(file_path, "w", encoding="utf-8") as f:
+                    f.write(dump_prompt_json(prompt_dict))
+
+                self._set_index_path(prompt.id, file_path)
+                self._snapshot_put(file_path, prompt.model_copy(update={
+                    "category": prompt_dict["category"], "is_local": False, "is_favorite": False,
+                }))
+
+            except Exception as e:
+                self.logger.error(f"Ошибка сохранения промпта {prompt.id}: {str(e)}", exc_info=True)
+                raise
+
+    def commit_changes(self, saves: Sequence[Prompt], deletes: Sequence[str],
+                       progress_cb: Optional[Callable[[int], None]] = None) -> Tuple[int, int]:
+        """
+        Транзакционно применяет пакет изменений (синхронизация): сохраняет saves и
+        удаляет промпты с id из deletes. Через SyncJournal: все файлы сначала
+        готовятся рядом с библиотекой, затем фиксируется журнал и файлы переносятся
+        на место; после сбоя recover_pending_changes() доводит журнал до конца.
+        Возвращает (сохранено, удалено).
+        """
+        with self._lock:
+            self.recover_pending_changes()
+            journal = SyncJournal(self.storage_path)
+            journal.begin()
+            staged_prompts: Dict[str, Prompt] = {}
+            try:
+                for prompt in saves:
+                    prompt_dict = prompt_to_file_dict(prompt)
+                    rel_path = f"{prompt_dict['category']}/{prompt.id}.json"
+                    journal.stage_write(rel_path, dump_prompt_json(prompt_dict).encode("utf-8"),
+                                        id=prompt.id, is_local=bool(prompt.is_local),
+                                        is_favorite=bool(prompt.is_favorite))
+                    staged_prompts[rel_path] = prompt.model_copy(update={
+                        "category": prompt_dict["category"], "is_local": False, "is_favorite": False,
+                    })
+                saved_ids = {prompt.id for prompt in saves}
+                for prompt_id in deletes:
+                    file_path = self.find_prompt_path(prompt_id)
+                    if file_path is None:
+                        self.logger.warning(f"Промпт {prompt_id} для удаления не найден")
+                        continue
+                    rel_path = self._rel_key(file_path)
+                    if rel_path in staged_prompts:
+                        continue
+                    # Промпт переехал в другую категорию: удаляется только старый файл
+                    journal.stage_delete(rel_path, id=prompt_id, moved=prompt_id in saved_ids)
+                journal.prepare()
+            except BaseException:
+                journal.discard()
+                raise
+
+            with self.batch():
+                journal.commit(lambda op: self._apply_journal_op(op, staged_prompts.get(op["target"])), progress_cb)
+            saved = sum(1 for op in journal.ops if op["op"] == "write")
+            return saved, len(journal.ops) - saved
+
+    def recover_pending_changes(self) -> int:
+        """Доводит до конца пакет изменений, прерванный сбоем (вызывается при старте)"""
+        with self._lock:
+            journal = SyncJournal(self.storage_path)
+            with self.batch():
+                return journal.recover(self._apply_journal_op)
+
+    def _apply_journal_op(self, op: dict, prompt: Optional[Prompt] = None):
+        """Обновляет настройки, индекс путей и снимок после выполнения операции журнала"""
+        file_path = self.storage_path / op["target"]
+        prompt_id = op["id"]
+        if op["op"] == "write":
+            self.settings.set_local(prompt_id, op["is_local"])
+            self.settings.set_favorite(prompt_id, op["is_favorite"])
+            self.settings.set_local_updated_at(prompt_id, datetime.now().isoformat())
+            self._set_index_path(prompt_id, file_path)
+            if prompt is not None:
+                self._snapshot_put(file_path, prompt)
+            else:
+                self._snapshot_drop(file_path)
+        else:
+            self._snapshot_drop(file_path)
+            if not op.get("moved"):
+                self._drop_index_path(prompt_id)
+                self.settings.remove_local_updated_at(prompt_id)
 
     def load_prompt(self, prompt_id: str) -> Optional[Prompt]:
         """Ищет промпт в корневой папке и всех категориях"""
-        prompt = self._load_prompt_base(prompt_id)
-        if prompt:
-            # Добавляем локальные настройки
-            prompt.is_local = self.settings.is_local(prompt_id)
-            prompt.is_favorite = self.settings.is_favorite(prompt_id)
+        with self._lock:
+            prompt = self._load_prompt_base(prompt_id)
+            if prompt:
+                # Добавляем локальные настройки
+                prompt.is_local = self.settings.is_local(prompt_id)
+                prompt.is_favorite = self.settings.is_favorite(prompt_id)
             
-            # updated_at остается как есть из файла промпта
-            # Оно будет обновляться только при синхронизации с сервера
-        return prompt
+                # updated_at остается как есть из файла промпта
+                # Оно будет обновляться только при синхронизации с сервера
+            return prompt
 
     def _load_prompt_base(self, prompt_id: str) -> Optional[Prompt]:
         """Базовая загрузка промпта без локальных настроек"""
-        # Сначала проверяем корневую папку (для случаев без категорий)
-        root_file = self.storage_path / f"{prompt_id}.json"
-        if root_file.exists():
-            return self._load_from_path(root_file)
-
-        # Затем проверяем все подпапки (категории)
-        for category_dir in self.storage_path.iterdir():
-            if category_dir.is_dir():
-                file_path = category_dir / f"{prompt_id}.json"
-                if file_path.exists():
-                    return self._load_from_path(file_path)
-
-        return None
+        file_path = self.find_prompt_path(prompt_id)
+        if file_path is None:
+            return None
+        return self._load_from_path(file_path)
 
     def _load_from_path(self, file_path: Path) -> Optional[Prompt]:
         """Вспомогательный метод для загрузки и очистки данных"""
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                
-            # Проверяем и устанавливаем категорию
-            if not data.get("category"):
-                data["category"] = "general"
-                
-            # Конвертируем строки ISO в datetime
-            if "created_at" in data and isinstance(data["created_at"], str):
-                data["created_at"] = datetime.fromisoformat(data["created_at"])
-            if "updated_at" in data and isinstance(data["updated_at"], str):
-                data["updated_at"] = datetime.fromisoformat(data["updated_at"])
-
-            return Prompt.model_validate(data)
+            return Prompt.model_validate(decode_prompt_data(data))
         except Exception as e:
             self.logger.error(f"Ошибка загрузки {file_path.name}: {str(e)}")
             return None
 
     def list_prompts(self) -> List[Prompt]:
-        self.logger.debug(f"Начало загрузки промптов из {self.storage_path}")
-        prompts = []
-        
-        # Проверяем существование директории
-        if not self.storage_path.exists():
-            self.logger.error(f"Директория {self.storage_path} не существует")
+        """
+        Загружает все промпты за один проход по дереву каталогов.
+
+        Каждый файл читается ровно один раз по уже известному пути (без повторного
+        поиска через load_prompt), а локальные флаги из Settings применяются пачкой.
+        Если включён снимок библиотеки, заново разбираются только файлы, чей
+        (mtime, size) изменился. Время по фазам сохраняется в self.last_scan_timings.
+        """
+        with self._lock:
+            self.logger.debug(f"Начало загрузки промптов из {self.storage_path}")
+            prompts = []
+            self.last_scan_timings = {}
+
+            # Проверяем существование директории
+            if not self.storage_path.exists():
+                self.logger.error(f"Директория {self.storage_path} не существует")
+                return prompts
+
+            # Фаза 1: сканирование дерева (root + один уровень категорий)
+            started = time.perf_counter()
+            entries = self._scan_prompt_files()
+            scanned = time.perf_counter()
+            self.logger.debug(f"Найдено файлов промптов: {len(entries)}")
+
+            # Фаза 2: сверка со снимком библиотеки
+            cached = {}
+            if self.snapshot is not None:
+                cached = self._snapshot_entries if self._snapshot_entries is not None else self.snapshot.load()
+            fresh_entries: Dict[str, SnapshotEntry] = {}
+            stale = []
+            for file_path, category, mtime_ns, size in entries:
+                rel = self._rel_key(file_path)
+                entry = cached.get(rel)
+                if entry is not None and entry.mtime_ns == mtime_ns and entry.size == size:
+                    fresh_entries[rel] = entry
+                else:
+                    stale.append((file_path, category, mtime_ns, size))
+            snapshot_checked = time.perf_counter()
+
+            # Фаза 3: параллельный парсинг изменившихся файлов по известному пути
+            report = self.loader.load([file_path for file_path, *_ in stale])
+            stats = {file_path: (category, mtime_ns, size) for file_path, category, mtime_ns, size in stale}
+            for prompt, file_path in zip(report.prompts, report.paths):
+                category, mtime_ns, size = stats[file_path]
+                self._apply_folder_category(prompt, category)
+                fresh_entries[self._rel_key(file_path)] = SnapshotEntry(mtime_ns, size, prompt)
+            for failure in report.failures:
+                self.logger.error(f"Ошибка загрузки {failure.path.name}: {failure.error}")
+            self.last_load_report = report
+            parsed = time.perf_counter()
+
+            # Сохраняем порядок сканирования; первый найденный файл выигрывает в индексе путей,
+            # как и при поиске через find_prompt_path
+            path_index = {}
+            for file_path, *_ in entries:
+                entry = fresh_entries.get(self._rel_key(file_path))
+                if entry is None:
+                    continue
+                prompts.append(entry.prompt)
+                path_index.setdefault(entry.prompt.id, file_path)
+
+            # Индекс путей перестраивается целиком по результатам сканирования
+            self._path_index = path_index
+            self._save_index()
+
+            if self.snapshot is not None:
+                snapshot_changed = bool(stale) or len(fresh_entries) != len(cached)
+                self._snapshot_entries = fresh_entries
+                if snapshot_changed:
+                    self._save_snapshot()
+
+            # Фаза 4: применение локальных флагов одним проходом
+            flags_started = time.perf_counter()
+            self._apply_local_flags(prompts)
+            finished = time.perf_counter()
+
+            self.last_scan_timings = {
+                "scan": scanned - started,
+                "snapshot": snapshot_checked - scanned,
+                "parse": parsed - snapshot_checked,
+                "flags": finished - flags_started,
+                "total": finished - started,
+            }
+            self.logger.info(
+                "Загружено промптов: %d из %d файлов, разобрано заново: %d "
+                "(scan %.1f мс, snapshot %.1f мс, parse %.1f мс, flags %.1f мс)",
+                len(prompts), len(entries), len(stale),
+                self.last_scan_timings["scan"] * 1000,
+                self.last_scan_timings["snapshot"] * 1000,
+                self.last_scan_timings["parse"] * 1000,
+                self.last_scan_timings["flags"] * 1000,
+            )
             return prompts
-            
-        # Ищем в корне (для совместимости с существующими файлами)
-        root_files = list(self.storage_path.glob("*.json"))
-        self.logger.debug(f"Найдено файлов в корне: {len(root_files)}")
-        
-        for file_path in root_files:
-            if not file_path.is_dir():
-                try:
-                    prompt = self.load_prompt(file_path.stem)
-                    if prompt:
-                        # Проверяем категорию
-                        if not prompt.category:
-                            prompt.category = "general"
-                        prompts.append(prompt)
-                        self.logger.debug(f"Загружен промпт: {file_path.name}")
-                except Exception as e:
-                    self.logger.error(f"Ошибка чтения {file_path.name}: {str(e)}", exc_info=True)
-
-        # Ищем во всех категориях
-        categories = [d for d in self.storage_path.iterdir() if d.is_dir()]
-        self.logger.debug(f"Найдено категорий: {len(categories)}")
-        
-        for category_dir in categories:
-            category_files = list(category_dir.glob("*.json"))
-            self.logger.debug(f"В категории {category_dir.name} найдено файлов: {len(category_files)}")
-            
-            for file_path in category_files:
+
+    def _scan_prompt_files(self) -> List[Tuple[Path, Optional[str], int, int]]:
+        """
+        Возвращает кортежи (путь к файлу, категория, mtime_ns, size) для всех *.json
+        в корне и в папках категорий. Для файлов из корня категория равна None.
+        """
+        root_files = []
+        category_files = []
+        with os.scandir(self.storage_path) as root_entries:
+            for entry in root_entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir():
+                    with os.scandir(entry.path) as category_entries:
+                        for child in category_entries:
+                            if child.name.endswith(".json") and child.is_file():
+                                st = child.stat()
+                                category_files.append((Path(child.path), entry.name, st.st_mtime_ns, st.st_size))
+                elif entry.name.endswith(".json") and entry.is_file():
+                    st = entry.stat()
+                    root_files.append((Path(entry.path), None, st.st_mtime_ns, st.st_size))
+        return root_files + category_files
+
+    @staticmethod
+    def _apply_folder_category(prompt: Prompt, category: Optional[str]):
+        if category is None:
+            # Файл в корне (для совместимости с существующими файлами)
+            if not prompt.category:
+                prompt.category = "general"
+        elif prompt.category != category:
+            # Категория определяется папкой, в которой лежит файл
+            prompt.category = category
+
+    def refresh_files(self, paths: Iterable[Path]) -> Tuple[List[Prompt], List[str], LoadReport]:
+        """
+        Перечитывает отдельные файлы библиотеки после внешних изменений (правка
+        вручную, git checkout), не сканируя всё дерево. Путь к папке категории
+        означает все её файлы, включая исчезнувшие вместе с папкой.
+
+        Файлы, чей (mtime, size) совпадает со снимком, не разбираются: обычно это
+        собственные записи хранилища. Удалённый файл считается удалением промпта,
+        только если промпта с тем же id нет в другом месте (перенос между папками).
+        Возвращает (перечитанные промпты, id удалённых промптов, отчёт о разборе).
+        """
+        with self._lock:
+            existing: Dict[Path, Optional[str]] = {}
+            gone = []
+            resolved_root = self.storage_path.resolve()
+            for file_path in paths:
+                file_path = Path(file_path)
                 try:
-                    prompt = self.load_prompt(file_path.stem)
-                    if prompt:
-                        # Проверяем и устанавливаем категорию из пути
-                        if not prompt.category or prompt.category != category_dir.name:
-                            prompt.category = category_dir.name
-                        prompts.append(prompt)
-                except Exception as e:
-                    self.logger.error(f"Ошибка чтения {file_path.name}: {str(e)}", exc_info=True)
-                    
-        self.logger.debug(f"Всего загружено промптов: {len(prompts)}")
-        return prompts
+                    parts = file_path.relative_to(self.storage_path).parts
+                except ValueError:
+                    try:
+                        parts = file_path.resolve().relative_to(resolved_root).parts
+                    except ValueError:
+                        continue
+                # Пути приводятся к виду, в котором их хранит индекс путей
+                file_path = self.storage_path.joinpath(*parts)
+                if not parts or len(parts) > 2 or any(part.startswith(".") for part in parts):
+                    continue
+                if len(parts) == 1 and not parts[0].endswith(".json"):
+                    # Папка категории: её файлы на диске и в индексе путей
+                    if file_path.is_dir():
+                        for child in file_path.glob("*.json"):
+                            existing[child] = parts[0]
+                    gone += [path for path in self._path_index.values()
+                             if path.parent == file_path and not path.exists()]
+                    continue
+                if not parts[-1].endswith(".json"):
+                    continue
+                if file_path.is_file():
+                    existing[file_path] = parts[0] if len(parts) == 2 else None
+                else:
+                    gone.append(file_path)
+
+            removed = []
+            with self.batch():
+                for file_path in gone:
+                    self._snapshot_drop(file_path)
+                    prompt_id = file_path.stem
+                    if self._path_index.get(prompt_id) != file_path:
+                        continue
+                    self._drop_index_path(prompt_id)
+                    moved_to = self.find_prompt_path(prompt_id)
+                    if moved_to is None:
+                        removed.append(prompt_id)
+                    elif moved_to not in existing:
+                        relative = moved_to.relative_to(self.storage_path).parts
+                        existing[moved_to] = relative[0] if len(relative) == 2 else None
+
+                stale = []
+                for file_path, category in existing.items():
+                    try:
+                        st = file_path.stat()
+                    except OSError:
+                        continue
+                    entry = (self._snapshot_entries or {}).get(self._rel_key(file_path))
+                    if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                        continue
+                    stale.append((file_path, category, st.st_mtime_ns, st.st_size))
+
+                report = self.loader.load([file_path for file_path, *_ in stale])
+                stats = {file_path: (category, mtime_ns, size) for file_path, category, mtime_ns, size in stale}
+                for prompt, file_path in zip(report.prompts, report.paths):
+                    category, mtime_ns, size = stats[file_path]
+                    self._apply_folder_category(prompt, category)
+                    self._set_index_path(prompt.id, file_path)
+                    if self.snapshot is not None and self._snapshot_entries is not None:
+                        self._snapshot_entries[self._rel_key(file_path)] = SnapshotEntry(mtime_ns, size, prompt)
+                        self._save_snapshot()
+                for failure in report.failures:
+                    self.logger.error(f"Ошибка загрузки {failure.path.name}: {failure.error}")
+
+            self._apply_local_flags(report.prompts)
+            self.logger.info(f"Перечитано файлов: {len(report.prompts)} из {len(existing)}, "
+                             f"удалено промптов: {len(removed)}, ошибок: {len(report.failures)}")
+            return report.prompts, removed, report
+
+    def _apply_local_flags(self, prompts: List[Prompt]):
+        """Проставляет is_local/is_favorite из Settings для списка промптов"""
+        favorites = self.settings.settings.get("favorites", {})
+        local_prompts = self.settings.settings.get("local_prompts", {})
+        for prompt in prompts:
+            prompt.is_local = local_prompts.get(prompt.id, False)
+            prompt.is_favorite = favorites.get(prompt.id, False)
 
     def _resave_if_needed(self, file_path: Path, original_data: bytes, cleaned_content: str):
         """Пересохраняет файл, если обнаружены проблемы с кодировкой"""
@@ -179,33 +590,45 @@ class LocalStorage:
 
     def move_prompt_file(self, prompt_id: str, old_category: str, new_category: str):
         """Перемещает файл промпта между категориями"""
-        old_path = self._get_category_dir(old_category) / f"{prompt_id}.json"
-        new_path = self._get_category_dir(new_category) / f"{prompt_id}.json"
+        with self._lock:
+            new_path = self._get_category_dir(new_category) / f"{prompt_id}.json"
 
-        # Если файл в старой категории не найден — ищем в корне
-        if not old_path.exists():
-            old_path = self.storage_path / f"{prompt_id}.json"  # Корневая папка
+            # Фактическое расположение берём из индекса, затем проверяем
+            # старую категорию и корень
+            old_path = self._path_index.get(prompt_id)
+            if old_path is None or not old_path.exists():
+                old_path = self.storage_path / old_category / f"{prompt_id}.json"
+                if not old_path.exists():
+                    old_path = self.storage_path / f"{prompt_id}.json"  # Корневая папка
 
-        if old_path.exists():
-            old_path.rename(new_path)
-        else:
-            raise ValueError(
-                f"Файл промпта {prompt_id} не найден в категории {old_category} или в корне")
+            if old_path.exists():
+                old_path.rename(new_path)
+                self._set_index_path(prompt_id, new_path)
+                entry = self._snapshot_drop(old_path)
+                if entry is not None:
+                    # После rename stat файла не меняется, обновляем только категорию
+                    self._snapshot_put(new_path, entry.prompt.model_copy(update={"category": new_category}))
+            else:
+                raise ValueError(
+                    f"Файл промпта {prompt_id} не найден в категории {old_category} или в корне")
 
     def delete_prompt(self, prompt_id: str, category: str = None):
         """Удаляет промпт по ID, категория определяется из промпта или передаётся явно"""
-        if not category:
-            prompt = self.load_prompt(prompt_id)
-            if not prompt:
-                raise ValueError("Промпт не найден")
-            category = prompt.category
-
-        category_dir = self._get_category_dir(category)
-        file_path = category_dir / f"{prompt_id}.json"
-
-        if file_path.exists():
-            file_path.unlink()
-            # Удаляем информацию о локальном времени изменения
-            self.settings.remove_local_updated_at(prompt_id)
-        else:
-            raise FileNotFoundError(f"Файл промпта {prompt_id} не найден")
+        with self._lock:
+            file_path = self._path_index.get(prompt_id)
+            if file_path is None or not file_path.exists():
+                if category:
+                    file_path = self.storage_path / category / f"{prompt_id}.json"
+                else:
+                    file_path = self.find_prompt_path(prompt_id)
+                    if file_path is None:
+                        raise ValueError("Промпт не найден")
+
+            if file_path.exists():
+                file_path.unlink()
+                self._drop_index_path(prompt_id)
+                self._snapshot_drop(file_path)
+                # Удаляем информацию о локальном времени изменения
+                self.settings.remove_local_updated_at(prompt_id)
+            else:
+                raise FileNotFoundError(f"Файл промпта {prompt_id} не найден")
@@ -0,0 +1,214 @@
+# src/stream_decoder.py
+"""
+Инкрементальный разбор потоковых ответов LLM: SSE (OpenAI-совместимые API,
+LM Studio) и NDJSON (Ollama).
+
+Декодеры получают байты в том виде, в каком они пришли из сети (iter_content,
+aiter_bytes). Всё, что в буфере до последнего перевода строки, переводится в
+str одним вызовом decode и режется на строки одним split; неполная строка (в
+том числе оборванная посреди многобайтного символа UTF-8) ждёт следующей
+порции. Строки не декодируются по одной, и JSON разбирается один раз на
+событие из уже готовой строки.
+"""
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# Порция чтения для requests: ответ отдаётся по мере поступления, но не больше
+# этого размера за раз (как у iter_lines по умолчанию), чтобы не ждать заполнения
+# большого буфера на потоках без chunked-кодирования
+READ_CHUNK_SIZE = 512
+
+_DONE = "[DONE]"
+
+_raw_decode = json.JSONDecoder().raw_decode
+
+
+def _loads(text: str) -> Any:
+    """
+    json.loads для строки потока. Чанки приходят без пробелов по краям, поэтому
+    сначала raw_decode напрямую — без обёрток loads/decode и их двух регулярных
+    выражений на каждый токен; всё остальное (пробелы, мусор после объекта,
+    ошибки) разбирает обычный json.loads.
+    """
+    try:
+        obj, end = _raw_decode(text)
+        if end == len(text):
+            return obj
+    except ValueError:
+        pass
+    return json.loads(text)
+
+
+class SSEEvent(NamedTuple):
+    """Событие SSE: тип (event:), данные (строки data: через \\n) и последний id:"""
+    event: str
+    data: str
+    id: Optional[str]
+
+
+class _LineSplitter:
+    """Порции байтов -> завершённые строки (str) без символов перевода строки"""
+
+    def __init__(self):
+        self._buffer = b""
+
+    def split(self, chunk: bytes) -> List[str]:
+        # Байт \n не встречается внутри многобайтного символа UTF-8, поэтому всё до
+        # последнего \n декодируется целиком, а хвост ждёт следующей порции
+        complete, newline, self._buffer = (self._buffer + chunk if self._buffer else chunk).rpartition(b"\n")
+        if not newline:
+            return []
+        # Некорректные байты заменяются, а не роняют поток, как у iter_lines(decode_unicode=True)
+        text = complete.decode("utf-8", "replace")
+        if "\r" in text:
+            return [line.removesuffix("\r") for line in text.split("\n")]
+        return text.split("\n")
+
+    def flush(self) -> List[str]:
+        line = self._buffer.decode("utf-8", "replace").removesuffix("\r")
+        self._buffer = b""
+        return [line] if line else []
+
+
+class SSEDecoder:
+    """
+    Разбор text/event-stream по спецификации WHATWG: многострочные data:,
+    поля event:/id:, комментарии (строки с ':'), окончания строк \\n и \\r\\n.
+    Событие завершается пустой строкой.
+    """
+
+    def __init__(self):
+        self._lines = _LineSplitter()
+        self._data: List[str] = []
+        self._event: Optional[str] = None
+        self.last_event_id: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """Добавляет порцию байтов и возвращает события, завершённые в ней"""
+        return [SSEEvent._make(event) for event in self._process(self._lines.split(chunk))]
+
+    def flush(self) -> List[SSEEvent]:
+        """Конец потока: последнее событие без завершающей пустой строки тоже отдаётся"""
+        return [SSEEvent._make(event) for event in self._process(self._lines.flush() + [""])]
+
+    def _process(self, lines: List[str]) -> List[Tuple[str, str, Optional[str]]]:
+        # События — простые кортежи: iter_sse_json нужны только данные, а
+        # SSEEvent на каждый токен заметно дороже
+        events = []
+        data = self._data
+        for line in lines:
+            # Почти все строки потока — "data: {...}" или пустые, они проверяются первыми
+            if line[:6] == "data: ":
+                data.append(line[6:])
+            elif not line:
+                if data:
+                    events.append((self._event or "message", data[0] if len(data) == 1 else "\n".join(data),
+                                   self.last_event_id))
+                    data.clear()
+                self._event = None
+            elif line[0] != ":":
+                self._field(line)
+        return events
+
+    def _field(self, line: str):
+        name, _, value = line.partition(":")
+        if value[:1] == " ":
+            value = value[1:]
+        if name == "data":
+            # "data:без пробела" и "data" без двоеточия (пустая строка данных)
+            self._data.append(value)
+        elif name == "event":
+            self._event = value
+        elif name == "id":
+            self.last_event_id = value
+        # retry: и неизвестные поля игнорируются
+
+
+class NDJSONDecoder:
+    """Разбор потока JSON-объектов, разделённых переводом строки (Ollama)"""
+
+    def __init__(self):
+        self._lines = _LineSplitter()
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """Добавляет порцию байтов и возвращает непустые завершённые строки"""
+        return [line for line in self._lines.split(chunk) if line and not line.isspace()]
+
+    def flush(self) -> List[str]:
+        return [line for line in self._lines.flush() if not line.isspace()]
+
+
+def _load_sse_data(data: str) -> Optional[Dict[str, Any]]:
+    try:
+        return _loads(data)
+    except ValueError:
+        log.warning("Не удалось декодировать JSON-чанк: %s", data[:200])
+        return None
+
+
+def _is_done(data: str) -> bool:
+    return data == _DONE or data.strip() == _DONE
+
+
+def iter_sse_json(byte_chunks: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """
+    JSON-объекты из data: событий SSE до [DONE] или конца потока.
+    Некорректный JSON пропускается с предупреждением.
+    """
+    decoder = SSEDecoder()
+    lines = decoder._lines
+    for chunk in byte_chunks:
+        for _, data, _ in decoder._process(lines.split(chunk)):
+            if _is_done(data):
+                return
+            obj = _load_sse_data(data)
+            if obj is not None:
+                yield obj
+    for _, data, _ in decoder._process(lines.flush() + [""]):
+        if _is_done(data):
+            return
+        obj = _load_sse_data(data)
+        if obj is not None:
+            yield obj
+
+
+async def aiter_sse_json(byte_chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """Асинхронный вариант iter_sse_json"""
+    decoder = SSEDecoder()
+    lines = decoder._lines
+    async for chunk in byte_chunks:
+        for _, data, _ in decoder._process(lines.split(chunk)):
+            if _is_done(data):
+                return
+            obj = _load_sse_data(data)
+            if obj is not None:
+                yield obj
+    for _, data, _ in decoder._process(lines.flush() + [""]):
+        if _is_done(data):
+            return
+        obj = _load_sse_data(data)
+        if obj is not None:
+            yield obj
+
+
+def iter_ndjson(byte_chunks: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """JSON-объекты потока NDJSON; ошибка разбора (ValueError) передаётся вызывающему"""
+    decoder = NDJSONDecoder()
+    for chunk in byte_chunks:
+        for line in decoder.feed(chunk):
+            yield _loads(line)
+    for line in decoder.flush():
+        yield _loads(line)
+
+
+async def aiter_ndjson(byte_chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """Асинхронный вариант iter_ndjson"""
+    decoder = NDJSONDecoder()
+    async for chunk in byte_chunks:
+        for line in decoder.feed(chunk):
+            yield _loads(line)
+    for line in decoder.flush():
+        yield _loads(line)
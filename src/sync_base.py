@@ -0,0 +1,146 @@
+# src/sync_base.py
+import json
+import logging
+import os
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional, Set
+
+log = logging.getLogger(__name__)
+
+
+class SyncBaseEntry(NamedTuple):
+    """Последняя синхронизированная версия файла"""
+    sha: str                  # git-sha удалённого файла на момент синхронизации
+    local_sha: Optional[str]  # sha локального файла сразу после синхронизации (None — неизвестен)
+    # Размер и CRC32 удалённого файла (как в центральном каталоге zip); None — неизвестны
+    size: Optional[int] = None
+    crc32: Optional[int] = None
+
+
+class SyncBaseStore:
+    """
+    Базовые версии промптов для трёхстороннего слияния при синхронизации.
+
+    Индекс rel_path -> (sha удалённой версии, sha локального файла после синхронизации,
+    размер и CRC32 удалённой версии) хранится в BASE_INDEX_FILE_NAME, содержимое версий — в контентно-адресуемом
+    хранилище BLOBS_DIR_NAME (zlib, путь по sha), поэтому одинаковые файлы хранятся
+    один раз. Блобы, на которые больше не ссылается индекс, удаляются в save().
+    """
+
+    BASE_INDEX_FILE_NAME = "sync_base.json"
+    BLOBS_DIR_NAME = "sync_base"
+    FORMAT_VERSION = 1
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.index_file = self.cache_dir / self.BASE_INDEX_FILE_NAME
+        self.blobs_dir = self.cache_dir / self.BLOBS_DIR_NAME
+        self.entries: Dict[str, SyncBaseEntry] = {}
+        self.dirty = False
+        # sha, на которые перестали ссылаться записи: кандидаты на удаление блобов
+        self._released: Set[str] = set()
+
+    def load(self) -> "SyncBaseStore":
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != self.FORMAT_VERSION:
+                log.info("Индекс базовых версий устарел (версия формата), будет пересоздан")
+                self.entries = {}
+            else:
+                self.entries = {rel: SyncBaseEntry(*entry) for rel, entry in data["entries"].items()}
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            log.warning(f"Не удалось прочитать индекс базовых версий {self.index_file}: {str(e)}")
+            self.entries = {}
+        self.dirty = False
+        self._released = set()
+        return self
+
+    def get(self, rel_path: str) -> Optional[SyncBaseEntry]:
+        return self.entries.get(rel_path)
+
+    def set(self, rel_path: str, sha: str, local_sha: Optional[str],
+            size: Optional[int] = None, crc32: Optional[int] = None):
+        entry = SyncBaseEntry(sha, local_sha, size, crc32)
+        old = self.entries.get(rel_path)
+        if old != entry:
+            if old is not None and old.sha != sha:
+                self._released.add(old.sha)
+            self.entries[rel_path] = entry
+            self.dirty = True
+
+    def discard(self, rel_path: str):
+        entry = self.entries.pop(rel_path, None)
+        if entry is not None:
+            self._released.add(entry.sha)
+            self.dirty = True
+
+    def retain(self, rel_paths: Iterable[str]):
+        """Удаляет записи файлов, которых больше нет в удалённой библиотеке"""
+        keep = set(rel_paths)
+        for rel_path in [rel for rel in self.entries if rel not in keep]:
+            self.discard(rel_path)
+
+    def _blob_path(self, sha: str) -> Path:
+        return self.blobs_dir / sha[:2] / sha[2:]
+
+    def has_blob(self, sha: str) -> bool:
+        return self._blob_path(sha).exists()
+
+    def read_blob(self, sha: str) -> Optional[bytes]:
+        try:
+            return zlib.decompress(self._blob_path(sha).read_bytes())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.warning(f"Не удалось прочитать базовую версию {sha}: {str(e)}")
+            return None
+
+    def put_blob(self, sha: str, content: bytes):
+        """Сохраняет содержимое версии (атомарно); существующий блоб не перезаписывается"""
+        blob_path = self._blob_path(sha)
+        if blob_path.exists():
+            return
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=blob_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(zlib.compress(content))
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def save(self):
+        """Атомарно записывает индекс и удаляет блобы, на которые больше нет ссылок"""
+        if not self.dirty:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            data = {
+                "version": self.FORMAT_VERSION,
+                "entries": {rel: list(entry) for rel, entry in self.entries.items()},
+            }
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.index_file)
+            except BaseException:
+                Path(tmp_path).unlink(missing_ok=True)
+                raise
+            self.dirty = False
+        except Exception as e:
+            log.warning(f"Не удалось сохранить индекс базовых версий {self.index_file}: {str(e)}")
+            return
+
+        # Проверяются только освободившиеся sha, а не всё хранилище
+        if self._released:
+            referenced = {entry.sha for entry in self.entries.values()}
+            for sha in self._released - referenced:
+                self._blob_path(sha).unlink(missing_ok=True)
+            self._released = set()
@@ -0,0 +1,116 @@
+# src/sync_index.py
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional
+
+log = logging.getLogger(__name__)
+
+
+def git_blob_sha(content: bytes) -> str:
+    """SHA-1 в формате git blob, как у файлов в репозитории"""
+    header = f"blob {len(content)}\0".encode('utf-8')
+    return hashlib.sha1(header + content).hexdigest()
+
+
+class SyncIndexEntry(NamedTuple):
+    """Хэши файла (git-sha и CRC32, как в zip) и stat, при котором они были посчитаны"""
+    sha: str
+    size: int
+    mtime_ns: int
+    inode: int
+    crc32: int
+
+
+class LocalSyncIndex:
+    """
+    Сохраняемый между сеансами индекс локальных файлов для SyncManager.
+
+    Ключ — относительный путь (posix), значение — git-хэш и CRC32 содержимого и stat
+    файла (size, mtime_ns, inode). Пока stat не изменился, хэши берутся из индекса и
+    файл не читается. CRC32 позволяет сравнить файл с членом zip-архива по его
+    центральному каталогу, не распаковывая архив. Файлы, изменённые меньше
+    RACY_WINDOW_NS назад, в индекс не попадают: изменение в пределах той же
+    отметки mtime было бы незаметно.
+    """
+
+    FORMAT_VERSION = 2
+    RACY_WINDOW_NS = 2_000_000_000
+
+    def __init__(self, index_file: Path):
+        self.index_file = Path(index_file)
+        self.entries: Dict[str, SyncIndexEntry] = {}
+        self.dirty = False
+        self._scan_started_ns = time.time_ns()
+
+    def load(self) -> "LocalSyncIndex":
+        """Читает индекс; при отсутствии, повреждении или смене формата начинает с пустого"""
+        self._scan_started_ns = time.time_ns()
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != self.FORMAT_VERSION:
+                log.info("Индекс синхронизации устарел (версия формата), будет пересоздан")
+                self.entries = {}
+            else:
+                self.entries = {rel: SyncIndexEntry(*entry) for rel, entry in data["entries"].items()}
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            log.warning(f"Не удалось прочитать индекс синхронизации {self.index_file}: {str(e)}")
+            self.entries = {}
+        self.dirty = False
+        return self
+
+    def lookup(self, rel_path: str, stat: os.stat_result) -> Optional[SyncIndexEntry]:
+        """Запись индекса, если stat файла не изменился"""
+        entry = self.entries.get(rel_path)
+        if entry is None:
+            return None
+        if (entry.size, entry.mtime_ns, entry.inode) != (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+            return None
+        return entry
+
+    def update(self, rel_path: str, stat: os.stat_result, sha: str, crc32: int):
+        if self._scan_started_ns - stat.st_mtime_ns < self.RACY_WINDOW_NS:
+            # Файл изменён только что: не доверяем его stat в следующем сеансе
+            if self.entries.pop(rel_path, None) is not None:
+                self.dirty = True
+            return
+        entry = SyncIndexEntry(sha, stat.st_size, stat.st_mtime_ns, stat.st_ino, crc32)
+        if self.entries.get(rel_path) != entry:
+            self.entries[rel_path] = entry
+            self.dirty = True
+
+    def retain(self, rel_paths: Iterable[str]):
+        """Удаляет записи файлов, которых больше нет"""
+        keep = set(rel_paths)
+        for rel_path in [rel for rel in self.entries if rel not in keep]:
+            del self.entries[rel_path]
+            self.dirty = True
+
+    def save(self):
+        """Атомарно записывает индекс (временный файл + os.replace), если он менялся"""
+        if not self.dirty:
+            return
+        try:
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            data = {
+                "version": self.FORMAT_VERSION,
+                "entries": {rel: list(entry) for rel, entry in self.entries.items()},
+            }
+            fd, tmp_path = tempfile.mkstemp(dir=self.index_file.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.index_file)
+            except BaseException:
+                Path(tmp_path).unlink(missing_ok=True)
+                raise
+            self.dirty = False
+        except Exception as e:
+            log.warning(f"Не удалось сохранить индекс синхронизации {self.index_file}: {str(e)}")
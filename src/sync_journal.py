@@ -0,0 +1,152 @@
+# src/sync_journal.py
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from sync_index import git_blob_sha
+
+log = logging.getLogger(__name__)
+
+
+def _fsync_dir(path: Path):
+    """fsync каталога (Windows не позволяет открыть каталог, там это не нужно)"""
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SyncJournal:
+    """
+    Журнал упреждающей записи для пакетного применения изменений к папке промптов.
+
+    Новое содержимое файлов сначала пишется в служебную папку STAGING_DIR_NAME
+    внутри библиотеки (та же файловая система, поэтому os.replace атомарен), затем
+    атомарно записывается журнал со списком операций — это точка фиксации. Только
+    после этого файлы переносятся на место через os.replace, а удаления выполняются
+    по списку.
+
+    Если процесс упал до записи журнала, при восстановлении папка подготовки просто
+    удаляется: библиотека не тронута. Если журнал записан, recover() доводит все
+    операции до конца; повторное применение операции безопасно. Содержимое
+    подготовленного файла сверяется с git-sha из журнала, поэтому недописанный файл
+    не попадёт в библиотеку.
+    """
+
+    STAGING_DIR_NAME = ".sync-staging"
+    JOURNAL_FILE_NAME = "journal.json"
+    FORMAT_VERSION = 1
+
+    def __init__(self, storage_path: Path):
+        self.storage_path = Path(storage_path)
+        self.staging_dir = self.storage_path / self.STAGING_DIR_NAME
+        self.journal_file = self.staging_dir / self.JOURNAL_FILE_NAME
+        self.ops: List[Dict[str, Any]] = []
+
+    @property
+    def pending(self) -> bool:
+        """Есть зафиксированный, но не доведённый до конца журнал"""
+        return self.journal_file.exists()
+
+    def begin(self):
+        """Начинает новую транзакцию; незафиксированные остатки прошлой удаляются"""
+        if self.pending:
+            raise RuntimeError("Есть незавершённый журнал синхронизации, сначала нужно вызвать recover()")
+        self.discard()
+        self.staging_dir.mkdir(parents=True)
+        _fsync_dir(self.storage_path)
+        self.ops = []
+
+    def stage_write(self, rel_path: str, content: bytes, **meta):
+        """Готовит запись файла rel_path; meta сохраняется в журнале для восстановления"""
+        stage_name = f"{len(self.ops):06d}.stage"
+        with open(self.staging_dir / stage_name, "wb") as f:
+            f.write(content)
+            # Файл должен лечь на диск раньше журнала, который на него ссылается
+            f.flush()
+            os.fsync(f.fileno())
+        self.ops.append({"op": "write", "target": rel_path, "stage": stage_name,
+                         "sha": git_blob_sha(content), **meta})
+
+    def stage_delete(self, rel_path: str, **meta):
+        self.ops.append({"op": "delete", "target": rel_path, **meta})
+
+    def prepare(self):
+        """
+        Точка фиксации: атомарно и с fsync записывает журнал операций. Подготовленные
+        файлы к этому моменту уже на диске (stage_write), а fsync папки подготовки
+        сохраняет и их записи в каталоге, и переименование журнала.
+        """
+        tmp_path = self.staging_dir / (self.JOURNAL_FILE_NAME + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.FORMAT_VERSION, "ops": self.ops}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_file)
+        _fsync_dir(self.staging_dir)
+
+    def commit(self, on_applied: Callable[[Dict[str, Any]], None],
+               progress_cb: Optional[Callable[[int], None]] = None) -> int:
+        """Выполняет операции зафиксированного журнала и удаляет его"""
+        done = self._apply(self.ops, on_applied, progress_cb, verify=False)
+        self.discard()
+        return done
+
+    def recover(self, on_applied: Callable[[Dict[str, Any]], None]) -> int:
+        """
+        Доводит до конца журнал, оставшийся после сбоя, или удаляет незафиксированную
+        подготовку. Возвращает число восстановленных операций.
+        """
+        if not self.pending:
+            if self.staging_dir.exists():
+                log.warning("Найдена незавершённая подготовка синхронизации без журнала, удаляем")
+                self.discard()
+            return 0
+        try:
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != self.FORMAT_VERSION:
+                raise ValueError(f"неизвестная версия журнала {data.get('version')}")
+            ops = data["ops"]
+        except Exception as e:
+            log.error(f"Журнал синхронизации {self.journal_file} повреждён, изменения отменены: {str(e)}")
+            self.discard()
+            return 0
+        log.info(f"Восстанавливаем прерванную синхронизацию: операций в журнале {len(ops)}")
+        done = self._apply(ops, on_applied, None, verify=True)
+        self.discard()
+        return done
+
+    def discard(self):
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def _apply(self, ops: List[Dict[str, Any]], on_applied: Callable[[Dict[str, Any]], None],
+               progress_cb: Optional[Callable[[int], None]], verify: bool) -> int:
+        done = 0
+        for op in ops:
+            target = self.storage_path / op["target"]
+            if op["op"] == "write":
+                staged = self.staging_dir / op["stage"]
+                if staged.exists():
+                    if verify and git_blob_sha(staged.read_bytes()) != op["sha"]:
+                        log.error(f"Подготовленный файл {op['target']} повреждён, операция пропущена")
+                        continue
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(staged, target)
+                elif not target.exists():
+                    # Файл уже перенесён и затем удалён извне: повторять нечего
+                    log.warning(f"Подготовленный файл {op['target']} не найден, операция пропущена")
+                    continue
+            else:
+                target.unlink(missing_ok=True)
+            on_applied(op)
+            done += 1
+            if progress_cb is not None:
+                progress_cb(done)
+        return done
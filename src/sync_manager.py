@@ -2,43 +2,111 @@
 import hashlib
 import json
 import logging
+import os
 import requests
 import tempfile
+import threading
+import time
 import zipfile
-from pathlib import Path
-from datetime import datetime
-from typing import Dict, Any, Tuple, Callable
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Dict, Any, List, Tuple, Callable, Optional
+from urllib.parse import quote, urljoin
 
 from llm_settings import Settings
-from models import Prompt
-from storage import LocalStorage
+from prompt_loader import PromptLoader
+from prompt_merge import merge_prompt_files
+from storage import LocalStorage, library_cache_dir
+from sync_base import SyncBaseStore
+from sync_index import LocalSyncIndex, git_blob_sha
 
 # Прямая, постоянная ссылка на скачивание архива.
 # Этот URL не использует API и не тратит лимиты.
 PROMPTS_DOWNLOAD_URL = (
     "https://github.com/arnyigor/aiprompts/releases/download/latest-prompts/prompts.zip"
 )
+# Манифест того же релиза: sha и размер каждого файла для дельта-синхронизации
+PROMPTS_MANIFEST_URL = (
+    "https://github.com/arnyigor/aiprompts/releases/download/latest-prompts/manifest.json"
+)
+
+
+@dataclass
+class SyncDiff:
+    """Изменения библиотеки после синхронизации: id добавленных, обновлённых и удалённых промптов"""
+    added: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.updated or self.removed)
 
 
 class SyncManager:
     """
     Управляет синхронизацией, используя прямую ссылку на архив релиза,
     чтобы избежать проблем с лимитами GitHub API.
+
+    Если в релизе есть manifest.json, сначала выполняется дельта-синхронизация:
+    скачиваются только новые и изменённые файлы. Архив используется как запасной путь.
+
+    Для каждого файла запоминается последняя синхронизированная версия (SyncBaseStore).
+    Если файл изменён и локально, и на сервере, версии сливаются по полям; поля,
+    изменённые по-разному с обеих сторон, остаются локальными и попадают в
+    last_conflicts.
+
+    После sync() в last_diff лежат id изменённых промптов (для точечного обновления
+    PromptManager и интерфейса), а last_not_modified показывает, что сервер ответил
+    304 и ничего не применялось. Синхронизации одной программы выполняются по
+    очереди (_sync_lock), даже если ручная и фоновая запущены одновременно, а
+    применение изменений — под блокировкой хранилища, общей с GUI и наблюдателем
+    за папкой (_apply_locked).
     """
 
+    SYNC_INDEX_FILE_NAME = "sync_index.json"
+    DOWNLOAD_STATE_FILE_NAME = "download_state.json"
+    ARCHIVE_FILE_NAME = "prompts.zip"
+    DOWNLOAD_CHUNK_SIZE = 256 * 1024
+    MANIFEST_VERSION = 1
+    # При большем числе изменённых файлов дешевле скачать архив целиком
+    DELTA_MAX_FILES = 200
+    # Общая для всех экземпляров: ручная и фоновая синхронизации не пересекаются
+    _sync_lock = threading.Lock()
+
     def __init__(
             self,
             storage: LocalStorage,
             settings: Settings,
             progress_cb: Callable[[str], None] = None,
             log_cb: Callable[[str], None] = None,
+            chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+            use_manifest: bool = True,
+            loader: Optional[PromptLoader] = None,
     ):
         self.logger = logging.getLogger(__name__)
         self.storage = storage
         self.settings = settings
         self.prompts_dir = storage.storage_path
+        # Служебные файлы синхронизации лежат рядом с кэшами хранилища, не в prompts/
+        self.cache_dir = getattr(storage, "cache_dir", None) or library_cache_dir(
+            settings.settings_dir, self.prompts_dir)
+        self.local_sync_index = LocalSyncIndex(self.cache_dir / self.SYNC_INDEX_FILE_NAME)
+        self.base_store = SyncBaseStore(self.cache_dir)
+        # rel_path -> поля с конфликтами слияния в последней синхронизации
+        self.last_conflicts: Dict[str, list] = {}
+        self.last_diff = SyncDiff()
+        self.last_not_modified = False
+        self._written_paths: set = set()
+        # Файлы, изменённые локально во время синхронизации: применяются в следующий раз
+        self._skipped_paths: set = set()
         self._progress_cb = progress_cb or (lambda _msg: None)
         self._log_cb = log_cb or (lambda _msg: None)
+        self.chunk_size = chunk_size
+        self.use_manifest = use_manifest
+        # Пул разбора файлов при применении изменений (по умолчанию — пул хранилища)
+        self.loader = loader or getattr(storage, "loader", None) or PromptLoader()
 
     def _emit(self, msg: str):
         self._progress_cb(msg)
@@ -49,50 +117,68 @@ class SyncManager:
 
     def sync(self) -> Tuple[int, int, int]:
         """Выполняет полный цикл синхронизации."""
+        with self._sync_lock:
+            return self._sync()
+
+    def _sync(self) -> Tuple[int, int, int]:
         self._log("--- Начинаем сеанс синхронизации библиотеки промптов ---")
+        archive_path = self.cache_dir / self.ARCHIVE_FILE_NAME
         try:
-            with tempfile.TemporaryDirectory() as temp_dir_str:
-                temp_path = Path(temp_dir_str)
-                archive_path = temp_path / "prompts.zip"
-                unpacked_path = temp_path / "unpacked"
-
-                # --- УПРОЩЕННЫЙ ШАГ СКАЧИВАНИЯ ---
-                self._emit("Скачиваем архив с промптами...")
-                self._log(f"✓ URL для скачивания: {PROMPTS_DOWNLOAD_URL}")
-                self._download_file(PROMPTS_DOWNLOAD_URL, archive_path)
-                self._log("✓ Архив успешно скачан.")
-
-                self._emit("Распаковываем архив...")
-                with zipfile.ZipFile(archive_path, 'r') as zip_ref:
-                    zip_ref.extractall(unpacked_path)
-
-                remote_root = unpacked_path / "prompts"
-                if not remote_root.exists():
-                    msg = "Архив не содержит ожидаемую папку 'prompts'."
-                    self._log(f"❌ Ошибка: {msg}")
-                    raise FileNotFoundError(msg)
-
-                self._log(f"✓ Архив распакован во временную директорию.")
-
-                self._emit("Анализируем изменения...")
-                self._log("\nИндексируем удаленные файлы (из архива)...")
-                remote_index = self._build_index_from_path(remote_root, use_settings=False)
-                self._log(f"→ Найдено удаленных файлов: {len(remote_index)}")
-
-                self._log("\nИндексируем локальные файлы...")
-                local_index = self._build_index_from_path(self.prompts_dir, use_settings=True)
-                self._log(f"→ Найдено локальных файлов: {len(local_index)}")
-
-                self._emit("Применяем изменения...")
-                new, upd, delt = self._apply_changes(local_index, remote_index)
-
-                self._log("\n--- Сводка по синхронизации ---")
-                self._log(f"✓ Новых файлов: {new}")
-                self._log(f"✓ Обновлено файлов: {upd}")
-                self._log(f"✓ Удалено файлов: {delt}")
+            self._emit("Анализируем изменения...")
+            self._log("\nИндексируем локальные файлы...")
+            local_index = self._scan_local()
+            self._log(f"→ Найдено локальных файлов: {len(local_index)}")
+            self.base_store.load()
+            self.last_conflicts = {}
+            self._skipped_paths = set()
+            self.last_diff = SyncDiff()
+            self.last_not_modified = False
+
+            # Условный запрос допустим, только если локальная папка не менялась
+            # с последней успешной синхронизации: иначе её нужно сверить с архивом
+            state = self._load_download_state()
+            conditional = state.get("local_fingerprint") == self._fingerprint(local_index)
+
+            # Сначала пробуем дельту по манифесту: скачиваются только изменённые файлы
+            if self.use_manifest:
+                counts = self._sync_delta(local_index, state, conditional)
+                if counts is not None:
+                    self._log_summary(*counts)
+                    return counts
+
+            self._emit("Скачиваем архив с промптами...")
+            self._log(f"✓ URL для скачивания: {PROMPTS_DOWNLOAD_URL}")
+            validators = self._download_file(PROMPTS_DOWNLOAD_URL, archive_path, state, conditional)
+            if validators is None:
+                self._log("✓ Архив на сервере не изменился (304), локальная библиотека актуальна.")
+                self.last_not_modified = True
                 self._log("--- Сеанс синхронизации успешно завершен ---")
+                return 0, 0, 0
+            self._log("✓ Архив успешно скачан.")
+
+            # Архив не распаковывается: сравниваем по центральному каталогу zip
+            # и читаем только отличающиеся файлы
+            self._log("\nИндексируем удаленные файлы (из архива)...")
+            with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+                remote_index = self._build_index_from_zip(zip_ref, local_index)
+            self._log(f"→ Найдено удаленных файлов: {len(remote_index)}")
+
+            self._emit("Применяем изменения...")
+            new, upd, delt = self._apply_locked(local_index, remote_index)
+
+            # Валидаторы архива запоминаются только после успешного применения,
+            # вместе со слепком получившейся локальной папки
+            state.update(validators)
+            state.pop("manifest", None)
+            local_after = self._scan_local()
+            self._record_base(remote_index, local_after)
+            # Отложенные файлы: следующий запрос не должен быть условным
+            state["local_fingerprint"] = None if self._skipped_paths else self._fingerprint(local_after)
+            self._save_download_state(state)
+            archive_path.unlink(missing_ok=True)
 
-                return new, upd, delt
+            self._log_summary(new, upd, delt)
+            return new, upd, delt
 
         except requests.HTTPError as e:
             if e.response.status_code == 404:
@@ -102,94 +188,521 @@ class SyncManager:
                 self.logger.error("Ошибка сети при скачивании: %s", e, exc_info=True)
                 self._log(f"\n❌ ОШИБКА СЕТИ: Не удалось скачать архив. Проверьте подключение.")
             raise e
+        except requests.RequestException as e:
+            # Нет соединения или таймаут: ожидаемая ситуация для фоновой синхронизации
+            self.logger.error(f"Ошибка сети при синхронизации: {e}")
+            self._log(f"\n❌ ОШИБКА СЕТИ: Не удалось скачать архив. Проверьте подключение.")
+            raise e
         except Exception as e:
             self.logger.exception("Непредвиденная ошибка во время синхронизации:")
             self._log(f"\n❌ КРИТИЧЕСКАЯ ОШИБКА: {e}")
             raise e
 
-    def _download_file(self, url: str, target_path: Path):
-        with requests.get(url, stream=True, timeout=60) as r:
+    def _log_summary(self, new: int, upd: int, delt: int):
+        self._log("\n--- Сводка по синхронизации ---")
+        self._log(f"✓ Новых файлов: {new}")
+        self._log(f"✓ Обновлено файлов: {upd}")
+        self._log(f"✓ Удалено файлов: {delt}")
+        if self.last_conflicts:
+            self._log(f"⚠ Конфликтов слияния: {len(self.last_conflicts)} (оставлены локальные значения)")
+            for rel_path, fields in sorted(self.last_conflicts.items()):
+                self._log(f"  ⚠ {rel_path}: {', '.join(fields)}")
+        self._log("--- Сеанс синхронизации успешно завершен ---")
+
+    def _sync_delta(self, local_index: Dict[str, Dict[str, Any]], state: Dict[str, Any],
+                    conditional: bool) -> Optional[Tuple[int, int, int]]:
+        """
+        Дельта-синхронизация по manifest.json: сравнивает sha из манифеста с локальным
+        индексом и скачивает по отдельности только новые и изменённые файлы.
+
+        Возвращает счётчики (новые, обновлённые, удалённые) или None, если нужно
+        перейти к скачиванию архива: манифеста нет в релизе, он в неизвестном формате,
+        изменённых файлов больше DELTA_MAX_FILES или какой-то файл не удалось скачать.
+        Все файлы скачиваются до применения изменений, поэтому при откате на архив
+        локальная папка не затронута.
+        """
+        self._emit("Проверяем манифест библиотеки...")
+        manifest_state = state.get("manifest") or {}
+        headers = {}
+        if conditional:
+            if manifest_state.get("etag"):
+                headers["If-None-Match"] = manifest_state["etag"]
+            if manifest_state.get("last_modified"):
+                headers["If-Modified-Since"] = manifest_state["last_modified"]
+
+        try:
+            with requests.Session() as session:
+                r = session.get(PROMPTS_MANIFEST_URL, timeout=30, headers=headers)
+                if r.status_code == 304:
+                    self._log("✓ Манифест на сервере не изменился (304), локальная библиотека актуальна.")
+                    self.last_not_modified = True
+                    return 0, 0, 0
+                r.raise_for_status()
+                manifest = r.json()
+                if manifest.get("version") != self.MANIFEST_VERSION:
+                    self._log(f"→ Неизвестная версия манифеста ({manifest.get('version')}), скачиваем архив")
+                    return None
+                validators = self._response_validators(r)
+                base_url = urljoin(PROMPTS_MANIFEST_URL, manifest["base_url"].rstrip("/") + "/")
+                transferred = len(r.content)
+
+                # Удалённое время — момент синхронизации, как у файлов из архива
+                mtime = time.time()
+                remote_index = {}
+                needed = []
+                for rel_path, meta in manifest["files"].items():
+                    remote_index[rel_path] = {"sha": meta["sha"], "mtime": mtime, "size": meta["size"]}
+                    l_meta = local_index.get(rel_path)
+                    base = self.base_store.get(rel_path)
+                    # Файл, не менявшийся на сервере с прошлой синхронизации, не скачивается
+                    if l_meta is None or (l_meta["sha"] != meta["sha"] and (base is None or base.sha != meta["sha"])):
+                        needed.append(rel_path)
+                self._log(f"→ Файлов в манифесте: {len(remote_index)}, нужно скачать: {len(needed)}")
+                if len(needed) > self.DELTA_MAX_FILES:
+                    self._log("→ Изменённых файлов слишком много, скачиваем архив целиком")
+                    return None
+
+                self._emit(f"Скачиваем изменённые файлы ({len(needed)})...")
+                for rel_path in needed:
+                    r_meta = remote_index[rel_path]
+                    file_response = session.get(base_url + quote(rel_path), timeout=30)
+                    file_response.raise_for_status()
+                    content = file_response.content
+                    if git_blob_sha(content) != r_meta["sha"]:
+                        self._log(f"  ! Файл {rel_path} не совпадает с манифестом, скачиваем архив")
+                        return None
+                    r_meta["content"] = content
+                    transferred += len(content)
+        except (requests.RequestException, ValueError, KeyError, TypeError, AttributeError) as e:
+            self._log(f"→ Дельта-синхронизация недоступна ({e}), скачиваем архив")
+            return None
+        self._log(f"✓ Скачано по манифесту: {transferred} байт")
+
+        self._emit("Применяем изменения...")
+        counts = self._apply_locked(local_index, remote_index)
+
+        # Валидаторы архива больше не соответствуют локальной папке
+        state["manifest"] = validators
+        state.pop("etag", None)
+        state.pop("last_modified", None)
+        local_after = self._scan_local()
+        self._record_base(remote_index, local_after)
+        state["local_fingerprint"] = None if self._skipped_paths else self._fingerprint(local_after)
+        self._save_download_state(state)
+        return counts
+
+    def _scan_local(self) -> Dict[str, Dict[str, Any]]:
+        flags = None
+        export_to_tree = getattr(self.storage, "export_to_tree", None)
+        if export_to_tree is not None:
+            # SqliteStorage: с релизом сравнивается дерево JSON, поэтому перед каждым
+            # сканированием в него выгружается база (правки из базы доходят до слияния,
+            # применённые изменения — до следующей синхронизации), а флаги берутся из базы
+            export_to_tree(prune=True)
+            flags = self.storage.local_flags()
+        self.local_sync_index.load()
+        local_index = self._build_index_from_path(self.prompts_dir, use_settings=True,
+                                                  sync_index=self.local_sync_index, flags=flags)
+        self.local_sync_index.save()
+        return local_index
+
+    @staticmethod
+    def _fingerprint(local_index: Dict[str, Dict[str, Any]]) -> str:
+        """Слепок локальной папки: хэш от отсортированных пар (путь, sha)"""
+        digest = hashlib.sha1()
+        for rel_path in sorted(local_index):
+            digest.update(f"{rel_path}\0{local_index[rel_path]['sha']}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _load_download_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.cache_dir / self.DOWNLOAD_STATE_FILE_NAME, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.logger.warning(f"Не удалось прочитать состояние загрузки: {str(e)}")
+            return {}
+
+    def _save_download_state(self, state: Dict[str, Any]):
+        """Атомарно записывает валидаторы архива и состояние докачки"""
+        state_file = self.cache_dir / self.DOWNLOAD_STATE_FILE_NAME
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(state, f, ensure_ascii=False)
+                os.replace(tmp_path, state_file)
+            except BaseException:
+                Path(tmp_path).unlink(missing_ok=True)
+                raise
+        except Exception as e:
+            self.logger.warning(f"Не удалось сохранить состояние загрузки {state_file}: {str(e)}")
+
+    @staticmethod
+    def _response_validators(response: requests.Response) -> Dict[str, Optional[str]]:
+        return {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+    def _download_file(self, url: str, target_path: Path, state: Dict[str, Any],
+                       conditional: bool = False) -> Optional[Dict[str, Optional[str]]]:
+        """
+        Скачивает архив в target_path. Возвращает ETag/Last-Modified ответа или None,
+        если сервер ответил 304 (архив не изменился с последней синхронизации).
+
+        Загрузка идёт в файл .part; прерванная загрузка продолжается запросом Range
+        с If-Range, если сервер отдал строгий валидатор. Прогресс докачки
+        (валидатор частичного файла) хранится в state["partial"].
+        """
+        part_path = target_path.with_name(target_path.name + ".part")
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        headers = {}
+        if conditional:
+            if state.get("etag"):
+                headers["If-None-Match"] = state["etag"]
+            if state.get("last_modified"):
+                headers["If-Modified-Since"] = state["last_modified"]
+
+        partial = state.get("partial") or {}
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        # If-Range требует строгий валидатор: слабый ETag для докачки не годится
+        if_range = partial.get("etag") if partial.get("etag") and not partial["etag"].startswith("W/") \
+            else partial.get("last_modified")
+        if offset and if_range:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = if_range
+            self._log(f"→ Продолжаем прерванную загрузку с {offset} байт")
+        else:
+            offset = 0
+
+        with requests.get(url, stream=True, timeout=60, headers=headers) as r:
+            if r.status_code == 304:
+                part_path.unlink(missing_ok=True)
+                state.pop("partial", None)
+                return None
+            if r.status_code == 416:
+                # Частичный файл не соответствует ресурсу: начинаем заново
+                self._log("→ Сервер отклонил докачку, скачиваем архив целиком")
+                part_path.unlink(missing_ok=True)
+                state.pop("partial", None)
+                return self._download_file(url, target_path, state, conditional)
             r.raise_for_status() # Вызовет HTTPError для 4xx/5xx кодов (например, 404 Not Found)
-            with open(target_path, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192):
+
+            resumed = r.status_code == 206 and r.headers.get("Content-Range", "").startswith(f"bytes {offset}-")
+            if not resumed:
+                offset = 0
+            validators = self._response_validators(r)
+            state["partial"] = validators
+            self._save_download_state(state)
+
+            with open(part_path, 'ab' if resumed else 'wb') as f:
+                for chunk in r.iter_content(chunk_size=self.chunk_size):
                     f.write(chunk)
 
-    def _build_index_from_path(self, base_path: Path, use_settings: bool = False) -> Dict[str, Dict[str, Any]]:
-        # ... (этот метод остается без изменений) ...
+        expected = r.headers.get("Content-Length")
+        if expected is not None and part_path.stat().st_size != offset + int(expected):
+            raise IOError("Архив скачан не полностью, загрузка будет продолжена при следующей синхронизации")
+        os.replace(part_path, target_path)
+        state.pop("partial", None)
+        self._save_download_state(state)
+        return validators
+
+    def _build_index_from_path(self, base_path: Path, use_settings: bool = False,
+                               sync_index: Optional[LocalSyncIndex] = None,
+                               flags: Optional[Dict[str, Tuple[bool, bool]]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Индекс rel_path -> sha/путь/mtime/флаги. С sync_index файлы с неизменённым
+        stat не читаются: хэш берётся из сохранённого индекса. flags (id ->
+        (is_local, is_favorite)) заменяют флаги из settings.json.
+        """
         index = {}
         if not base_path.exists():
             return {}
+        reused = 0
         for file_path in base_path.rglob("*.json"):
             rel_path = str(file_path.relative_to(base_path)).replace("\\", "/")
+            # Служебные папки (.sync-staging с журналом синхронизации) не индексируются
+            if any(part.startswith(".") for part in rel_path.split("/")):
+                continue
             prompt_id = file_path.stem
             try:
-                mtime = file_path.stat().st_mtime
-                with file_path.open("rb") as f:
-                    content = f.read()
-                    header = f"blob {len(content)}\0".encode('utf-8')
-                    sha = hashlib.sha1(header + content).hexdigest()
-                if use_settings:
+                stat = file_path.stat()
+                content = None
+                entry = sync_index.lookup(rel_path, stat) if sync_index is not None else None
+                if entry is not None:
+                    sha, crc32 = entry.sha, entry.crc32
+                    reused += 1
+                else:
+                    with file_path.open("rb") as f:
+                        content = f.read()
+                    sha = git_blob_sha(content)
+                    crc32 = zlib.crc32(content)
+                    if sync_index is not None:
+                        sync_index.update(rel_path, stat, sha, crc32)
+                if flags is not None:
+                    is_local_flag, is_favorite_flag = flags.get(prompt_id, (False, False))
+                elif use_settings:
                     is_local_flag = self.settings.is_local(prompt_id)
                     is_favorite_flag = self.settings.is_favorite(prompt_id)
                 else:
+                    if content is None:
+                        content = file_path.read_bytes()
                     data = json.loads(content.decode('utf-8'))
                     is_local_flag = data.get("is_local", False)
                     is_favorite_flag = data.get("is_favorite", False)
-                index[rel_path] = { "sha": sha, "path": file_path, "mtime": mtime, "is_local": is_local_flag, "is_favorite": is_favorite_flag, }
+                index[rel_path] = { "sha": sha, "path": file_path, "mtime": stat.st_mtime, "size": stat.st_size, "crc32": crc32, "is_local": is_local_flag, "is_favorite": is_favorite_flag, }
             except (json.JSONDecodeError, IOError, UnicodeDecodeError) as e:
                 self._log(f"  ! Не удалось прочитать файл {file_path}: {e}")
+        if sync_index is not None:
+            sync_index.retain(index.keys())
+            self._log(f"→ Хэшей взято из индекса без чтения файла: {reused}")
         return index
 
+    def _build_index_from_zip(self, zip_ref: zipfile.ZipFile, local_index: Dict[str, Dict[str, Any]],
+                              root: str = "prompts") -> Dict[str, Dict[str, Any]]:
+        """
+        Индекс удалённых файлов по центральному каталогу архива (имя, размер, CRC32).
+        Файл не распаковывается, если его размер и CRC32 совпадают с удалённой версией
+        прошлой синхронизации (SyncBaseStore), а локальный файл с тех пор не менялся:
+        тогда берётся sha базовой версии. Иначе — если они совпадают с самим
+        локальным файлом (берётся его sha); в остальных случаях файл распаковывается
+        потоково, в память. Содержимое
+        распакованных файлов кладётся в поле "content" для _apply_changes.
+        """
+        index = {}
+        # Распакованный архив создавал файлы с текущим временем: сохраняем эту семантику
+        mtime = time.time()
+        found_root = False
+        decompressed = 0
+        for info in zip_ref.infolist():
+            parts = [part for part in PurePosixPath(info.filename).parts if part != "."]
+            if not parts or parts[0] != root:
+                continue
+            found_root = True
+            if info.is_dir() or not parts[-1].endswith(".json"):
+                continue
+            rel_path = "/".join(parts[1:])
+            l_meta = local_index.get(rel_path)
+            base = self.base_store.get(rel_path)
+            r_meta = {"sha": None, "mtime": mtime, "size": info.file_size, "crc32": info.CRC}
+            if (l_meta is not None and base is not None and base.crc32 is not None
+                    and (base.size, base.crc32) == (info.file_size, info.CRC)
+                    and base.local_sha == l_meta["sha"]):
+                # Файл не менялся ни на сервере, ни локально с прошлой синхронизации
+                r_meta["sha"] = base.sha
+            elif l_meta is not None and (l_meta.get("size"), l_meta.get("crc32")) == (info.file_size, info.CRC):
+                # Локальный файл побайтно совпадает с удалённым (не записан синхронизацией)
+                r_meta["sha"] = l_meta["sha"]
+            else:
+                try:
+                    with zip_ref.open(info) as f:
+                        content = f.read()
+                except (zipfile.BadZipFile, IOError) as e:
+                    self._log(f"  ! Не удалось прочитать файл {info.filename} из архива: {e}")
+                    continue
+                r_meta["sha"] = git_blob_sha(content)
+                r_meta["content"] = content
+                decompressed += 1
+            index[rel_path] = r_meta
+
+        if not found_root:
+            msg = f"Архив не содержит ожидаемую папку '{root}'."
+            self._log(f"❌ Ошибка: {msg}")
+            raise FileNotFoundError(msg)
+        self._log(f"→ Распаковано отличающихся файлов: {decompressed}")
+        return index
+
+    def _record_base(self, remote_index: Dict[str, Dict[str, Any]], local_after: Dict[str, Dict[str, Any]]):
+        """
+        Запоминает удалённые версии как базовые для следующей синхронизации.
+
+        sha локального файла запоминается, только если он записан ровно в удалённой
+        версии (или совпадает с ней): тогда в следующий раз его можно заменить без
+        слияния. Для файлов с локальными правками он неизвестен (None).
+
+        Размер и CRC32 удалённой версии запоминаются для сравнения со следующим
+        архивом по центральному каталогу (_build_index_from_zip): записанный
+        синхронизацией файл не совпадает с удалённым побайтно (Prompt дополняет
+        поля при записи), поэтому сравнивать архив с самим локальным файлом нельзя.
+        """
+        for rel_path, r_meta in remote_index.items():
+            # Удалённая версия не применялась: база остаётся прежней
+            if rel_path in self._skipped_paths:
+                continue
+            remote_sha = r_meta["sha"]
+            size, crc32 = r_meta.get("size"), r_meta.get("crc32")
+            if "content" in r_meta:
+                size, crc32 = len(r_meta["content"]), zlib.crc32(r_meta["content"])
+            l_meta = local_after.get(rel_path)
+            base = self.base_store.get(rel_path)
+            if l_meta is not None and (rel_path in self._written_paths or l_meta["sha"] == remote_sha):
+                local_sha = l_meta["sha"]
+            elif base is not None and base.sha == remote_sha:
+                if base.crc32 is None and crc32 is not None:
+                    # База записана без CRC (дельта-синхронизация, прежний формат)
+                    self.base_store.set(rel_path, base.sha, base.local_sha, size, crc32)
+                continue
+            else:
+                local_sha = None
+
+            if not self.base_store.has_blob(remote_sha):
+                if "content" in r_meta:
+                    content = r_meta["content"]
+                elif l_meta is not None and l_meta["sha"] == remote_sha:
+                    content = l_meta["path"].read_bytes()
+                else:
+                    # Содержимое удалённой версии недоступно: базы у файла не будет
+                    self.base_store.discard(rel_path)
+                    continue
+                self.base_store.put_blob(remote_sha, content)
+            self.base_store.set(rel_path, remote_sha, local_sha, size, crc32)
+        self.base_store.retain(remote_index.keys())
+        self.base_store.save()
+
+    @staticmethod
+    def _read_remote_bytes(r_meta: Dict[str, Any]) -> bytes:
+        """Содержимое удалённого файла: скачанное/распакованное или из файла, если индекс по папке"""
+        if "content" in r_meta:
+            return r_meta["content"]
+        return r_meta["path"].read_bytes()
+
+    def _report_progress(self, done: int, total: int):
+        # Не чаще одного сообщения на процент, чтобы не заваливать GUI сигналами
+        step = max(1, total // 100)
+        if done == total or done % step == 0:
+            self._emit(f"Применяем изменения: {done}/{total}")
+
+    def _apply_locked(self, local_index: Dict, remote_index: Dict) -> Tuple[int, int, int]:
+        """
+        Применяет изменения под блокировкой хранилища (storage.batch()): сохранения
+        из GUI и наблюдателя за папкой ждут её окончания. Между сканированием и
+        применением проходит скачивание, поэтому папка сканируется ещё раз, и файлы,
+        изменённые за это время, не трогаются до следующей синхронизации.
+        """
+        # Флаги и индекс путей сохраняются один раз по завершении применения
+        with self.storage.batch():
+            current = self._scan_local()
+            self._skipped_paths = {
+                rel_path for rel_path in local_index.keys() | current.keys()
+                if (local_index.get(rel_path) or {}).get("sha") != (current.get(rel_path) or {}).get("sha")
+            }
+            if self._skipped_paths:
+                self._log(f"→ Файлов изменено во время синхронизации: {len(self._skipped_paths)}, "
+                          f"они будут синхронизированы в следующий раз")
+                remote_index = {rel: meta for rel, meta in remote_index.items() if rel not in self._skipped_paths}
+            local_index = {rel: meta for rel, meta in current.items() if rel not in self._skipped_paths}
+            return self._apply_changes(local_index, remote_index)
+
     def _apply_changes(self, local_index: Dict, remote_index: Dict) -> Tuple[int, int, int]:
-        # ... (этот метод остается без изменений, он уже идеален) ...
-        new_count, updated_count, deleted_count = 0, 0, 0
+        """
+        Применяет различия между локальным и удалённым индексами.
+
+        Файл, изменённый с обеих сторон, решается по базовой версии: не менявшийся на
+        сервере остаётся как есть, не менявшийся локально заменяется удалённым,
+        изменённый с обеих сторон сливается по полям (merge_prompt_files). Без базовой
+        версии действует прежнее правило: локальные и более новые файлы не трогаются.
+
+        Разбор и валидация всех новых и изменённых файлов выполняются заранее в пуле
+        PromptLoader; если какой-то файл не разобран, синхронизация прерывается до
+        первой записи. Затем все изменения передаются хранилищу одной транзакцией
+        (storage.commit_changes). Прогресс передаётся в progress_cb счётчиком
+        обработанных файлов, отдельные файлы пишутся только в debug-лог.
+        """
         local_paths = set(local_index.keys())
         remote_paths = set(remote_index.keys())
 
-        # 1. Новые файлы
-        self._log("\n→ Проверяем новые файлы...")
-        for rel_path in remote_paths - local_paths:
-            self._log(f"  + Сохраняем новый файл: {rel_path}")
-            source_file = remote_index[rel_path]["path"]
-            prompt_data = json.loads(source_file.read_text(encoding="utf-8"))
-            if "created_at" in prompt_data and isinstance(prompt_data["created_at"], str): prompt_data["created_at"] = datetime.fromisoformat(prompt_data["created_at"])
-            if "updated_at" in prompt_data and isinstance(prompt_data["updated_at"], str): prompt_data["updated_at"] = datetime.fromisoformat(prompt_data["updated_at"])
-            prompt_obj = Prompt.model_validate(prompt_data)
-            self.storage.save_prompt(prompt_obj)
-            new_count += 1
-
-        # 2. Удаленные файлы
-        self._log("\n→ Проверяем удаленные файлы...")
-        for rel_path in local_paths - remote_paths:
-            l_meta = local_index[rel_path]
-            if not l_meta.get("is_local", False):
-                prompt_id = l_meta["path"].stem
-                self._log(f"  - Удаляем старый файл: {rel_path}")
-                try:
-                    self.storage.delete_prompt(prompt_id)
-                    deleted_count += 1
-                except (ValueError, FileNotFoundError) as e:
-                    self._log(f"    ! Не удалось удалить файл {prompt_id}: {e}")
-            else:
-                self._log(f"  → Пропускаем удаление, файл помечен как локальный: {rel_path}")
-
-        # 3. Общие файлы
-        self._log("\n→ Проверяем обновления...")
-        for rel_path in local_paths & remote_paths:
+        new_paths = sorted(remote_paths - local_paths)
+        deleted_paths = sorted(local_paths - remote_paths)
+        updated_paths = []
+        merge_paths = []
+        for rel_path in sorted(local_paths & remote_paths):
             l_meta = local_index[rel_path]
             r_meta = remote_index[rel_path]
             if l_meta["sha"] == r_meta["sha"]: continue
+            base = self.base_store.get(rel_path)
+            if base is not None:
+                # На сервере файл не менялся: локальные правки сохраняются
+                if base.sha == r_meta["sha"]: continue
+                # Локально файл не менялся с прошлой синхронизации
+                if base.local_sha == l_meta["sha"]:
+                    updated_paths.append(rel_path)
+                    continue
+                if self.base_store.has_blob(base.sha):
+                    merge_paths.append(rel_path)
+                    continue
             if l_meta.get("is_local", False): continue
             if l_meta["mtime"] > r_meta["mtime"]: continue
-            self._log(f"  Δ Обновляем файл до последней версии: {rel_path}")
-            source_file = r_meta["path"]
-            prompt_data = json.loads(source_file.read_text(encoding="utf-8"))
-            if "created_at" in prompt_data and isinstance(prompt_data["created_at"], str): prompt_data["created_at"] = datetime.fromisoformat(prompt_data["created_at"])
-            if "updated_at" in prompt_data and isinstance(prompt_data["updated_at"], str): prompt_data["updated_at"] = datetime.fromisoformat(prompt_data["updated_at"])
-            prompt_obj = Prompt.model_validate(prompt_data)
-            prompt_obj.is_local = l_meta.get("is_local", False)
-            prompt_obj.is_favorite = l_meta.get("is_favorite", False)
-            self.storage.save_prompt(prompt_obj)
-            updated_count += 1
-
-        return new_count, updated_count, deleted_count
\ No newline at end of file
+            updated_paths.append(rel_path)
+        self._log(f"\n→ Новых файлов: {len(new_paths)}, изменённых: {len(updated_paths)}, "
+                  f"к слиянию: {len(merge_paths)}, отсутствующих в библиотеке: {len(deleted_paths)}")
+
+        # 1. Разбор новых и изменённых файлов в пуле
+        to_parse = new_paths + updated_paths
+        started = time.perf_counter()
+        results = self.loader.parse([self._read_remote_bytes(remote_index[rel]) for rel in to_parse])
+        failures = [(rel, error) for rel, (prompt, error) in zip(to_parse, results) if prompt is None]
+        for rel_path, error in failures:
+            self._log(f"  ! Не удалось разобрать файл {rel_path}: {error}")
+        if failures:
+            raise ValueError(f"Не удалось разобрать файлов: {len(failures)}, изменения не применены")
+        parsed = {rel: prompt for rel, (prompt, _error) in zip(to_parse, results)}
+        self._log(f"→ Разобрано файлов: {len(parsed)} за {(time.perf_counter() - started) * 1000:.0f} мс")
+
+        # Слияние: стоимость пропорциональна числу файлов, изменённых с обеих сторон
+        merged_paths = []
+        for rel_path in merge_paths:
+            l_meta = local_index[rel_path]
+            try:
+                result = merge_prompt_files(self.base_store.read_blob(self.base_store.get(rel_path).sha),
+                                            l_meta["path"].read_bytes(),
+                                            self._read_remote_bytes(remote_index[rel_path]))
+            except Exception as e:
+                self._log(f"  ! Не удалось слить файл {rel_path}, оставлена локальная версия: {e}")
+                continue
+            if result.conflicts:
+                self.last_conflicts[rel_path] = result.conflicts
+            if result.changed:
+                parsed[rel_path] = result.prompt
+                merged_paths.append(rel_path)
+        if merge_paths:
+            self._log(f"→ Слито файлов: {len(merged_paths)}, с конфликтами: {len(self.last_conflicts)}")
+
+        for rel_path in updated_paths + merged_paths:
+            l_meta = local_index[rel_path]
+            parsed[rel_path].is_local = l_meta.get("is_local", False)
+            parsed[rel_path].is_favorite = l_meta.get("is_favorite", False)
+
+        # 2. Запись одной транзакцией хранилища: при сбое библиотека не останется
+        # наполовину обновлённой (LocalStorage доводит журнал при следующем старте)
+        deleted_ids = []
+        for rel_path in deleted_paths:
+            l_meta = local_index[rel_path]
+            if l_meta.get("is_local", False):
+                self.logger.debug(f"  → Пропускаем удаление, файл помечен как локальный: {rel_path}")
+                continue
+            self.logger.debug(f"  - Удаляем старый файл: {rel_path}")
+            deleted_ids.append(l_meta["path"].stem)
+        for rel_path in new_paths:
+            self.logger.debug(f"  + Сохраняем новый файл: {rel_path}")
+        for rel_path in updated_paths:
+            self.logger.debug(f"  Δ Обновляем файл до последней версии: {rel_path}")
+        for rel_path in merged_paths:
+            self.logger.debug(f"  ⇄ Сохраняем слитую версию: {rel_path}")
+
+        saves = [parsed[rel] for rel in to_parse + merged_paths]
+        total = len(saves) + len(deleted_ids)
+        _saved, deleted_count = self.storage.commit_changes(
+            saves, deleted_ids, lambda done: self._report_progress(done, total))
+        new_count, updated_count = len(new_paths), len(updated_paths) + len(merged_paths)
+        # Файлы, записанные ровно в удалённой версии (для _record_base)
+        self._written_paths = set(to_parse)
+        self.last_diff = SyncDiff(
+            added=[parsed[rel].id for rel in new_paths],
+            updated=[parsed[rel].id for rel in updated_paths + merged_paths],
+            removed=deleted_ids,
+        )
+
+        return new_count, updated_count, deleted_count
@@ -0,0 +1,169 @@
+# src/sync_scheduler.py
+import logging
+import random
+from typing import Callable, Optional
+
+import requests
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+from sync_manager import SyncDiff, SyncManager
+
+
+class SyncSignals(QObject):
+    """Сигналы фоновой синхронизации (доставляются в поток GUI)"""
+    finished = pyqtSignal(object, bool)  # SyncDiff, сервер ответил 304
+    failed = pyqtSignal(str, bool)  # сообщение, ошибка сети
+
+
+class SyncRunnable(QRunnable):
+    """Выполняет одну синхронизацию в пуле потоков"""
+
+    def __init__(self, manager: SyncManager):
+        super().__init__()
+        self.manager = manager
+        self.signals = SyncSignals()
+
+    def run(self):
+        try:
+            self.manager.sync()
+        except (requests.RequestException, OSError) as e:
+            self.signals.failed.emit(str(e), True)
+            return
+        except Exception as e:
+            self.signals.failed.emit(str(e), False)
+            return
+        self.signals.finished.emit(self.manager.last_diff, self.manager.last_not_modified)
+
+
+class SyncScheduler(QObject):
+    """
+    Периодическая фоновая синхронизация библиотеки промптов.
+
+    Раз в interval_s секунд создаёт SyncManager через make_manager и запускает
+    sync() в отдельном пуле из одного потока. Благодаря условным запросам (ETag)
+    неизменившаяся библиотека обходится одним ответом 304; такой и любой другой
+    прогон без изменений сигналов не вызывает. Если что-то изменилось, испускается
+    sync_finished(SyncDiff), чтобы PromptManager и окно обновили только затронутые
+    промпты.
+
+    При ошибках сети следующий запуск откладывается экспоненциально: retry_s,
+    2 * retry_s, ... до max_backoff_s, с небольшим случайным разбросом. Первая же
+    успешная синхронизация возвращает обычный интервал. Прочие ошибки (например,
+    повреждённый файл в релизе) не откладывают расписание, но сообщаются через
+    sync_failed.
+    """
+
+    sync_finished = pyqtSignal(object)  # SyncDiff
+    sync_failed = pyqtSignal(str)
+
+    DEFAULT_INTERVAL_S = 60 * 60
+    INITIAL_DELAY_S = 30
+    RETRY_S = 60
+    MAX_BACKOFF_S = 6 * 60 * 60
+    # Доля случайного разброса задержки, чтобы клиенты не приходили одновременно
+    JITTER = 0.1
+
+    def __init__(self, make_manager: Callable[[], SyncManager], interval_s: float = DEFAULT_INTERVAL_S,
+                 retry_s: float = RETRY_S, max_backoff_s: float = MAX_BACKOFF_S,
+                 parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
+        self.make_manager = make_manager
+        self.interval_s = interval_s
+        self.retry_s = retry_s
+        self.max_backoff_s = max_backoff_s
+        self.failures = 0
+        self._enabled = False
+        self._running: Optional[SyncRunnable] = None
+
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._dispatch)
+
+    @property
+    def active(self) -> bool:
+        return self._enabled
+
+    @property
+    def running(self) -> bool:
+        return self._running is not None
+
+    def start(self, initial_delay_s: Optional[float] = None):
+        """Запускает расписание; первая синхронизация — через initial_delay_s"""
+        self.failures = 0
+        self._enabled = True
+        self._schedule(self.INITIAL_DELAY_S if initial_delay_s is None else initial_delay_s)
+
+    def stop(self):
+        """Останавливает расписание (уже идущая синхронизация доводится до конца)"""
+        self._enabled = False
+        self._timer.stop()
+
+    def reset(self):
+        """Откладывает следующий запуск на полный интервал (например, после ручной синхронизации)"""
+        self.failures = 0
+        if self._running is None:
+            self._schedule(self.interval_s)
+
+    def trigger_now(self):
+        """Синхронизация вне расписания; если она уже идёт, запрос игнорируется"""
+        if self._running is not None:
+            return
+        self._timer.stop()
+        self._dispatch()
+
+    def next_delay(self) -> float:
+        """Задержка до следующего запуска с учётом числа ошибок сети подряд"""
+        if self.failures == 0:
+            return self.interval_s
+        delay = min(self.retry_s * 2 ** (self.failures - 1), self.max_backoff_s)
+        return delay * (1 + random.uniform(0, self.JITTER))
+
+    def _schedule(self, delay_s: float):
+        if not self._enabled:
+            return
+        self._timer.start(int(delay_s * 1000))
+
+    def _dispatch(self):
+        if self._running is not None:
+            self.logger.debug("Фоновая синхронизация уже выполняется, запуск пропущен")
+            return
+        try:
+            manager = self.make_manager()
+        except Exception as e:
+            self.logger.error(f"Не удалось подготовить фоновую синхронизацию: {str(e)}", exc_info=True)
+            self._schedule(self.interval_s)
+            return
+        runnable = SyncRunnable(manager)
+        runnable.signals.finished.connect(self._on_finished)
+        runnable.signals.failed.connect(self._on_failed)
+        # Ссылка держится, пока сигналы задачи могут быть в очереди событий
+        self._running = runnable
+        self._pool.start(runnable)
+
+    def _on_finished(self, diff: SyncDiff, not_modified: bool):
+        self._running = None
+        self.failures = 0
+        self._schedule(self.interval_s)
+        if not_modified or diff.empty:
+            self.logger.debug("Фоновая синхронизация: изменений нет")
+            return
+        self.logger.info(f"Фоновая синхронизация: +{len(diff.added)} Δ{len(diff.updated)} -{len(diff.removed)}")
+        self.sync_finished.emit(diff)
+
+    def _on_failed(self, message: str, network_error: bool):
+        self._running = None
+        if network_error:
+            self.failures += 1
+            delay = self.next_delay()
+            self.logger.warning(f"Фоновая синхронизация: ошибка сети ({message}), "
+                                f"попытка {self.failures}, следующая через {delay:.0f} с")
+        else:
+            self.failures = 0
+            delay = self.interval_s
+            self.logger.error(f"Фоновая синхронизация завершилась ошибкой: {message}")
+        self._schedule(delay)
+        self.sync_failed.emit(message)